@@ -0,0 +1,111 @@
+import time
+
+from settings import *
+
+# Tempo massimo per tick dedicato ai nemici lontani, in millisecondi
+AI_BUDGET_MS = 4.0
+# Fasce di distanza dal giocatore: (distanza massima, ogni quanti tick aggiornare)
+AI_TIERS = ((ENEMY_DETECTION_RANGE * 3, 1), (ENEMY_DETECTION_RANGE * 6, 4))
+AI_FAR_INTERVAL = 8
+# Oltre questi tick senza aggiornamento un nemico viene aggiornato anche fuori budget
+AI_MAX_STALE = FPS
+
+
+class AIScheduler:
+    def __init__(self, budget_ms=AI_BUDGET_MS, max_stale=AI_MAX_STALE):
+        """Update near or alerted enemies every tick and distant patrollers less often, within a time budget"""
+        self.budget_ms = budget_ms  # None disables the budget, e.g. for reproducible runs
+        self.max_stale = max_stale
+        self.waiting = []  # Ticks since the last full update, per enemy
+        self.intervals = []  # Update interval chosen at the last full update, per enemy
+        self.cursor = 0  # First enemy to consider, so budget cuts rotate
+        self.updates = 0
+        self.deferred = 0  # Skipped because of their distance tier
+        self.over_budget = 0  # Due but skipped because the budget ran out
+        self.forced = 0  # Updated out of budget because they waited too long
+        self.last_updates = 0
+        self.last_deferred = 0
+
+    def reset(self, count):
+        """Start tracking count enemies, all just updated"""
+        self.waiting = [0] * count
+        self.intervals = [1] * count
+        self.cursor = 0
+
+    def get_interval(self, enemy, player_pos):
+        """Get how many ticks may pass between two full updates of an enemy"""
+        if enemy.current_state != enemy.PATROL:
+            return 1
+        dx = enemy.x - player_pos[0]
+        dy = enemy.y - player_pos[1]
+        distance_sq = dx * dx + dy * dy
+        for distance, interval in AI_TIERS:
+            if distance_sq < distance * distance:
+                return interval
+        return AI_FAR_INTERVAL
+
+    def get_due(self, enemies):
+        """Start a tick: extrapolate the enemies between updates and get the indices due for one"""
+        count = len(enemies)
+        if len(self.waiting) != count:
+            self.reset(count)
+        waiting = self.waiting
+        intervals = self.intervals
+        due = []
+        start = self.cursor % count if count else 0
+        for offset in range(count):
+            i = (start + offset) % count
+            waiting[i] += 1
+            if waiting[i] < intervals[i]:
+                # Tra un aggiornamento e l'altro il nemico prosegue con l'ultima velocità
+                enemies[i].extrapolate()
+                self.deferred += 1
+            else:
+                due.append(i)
+        return due
+
+    def update(self, enemies, player_pos, due, noise_levels, line_of_sight):
+        """Run one tick of enemy AI over the due enemies, with noise and sight given per due enemy; returns the indices updated"""
+        deadline = None
+        if self.budget_ms is not None:
+            deadline = time.perf_counter() + self.budget_ms / 1000
+
+        waiting = self.waiting
+        intervals = self.intervals
+        updated = []
+        first_cut = None
+        for i, noise_level, visible in zip(due, noise_levels, line_of_sight):
+            enemy = enemies[i]
+            interval = intervals[i]
+            if interval > 1 and deadline is not None and time.perf_counter() > deadline:
+                if waiting[i] < self.max_stale:
+                    enemy.extrapolate()
+                    self.over_budget += 1
+                    if first_cut is None:
+                        first_cut = i
+                    continue
+                self.forced += 1
+            enemy.update(player_pos, noise_level, visible, waiting[i])
+            # La fascia si rivaluta solo dopo un aggiornamento: il margine delle fasce copre il ritardo
+            intervals[i] = self.get_interval(enemy, player_pos)
+            waiting[i] = 0
+            updated.append(i)
+
+        # Il prossimo tick parte dal primo nemico rimasto senza budget
+        if first_cut is not None:
+            self.cursor = first_cut
+        self.updates += len(updated)
+        self.last_updates = len(updated)
+        self.last_deferred = len(enemies) - len(updated)
+        return updated
+
+    def get_stats(self):
+        """Get update and deferral counters"""
+        return {
+            'updates': self.updates,
+            'deferred': self.deferred,
+            'over_budget': self.over_budget,
+            'forced': self.forced,
+            'last_updates': self.last_updates,
+            'last_deferred': self.last_deferred,
+        }
@@ -0,0 +1,282 @@
+import os
+import sys
+import json
+import math
+import random
+import time
+import logging
+import argparse
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from settings import *
+from environment import Environment, Room
+from level_generator import pack_rooms, GENERATOR_RANDOM, GENERATOR_GRID
+from game_state import GameState
+from enemy import Enemy
+from enemy_swarm import ENEMY_ENGINE_OBJECTS, ENEMY_ENGINE_SWARM
+from headless import KeyState
+from menu import Menu
+from save_store import create_temp_store
+from game_logging import setup_logging
+
+# File di riferimento usato per i confronti tra esecuzioni, tenuto accanto a questo modulo
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+# Un caso è una regressione se un percentile peggiora oltre la sua soglia; le code sono più rumorose
+REGRESSION_THRESHOLDS = {'p50': 0.10, 'p95': 0.20, 'p99': 0.30}
+# Peggioramenti più piccoli di così (in ms) sono rumore del timer, qualunque sia la percentuale
+REGRESSION_MIN_MS = 0.05
+
+# Setup logging
+setup_logging('benchmark.log')
+
+def build_grid_level(env, num_rooms):
+    """Replace the environment layout with num_rooms rooms laid out on a grid"""
+    columns = math.ceil(math.sqrt(num_rooms))
+    spacing = 12 * TILE_SIZE
+    env.rooms = []
+    env.extraction_points = []
+    for i in range(num_rooms):
+        x = (i % columns) * spacing
+        y = (i // columns) * spacing
+        room = Room(x, y, 8 * TILE_SIZE, 8 * TILE_SIZE)
+        if env.rooms and i % columns:
+            room.connect_room(env.rooms[-1])
+        env.rooms.append(room)
+        if i % 10 == 0:
+            env.extraction_points.append((room.rect.centerx, room.rect.centery, True))
+    env.build_spatial_index()
+    tiles = columns * spacing // TILE_SIZE
+    env.tile_map.build((tiles, tiles), env.rooms, [])
+    return columns * spacing
+
+def time_queries(query, points):
+    """Average time of a query over a list of points, in microseconds"""
+    start = time.perf_counter()
+    for point in points:
+        query(point)
+    return (time.perf_counter() - start) / len(points) * 1e6
+
+def bench_spatial_queries(sizes=(10, 100, 1000, 10000), samples=20000):
+    """Measure position query cost as the number of rooms grows"""
+    env = Environment()
+    print(f"{'rooms':>8} {'room_at':>10} {'collision':>10} {'extraction':>10}  (us/query)")
+    for num_rooms in sizes:
+        extent = build_grid_level(env, num_rooms)
+        points = [(random.uniform(0, extent), random.uniform(0, extent))
+                  for _ in range(samples)]
+        room_time = time_queries(env.get_room_at_position, points)
+        collision_time = time_queries(
+            lambda p: env.check_collision(pygame.Rect(p[0], p[1], PLAYER_SIZE, PLAYER_SIZE)),
+            points)
+        extraction_time = time_queries(env.is_extraction_point, points)
+        print(f"{num_rooms:>8} {room_time:>10.2f} {collision_time:>10.2f} {extraction_time:>10.2f}")
+        logging.info(f"Spatial queries with {num_rooms} rooms: room_at={room_time:.2f}us "
+                     f"collision={collision_time:.2f}us extraction={extraction_time:.2f}us")
+
+def bench_room_packing(sizes=(10, 100, 1000, 10000)):
+    """Measure the seeded grid generator as the number of rooms grows"""
+    print(f"{'rooms':>8} {'placed':>8} {'ms':>10}")
+    for num_rooms in sizes:
+        side = math.ceil(math.sqrt(num_rooms)) * 12
+        start = time.perf_counter()
+        rooms = pack_rooms(random.Random(num_rooms), (side, side), num_rooms)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{num_rooms:>8} {len(rooms):>8} {elapsed:>10.2f}")
+        logging.info(f"Packed {len(rooms)}/{num_rooms} rooms in {elapsed:.2f}ms")
+
+def measure(func, repeat, warmup=3):
+    """Time repeat calls of func after a few warmup calls, in milliseconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def percentiles(samples):
+    """Get the p50/p95/p99 of a list of timings"""
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {f"p{p}": ordered[min(last, round(last * p / 100))] for p in (50, 95, 99)}
+
+def report(results, name, samples):
+    """Store and print the percentiles of a benchmark case"""
+    stats = percentiles(samples)
+    results[name] = stats
+    print(f"{name:<40} {stats['p50']:>9.3f} {stats['p95']:>9.3f} {stats['p99']:>9.3f}")
+    logging.info(f"{name}: p50={stats['p50']:.3f}ms p95={stats['p95']:.3f}ms p99={stats['p99']:.3f}ms")
+
+def bench_generate_level(results, sizes=((50, 50, 10, 15), (100, 100, 40, 50), (200, 200, 150, 200)),
+                         repeat=10):
+    """Measure level generation across map sizes and room counts"""
+    env = Environment()
+    for generator in (GENERATOR_RANDOM, GENERATOR_GRID):
+        for width, height, min_rooms, max_rooms in sizes:
+            seeds = iter(range(repeat + 3))
+            samples = measure(lambda: env.generate_level((width, height), min_rooms, max_rooms, 2, 0.5,
+                                                         seed=next(seeds), generator=generator),
+                              repeat)
+            report(results, f"generate_level {generator} {width}x{height} {max_rooms}", samples)
+
+def bench_environment_draw(results, repeat=60):
+    """Measure environment drawing at several camera positions"""
+    screen = pygame.display.get_surface()
+    env = Environment()
+    env.generate_level((100, 100), 40, 50, 2, 0.5, seed=1, generator=GENERATOR_GRID)
+    extent = 100 * TILE_SIZE
+    cameras = {
+        'origin': (0, 0),
+        'center': (extent // 2 - SCREEN_WIDTH // 2, extent // 2 - SCREEN_HEIGHT // 2),
+        'corner': (extent - SCREEN_WIDTH, extent - SCREEN_HEIGHT),
+    }
+    for name, camera in cameras.items():
+        samples = measure(lambda: env.draw(screen, camera), repeat)
+        report(results, f"environment.draw {name}", samples)
+
+def populate_enemies(game_state, count):
+    """Replace the enemies of a game state with count enemies spread over its rooms"""
+    rng = random.Random(count)
+    rooms = [room for room in game_state.environment.rooms if not room.has_extraction_point]
+    spawns = []
+    for _ in range(count):
+        room = rng.choice(rooms)
+        patrol_points = [(rng.randint(room.rect.left, room.rect.right),
+                          rng.randint(room.rect.top, room.rect.bottom)) for _ in range(3)]
+        spawns.append((rng.randint(room.rect.left, room.rect.right - ENEMY_SIZE),
+                       rng.randint(room.rect.top, room.rect.bottom - ENEMY_SIZE), patrol_points))
+    if game_state.swarm is not None:
+        game_state.swarm.spawn(spawns)
+        game_state.enemies = list(game_state.swarm.views)
+    else:
+        game_state.enemies = [Enemy(x, y, patrol_points, game_state.navigator, game_state.flow_field,
+                                    game_state.environment.tile_map)
+                              for x, y, patrol_points in spawns]
+    game_state.index_enemies()
+
+def bench_game_update(results, counts=(1, 10, 100, 1000), repeat=120):
+    """Measure a simulation tick as the number of enemies grows"""
+    keys = KeyState((pygame.K_d,))
+    # Le partite del benchmark non finiscono nei salvataggi veri
+    with create_temp_store() as store:
+        for engine in (ENEMY_ENGINE_OBJECTS, ENEMY_ENGINE_SWARM):
+            for count in counts:
+                game_state = GameState(seed=1, enemy_engine=engine, store=store)
+                populate_enemies(game_state, count)
+                game_state.player.health = float('inf')
+
+                def tick():
+                    game_state.game_over = False
+                    game_state.update(keys)
+
+                report(results, f"game_state.update {engine} {count}", measure(tick, repeat))
+
+def bench_light_surface(results, repeat=200):
+    """Measure light surfaces, from the cache and built from scratch"""
+    env = Environment()
+    # Raggi interi come quelli usati in gioco, uno per maschera in cache
+    radii = [int(LIGHT_RADIUS * (0.5 + i / 20)) for i in range(20)]
+    values = iter(range(10 ** 9))
+    warm = lambda: env.create_light_surface(radii[next(values) % len(radii)], 0.8)
+    report(results, "create_light_surface cached", measure(warm, repeat, warmup=len(radii)))
+
+    def cold():
+        env.light_masks.clear()
+        env.create_light_surface(LIGHT_RADIUS, 0.8)
+
+    report(results, "create_light_surface uncached", measure(cold, repeat // 4))
+
+def bench_menu_draw(results, repeat=120):
+    """Measure drawing the main menu with its particles"""
+    screen = pygame.display.get_surface()
+    with create_temp_store() as store:
+        menu = Menu(store)
+        for _ in range(FPS * 3):
+            menu.update((0, 0))
+
+        def frame():
+            menu.update((0, 0))
+            menu.draw(screen)
+
+        report(results, "menu.draw", measure(frame, repeat))
+
+def load_baseline(path):
+    """Load stored benchmark results, or None if there are none"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Failed to load benchmark baseline: {str(e)}")
+        return None
+
+def save_baseline(path, results):
+    """Store benchmark results as the new baseline"""
+    try:
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    except Exception as e:
+        logging.error(f"Failed to save benchmark baseline: {str(e)}")
+
+def compare_baseline(results, baseline, thresholds=REGRESSION_THRESHOLDS):
+    """Print the percentile changes of every case against the baseline, returns the regressed cases"""
+    regressions = []
+    print(f"\n{'case':<40} " + " ".join(f"{name:>8}" for name in thresholds))
+    for name, stats in results.items():
+        if name not in baseline:
+            print(f"{name:<40} " + " ".join(f"{'new':>8}" for _ in thresholds))
+            continue
+        changes = []
+        regressed = []
+        for percentile, threshold in thresholds.items():
+            base = baseline[name].get(percentile, 0.0)
+            change = (stats[percentile] - base) / base if base > 0 else 0.0
+            worse = change > threshold and stats[percentile] - base > REGRESSION_MIN_MS
+            changes.append(f"{change:>+7.1%}" + ("!" if worse else " "))
+            if worse:
+                regressed.append(f"{percentile} {base:.3f}ms -> {stats[percentile]:.3f}ms")
+        print(f"{name:<40} " + " ".join(changes))
+        if regressed:
+            regressions.append(name)
+            logging.warning(f"Regression in {name}: {', '.join(regressed)}")
+    return regressions
+
+def run_timed_benchmarks():
+    """Run the percentile benchmarks, returns {case: {p50, p95, p99}} in milliseconds"""
+    results = {}
+    print(f"{'case':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    bench_generate_level(results)
+    bench_environment_draw(results)
+    bench_game_update(results)
+    bench_light_surface(results)
+    bench_menu_draw(results)
+    return results
+
+def run_all_benchmarks(baseline_path=BASELINE_FILE, save=False):
+    """Run all benchmarks, returns False if a case regressed against the baseline"""
+    pygame.init()
+    try:
+        pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        bench_spatial_queries()
+        bench_room_packing()
+        results = run_timed_benchmarks()
+    finally:
+        pygame.quit()
+
+    baseline = load_baseline(baseline_path)
+    regressions = compare_baseline(results, baseline) if baseline else []
+    if save or baseline is None:
+        save_baseline(baseline_path, results)
+        print(f"\nBaseline saved to {baseline_path}")
+    return not regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backrooms Extraction benchmarks")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    args = parser.parse_args()
+    sys.exit(0 if run_all_benchmarks(args.baseline, args.save_baseline) else 1)
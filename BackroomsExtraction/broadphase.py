@@ -0,0 +1,141 @@
+from settings import *
+
+# Lato delle celle dell'hash: circa il doppio di un'entità, così ognuna occupa al più 4 celle
+BROADPHASE_CELL_SIZE = 64
+
+# Danno da contatto: al primo tocco e poi ogni CONTACT_DAMAGE_INTERVAL tick finché il contatto dura
+CONTACT_DAMAGE = 10
+CONTACT_DAMAGE_INTERVAL = FPS // 2
+
+
+class DynamicSpatialHash:
+    def __init__(self, cell_size=BROADPHASE_CELL_SIZE):
+        """Spatial hash of moving rectangles, re-bucketed only when they change cells"""
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> set of keys
+        self.rects = {}  # key -> Rect
+        self.ranges = {}  # key -> (left, top, right, bottom) cell range
+        self.moves = 0
+        self.rebuckets = 0
+
+    @property
+    def count(self):
+        """Number of entities in the hash"""
+        return len(self.rects)
+
+    def clear(self):
+        """Remove every entity"""
+        self.cells.clear()
+        self.rects.clear()
+        self.ranges.clear()
+
+    def get_range(self, rect):
+        """Get the cells covered by a rectangle, as inclusive (left, top, right, bottom)"""
+        size = self.cell_size
+        return (rect.left // size, rect.top // size,
+                (rect.right - 1) // size, (rect.bottom - 1) // size)
+
+    def add_to_cells(self, key, cell_range):
+        """Put key in every cell of a range"""
+        left, top, right, bottom = cell_range
+        cells = self.cells
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = {key}
+                else:
+                    cell.add(key)
+
+    def remove_from_cells(self, key, cell_range):
+        """Take key out of every cell of a range, dropping cells left empty"""
+        left, top, right, bottom = cell_range
+        cells = self.cells
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = cells[(cx, cy)]
+                cell.discard(key)
+                if not cell:
+                    del cells[(cx, cy)]
+
+    def move(self, key, rect):
+        """Insert or update an entity; cells are touched only if its cell range changed"""
+        self.moves += 1
+        self.rects[key] = rect
+        size = self.cell_size  # get_range in linea: move viene chiamato per ogni nemico a ogni tick
+        cell_range = (rect.left // size, rect.top // size,
+                      (rect.right - 1) // size, (rect.bottom - 1) // size)
+        old_range = self.ranges.get(key)
+        if cell_range == old_range:
+            return
+        if old_range is not None:
+            self.remove_from_cells(key, old_range)
+        self.add_to_cells(key, cell_range)
+        self.ranges[key] = cell_range
+        self.rebuckets += 1
+
+    def remove(self, key):
+        """Remove an entity"""
+        cell_range = self.ranges.pop(key, None)
+        if cell_range is not None:
+            self.remove_from_cells(key, cell_range)
+            del self.rects[key]
+
+    def query(self, rect):
+        """Get the keys whose rectangle overlaps rect, sorted"""
+        left, top, right, bottom = self.get_range(rect)
+        cells = self.cells
+        candidates = set()
+        for cx in range(left, right + 1):
+            for cy in range(top, bottom + 1):
+                cell = cells.get((cx, cy))
+                if cell:
+                    candidates.update(cell)
+        rects = self.rects
+        return sorted(key for key in candidates if rects[key].colliderect(rect))
+
+    def get_stats(self):
+        """Get hash usage statistics"""
+        return {
+            'entities': len(self.rects),
+            'cells': len(self.cells),
+            'moves': self.moves,
+            'rebuckets': self.rebuckets,
+        }
+
+
+class ContactTracker:
+    def __init__(self):
+        """Contacts between a source and other entities, turned into begin and end events"""
+        self.contacts = {}  # source -> {other: tick the contact began}
+        self.begins = 0
+        self.ends = 0
+
+    def update(self, source, touching, tick):
+        """Set what source touches at tick, returning the (began, ended) keys"""
+        previous = self.contacts.get(source, {})
+        current = {}
+        began = []
+        for key in touching:
+            start = previous.get(key)
+            if start is None:
+                start = tick
+                began.append(key)
+            current[key] = start
+        ended = [key for key in previous if key not in current]
+        self.contacts[source] = current
+        self.begins += len(began)
+        self.ends += len(ended)
+        return began, ended
+
+    def get_due(self, source, tick, interval):
+        """Get the keys whose contact with source began at tick or a multiple of interval before"""
+        return [key for key, start in self.contacts.get(source, {}).items()
+                if (tick - start) % interval == 0]
+
+    def clear(self, source=None):
+        """Forget the contacts of source, or every contact"""
+        if source is None:
+            self.contacts.clear()
+        else:
+            self.contacts.pop(source, None)
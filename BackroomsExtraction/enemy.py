@@ -3,9 +3,15 @@ import math
 import random
 import logging
 from settings import *
+from timestep import lerp
+from noise import NOISE_HEARING_THRESHOLD
+
+# Durata della ricerca in tick, contati a ogni aggiornamento: in origine il timer avanzava solo
+# raggiunto un punto di ricerca, così 15 * FPS punti tenevano il nemico in ricerca per sempre
+ENEMY_SEARCH_TIME = 15 * FPS
 
 class Enemy:
-    def __init__(self, x, y, patrol_points=None):
+    def __init__(self, x, y, patrol_points=None, navigator=None, flow_field=None, tile_map=None):
         """Initialize the enemy"""
         self.x = x
         self.y = y
@@ -13,6 +19,11 @@ class Enemy:
         self.height = ENEMY_SIZE
         self.speed = ENEMY_SPEED
         self.rect = pygame.Rect(x, y, self.width, self.height)
+        self.tile_map = tile_map  # Walls to slide along, if any
+        self.velocity = (0.0, 0.0)  # Movement per tick at the last update
+        self.skipped = 0  # Ticks skipped by the AI scheduler and drawn extrapolated along velocity, up to a wall
+        self.prev_x = x  # Position at the previous tick, for interpolation
+        self.prev_y = y
         self.detection_range = ENEMY_DETECTION_RANGE
         
         # AI States
@@ -37,7 +48,13 @@ class Enemy:
         self.search_points = []
         self.current_search_point = None
         self.search_timer = 0
-        self.max_search_time = 15 * FPS  # 15 seconds in frames
+        self.max_search_time = ENEMY_SEARCH_TIME  # 15 seconds in frames
+        
+        # Navigation through the room graph
+        self.navigator = navigator
+        self.path = []  # Waypoints towards the current target
+        self.path_goal = None  # Room index the path leads to
+        self.flow_field = flow_field  # Shared field pointing towards the player
         
         self.load_assets()
 
@@ -80,40 +97,106 @@ class Enemy:
         
         return points
 
-    def move_towards(self, target_x, target_y):
-        """Move enemy towards a target position"""
+    def move_towards(self, target_x, target_y, ticks=1):
+        """Move enemy towards a target position, covering ticks ticks of movement at once"""
         dx = target_x - self.x
         dy = target_y - self.y
         distance = math.sqrt(dx**2 + dy**2)
         
         if distance > 0:
-            dx = dx / distance * self.speed
-            dy = dy / distance * self.speed
+            step = self.speed * ticks
+            if ticks > 1:
+                step = min(step, distance)  # Recuperando più tick non supera il bersaglio
+            dx = dx / distance * step
+            dy = dy / distance * step
             
-            self.x += dx
-            self.y += dy
+            x, y = self.x, self.y
+            if self.tile_map is not None:
+                self.x, self.y = self.tile_map.move_and_slide(x, y, self.width, self.height, dx, dy)
+            else:
+                self.x += dx
+                self.y += dy
+            self.velocity = ((self.x - x) / ticks, (self.y - y) / ticks)
             self.rect.x = self.x
             self.rect.y = self.y
 
-    def can_see_player(self, player_pos, player_noise_level):
-        """Check if the enemy can detect the player based on position and noise"""
-        dx = player_pos[0] - self.x
-        dy = player_pos[1] - self.y
-        distance = math.sqrt(dx**2 + dy**2)
-        
-        # Base detection range increased by player noise
-        current_detection_range = self.detection_range * (1 + player_noise_level / 100)
-        
-        return distance <= current_detection_range
+    def extrapolate(self):
+        """Skip the AI for a tick: the enemy is drawn moving on along its velocity, stopping at walls"""
+        if self.tile_map is not None and self.velocity != (0.0, 0.0):
+            ticks = self.skipped + 1
+            rect = pygame.Rect(int(self.x + self.velocity[0] * ticks), int(self.y + self.velocity[1] * ticks),
+                               self.width, self.height)
+            if self.tile_map.collides(rect):
+                # Resta all'ultima posizione libera fino al prossimo aggiornamento
+                return
+        self.skipped += 1
+
+    def get_visual_position(self):
+        """Get the position extrapolated over the skipped ticks"""
+        return (self.x + self.velocity[0] * self.skipped, self.y + self.velocity[1] * self.skipped)
 
-    def update_patrol(self):
+    def get_center(self):
+        """Get the center of the enemy box"""
+        return (self.x + self.width / 2, self.y + self.height / 2)
+
+    def move_center_towards(self, target_x, target_y, ticks=1):
+        """Move the enemy so that the center of its box heads for a target"""
+        self.move_towards(target_x - self.width / 2, target_y - self.height / 2, ticks)
+
+    def follow_path(self, target, ticks=1):
+        """Move the center of the enemy towards a target through rooms and corridors"""
+        if self.navigator is None:
+            self.move_center_towards(target[0], target[1], ticks)
+            return
+            
+        # Ricalcola il percorso quando il bersaglio cambia stanza, o cella fuori dalle stanze
+        environment = self.navigator.environment
+        goal_room = environment.get_room_at_position(target)
+        goal = goal_room.index if goal_room else environment.tile_map.get_cell(target)
+        if not self.path or goal != self.path_goal:
+            path = self.navigator.get_path(self.get_center(), target)
+            if path is not None:
+                self.path = path
+                self.path_goal = goal
+                
+        if not self.path:
+            # Budget di ricerca esaurito: aspetta il prossimo frame invece di puntare contro i muri
+            return
+            
+        # L'ultimo punto segue il bersaglio
+        self.path[-1] = target
+        waypoint = self.path[0]
+        self.move_center_towards(waypoint[0], waypoint[1], ticks)
+        if len(self.path) > 1:
+            center_x, center_y = self.get_center()
+            distance = math.sqrt((center_x - waypoint[0])**2 + (center_y - waypoint[1])**2)
+            if distance < self.speed:
+                self.path.pop(0)
+
+    def follow_flow_field(self, target, ticks=1):
+        """Step along the shared flow field, or fall back to path following"""
+        step = None
+        if self.flow_field is not None:
+            step = self.flow_field.get_next_position(self.get_center())
+        if step is None:
+            self.follow_path(target, ticks)
+            return
+        self.move_center_towards(step[0], step[1], ticks)
+
+    def can_see_player(self, noise_level, line_of_sight=False):
+        """Check if the enemy sees the player or hears the noise reaching its position"""
+        # La vista arriva dal controllo in blocco, già limitato a ENEMY_DETECTION_RANGE e ai muri:
+        # senza quel controllo il giocatore non è visibile
+        return line_of_sight or noise_level >= NOISE_HEARING_THRESHOLD
+
+    def update_patrol(self, ticks=1):
         """Update patrol behavior"""
         if self.wait_time > 0:
-            self.wait_time -= 1
+            self.wait_time = max(0, self.wait_time - ticks)
             return
             
         target = self.patrol_points[self.current_patrol_index]
-        self.move_towards(target[0], target[1])
+        self.move_towards(target[0], target[1], ticks)
         
         # Check if reached patrol point
         distance = math.sqrt((self.x - target[0])**2 + (self.y - target[1])**2)
@@ -121,57 +204,66 @@ class Enemy:
             self.wait_time = self.max_wait_time
             self.current_patrol_index = (self.current_patrol_index + 1) % len(self.patrol_points)
 
-    def update_chase(self, player_pos):
+    def update_chase(self, player_pos, detected=True, ticks=1):
         """Update chase behavior"""
-        if self.last_known_player_pos:
-            self.move_towards(player_pos[0], player_pos[1])
-            self.last_known_player_pos = player_pos
+        if detected:
+            self.follow_flow_field(player_pos, ticks)
             self.chase_timer = 0
         else:
-            self.chase_timer += 1
+            # Giocatore perso: va verso l'ultima posizione nota finché non si arrende
+            self.follow_path(self.last_known_player_pos, ticks)
+            self.chase_timer += ticks
             if self.chase_timer >= self.max_chase_time:
                 self.current_state = self.SEARCH
                 self.search_points = self.generate_search_points(self.last_known_player_pos)
                 self.current_search_point = 0
+                self.search_timer = 0
 
-    def update_search(self):
+    def update_search(self, ticks=1):
         """Update search behavior"""
         if not self.search_points:
             self.current_state = self.PATROL
             return
             
         current_point = self.search_points[self.current_search_point]
-        self.move_towards(current_point[0], current_point[1])
+        self.follow_path(current_point, ticks)
         
-        # Check if reached search point
-        distance = math.sqrt((self.x - current_point[0])**2 + (self.y - current_point[1])**2)
+        # Check if reached search point (follow_path guida il centro)
+        center_x, center_y = self.get_center()
+        distance = math.sqrt((center_x - current_point[0])**2 + (center_y - current_point[1])**2)
         if distance < self.speed:
             self.current_search_point = (self.current_search_point + 1) % len(self.search_points)
-            self.search_timer += 1
             
-            if self.search_timer >= self.max_search_time:
-                self.current_state = self.PATROL
-                self.search_timer = 0
+        # Il timer misura il tempo passato in ricerca, non i punti raggiunti
+        self.search_timer += ticks
+        if self.search_timer >= self.max_search_time:
+            self.current_state = self.PATROL
+            self.search_timer = 0
 
-    def update(self, player_pos, player_noise_level):
-        """Update enemy state and position"""
+    def update(self, player_pos, noise_level, line_of_sight=False, ticks=1):
+        """Update enemy state and position; noise_level is heard where the enemy stands, ticks passed since the last update"""
+        self.velocity = (0.0, 0.0)
+        self.skipped = 0
+        
         # Check for player detection
-        if self.can_see_player(player_pos, player_noise_level):
+        detected = self.can_see_player(noise_level, line_of_sight)
+        if detected:
             self.current_state = self.CHASE
             self.last_known_player_pos = player_pos
             
         # Update based on current state
         if self.current_state == self.PATROL:
-            self.update_patrol()
+            self.update_patrol(ticks)
         elif self.current_state == self.CHASE:
-            self.update_chase(player_pos)
+            self.update_chase(player_pos, detected, ticks)
         elif self.current_state == self.SEARCH:
-            self.update_search()
+            self.update_search(ticks)
 
-    def draw(self, screen):
-        """Draw the enemy"""
+    def draw(self, screen, alpha=1.0, camera_pos=(0, 0)):
+        """Draw the enemy between its last two ticks, relative to the camera"""
         try:
-            screen.blit(self.image, self.rect)
+            rect = self.get_render_rect(alpha, camera_pos)
+            screen.blit(self.image, rect)
             
             # Draw detection radius (for debugging)
             # pygame.draw.circle(screen, RED, (int(self.x + self.width/2), int(self.y + self.height/2)), 
@@ -180,6 +272,16 @@ class Enemy:
         except Exception as e:
             logging.error(f"Error drawing enemy: {str(e)}")
 
+    def save_previous(self):
+        """Remember the current position before a simulation tick"""
+        self.prev_x, self.prev_y = self.get_visual_position()
+
+    def get_render_rect(self, alpha=1.0, camera_pos=(0, 0)):
+        """Get the screen rectangle interpolated between the last two ticks"""
+        x, y = self.get_visual_position()
+        return pygame.Rect(int(lerp(self.prev_x, x, alpha) - camera_pos[0]),
+                           int(lerp(self.prev_y, y, alpha) - camera_pos[1]), self.width, self.height)
+
     def get_position(self):
         """Get current enemy position"""
         return (self.x, self.y)
@@ -0,0 +1,269 @@
+import logging
+
+import numpy
+import pygame
+from settings import *
+from flow_field import DIRECTIONS as FLOW_DIRECTIONS
+from timestep import lerp
+from noise import NOISE_HEARING_THRESHOLD
+from enemy import ENEMY_SEARCH_TIME
+
+# Motori dei nemici selezionabili in GameState
+ENEMY_ENGINE_OBJECTS = "objects"  # Un oggetto Enemy per nemico
+ENEMY_ENGINE_SWARM = "swarm"  # Un unico EnemySwarm vettorizzato
+
+# Stati dell'IA, come indici nell'array degli stati
+PATROL = 0
+CHASE = 1
+SEARCH = 2
+IDLE = 3
+STATE_NAMES = ("patrol", "chase", "search", "idle")
+
+PATROL_POINTS = 3
+SEARCH_POINTS = 8
+
+
+class SwarmEnemy:
+    # Stessi nomi degli stati di Enemy
+    PATROL = "patrol"
+    CHASE = "chase"
+    SEARCH = "search"
+    IDLE = "idle"
+
+    def __init__(self, swarm, index):
+        """Enemy-compatible view of one member of an EnemySwarm"""
+        self.swarm = swarm
+        self.index = index
+        self.width = ENEMY_SIZE
+        self.height = ENEMY_SIZE
+
+    @property
+    def x(self):
+        """Horizontal position of the enemy"""
+        return float(self.swarm.positions[self.index, 0])
+
+    @property
+    def y(self):
+        """Vertical position of the enemy"""
+        return float(self.swarm.positions[self.index, 1])
+
+    @property
+    def rect(self):
+        """Collision rectangle of the enemy"""
+        return pygame.Rect(int(self.x), int(self.y), self.width, self.height)
+
+    @property
+    def current_state(self):
+        """AI state name, as in Enemy.current_state"""
+        return STATE_NAMES[self.swarm.states[self.index]]
+
+    def get_position(self):
+        """Get current enemy position"""
+        return (self.x, self.y)
+
+    def get_collision_rect(self):
+        """Get enemy collision rectangle"""
+        return self.rect
+
+    def get_render_rect(self, alpha=1.0, camera_pos=(0, 0)):
+        """Get the screen rectangle interpolated between the last two ticks"""
+        x, y = lerp(self.swarm.previous[self.index], self.swarm.positions[self.index], alpha)
+        return pygame.Rect(int(x - camera_pos[0]), int(y - camera_pos[1]), self.width, self.height)
+
+    def draw(self, screen, alpha=1.0, camera_pos=(0, 0)):
+        """Draw the enemy between its last two ticks, relative to the camera"""
+        screen.blit(self.swarm.image, self.get_render_rect(alpha, camera_pos))
+
+
+class EnemySwarm:
+    def __init__(self, flow_field=None, tile_map=None):
+        """Array-backed enemy population updated with vectorized operations"""
+        self.count = 0
+        self.speed = ENEMY_SPEED
+        self.detection_range = ENEMY_DETECTION_RANGE
+        self.max_wait_time = 2 * FPS
+        self.max_chase_time = 10 * FPS
+        self.max_search_time = ENEMY_SEARCH_TIME
+        self.flow_field = flow_field
+        self.tile_map = tile_map  # Walls to slide along, if any
+        self.views = []
+        self.allocate(0)
+        self.load_assets()
+
+    def allocate(self, capacity):
+        """Create the per-enemy arrays"""
+        self.positions = numpy.zeros((capacity, 2))
+        self.previous = numpy.zeros((capacity, 2))  # Positions at the previous tick
+        self.states = numpy.full(capacity, PATROL, dtype=numpy.int8)
+        self.patrol_points = numpy.zeros((capacity, PATROL_POINTS, 2))
+        self.patrol_index = numpy.zeros(capacity, dtype=numpy.int64)
+        self.wait_time = numpy.zeros(capacity, dtype=numpy.int32)
+        self.last_known = numpy.zeros((capacity, 2))
+        self.chase_timer = numpy.zeros(capacity, dtype=numpy.int32)
+        self.search_center = numpy.zeros((capacity, 2))
+        self.search_index = numpy.zeros(capacity, dtype=numpy.int64)
+        self.search_timer = numpy.zeros(capacity, dtype=numpy.int32)
+
+    def load_assets(self):
+        """Load the sprite shared by every enemy"""
+        try:
+            self.image = pygame.Surface((ENEMY_SIZE, ENEMY_SIZE))
+            self.image.fill(BLOOD_RED)
+        except Exception as e:
+            logging.error(f"Failed to load enemy assets: {str(e)}")
+            self.image = pygame.Surface((ENEMY_SIZE, ENEMY_SIZE))
+            self.image.fill(RED)
+
+    def spawn(self, spawns):
+        """Replace the population with [(x, y, patrol_points)]"""
+        count = len(spawns)
+        self.allocate(count)
+        self.count = count
+        for i, (x, y, patrol_points) in enumerate(spawns):
+            self.positions[i] = (x, y)
+            self.patrol_points[i] = patrol_points[:PATROL_POINTS]
+        self.previous[:] = self.positions
+        self.views = [SwarmEnemy(self, i) for i in range(count)]
+
+    def save_previous(self):
+        """Remember every position before a simulation tick"""
+        self.previous[:] = self.positions
+
+    def get_centers(self):
+        """Get the (n, 2) array of enemy centers"""
+        return self.positions + ENEMY_SIZE / 2
+
+    def move_towards(self, mask, targets):
+        """Move the enemies selected by mask towards their targets"""
+        delta = targets - self.positions[mask]
+        distance = numpy.sqrt((delta ** 2).sum(axis=1))
+        moving = distance > 0
+        step = numpy.zeros_like(delta)
+        step[moving] = delta[moving] / distance[moving, None] * self.speed
+        if self.tile_map is not None:
+            positions = self.positions[mask]
+            self.tile_map.move_and_slide_many(positions, step, ENEMY_SIZE)
+            self.positions[mask] = positions
+        else:
+            self.positions[mask] += step
+
+    def get_search_points(self, indices):
+        """Get the current search point of the selected enemies"""
+        angle = 2 * numpy.pi * self.search_index[indices] / SEARCH_POINTS
+        points = self.search_center[indices] + self.detection_range * numpy.stack(
+            [numpy.cos(angle), numpy.sin(angle)], axis=1)
+        points[:, 0] = numpy.clip(points[:, 0], 0, SCREEN_WIDTH - ENEMY_SIZE)
+        points[:, 1] = numpy.clip(points[:, 1], 0, SCREEN_HEIGHT - ENEMY_SIZE)
+        return points
+
+    def update(self, player_pos, noise_levels, line_of_sight=None):
+        """Update every enemy state and position at once, from the noise each one hears"""
+        if self.count == 0:
+            return
+        player = numpy.asarray(player_pos, dtype=numpy.float64)
+
+        # Rilevamento del giocatore: rumore sentito sul posto, più la vista già limitata in distanza
+        detected = numpy.broadcast_to(numpy.asarray(noise_levels) >= NOISE_HEARING_THRESHOLD,
+                                      (self.count,)).copy()
+        if line_of_sight is not None:
+            detected |= numpy.asarray(line_of_sight, dtype=bool)
+        self.states[detected] = CHASE
+        self.last_known[detected] = player
+
+        # Come in Enemy.update ogni nemico esegue un solo stato per tick, anche se cambia stato
+        patrol = numpy.flatnonzero(self.states == PATROL)
+        chase = numpy.flatnonzero(self.states == CHASE)
+        search = numpy.flatnonzero(self.states == SEARCH)
+        self.update_patrol(patrol)
+        self.update_chase(chase, player, detected)
+        self.update_search(search)
+
+    def update_patrol(self, indices):
+        """Patrol behavior for the selected enemies"""
+        waiting = self.wait_time[indices] > 0
+        self.wait_time[indices[waiting]] -= 1
+        walking = indices[~waiting]
+        if len(walking) == 0:
+            return
+
+        targets = self.patrol_points[walking, self.patrol_index[walking]]
+        self.move_towards(walking, targets)
+        distance = numpy.sqrt(((self.positions[walking] - targets) ** 2).sum(axis=1))
+        reached = walking[distance < self.speed]
+        self.wait_time[reached] = self.max_wait_time
+        self.patrol_index[reached] = (self.patrol_index[reached] + 1) % PATROL_POINTS
+
+    def update_chase(self, indices, player, detected):
+        """Chase behavior for the selected enemies"""
+        following = indices[detected[indices]]
+        # Come Enemy.follow_path, il centro del nemico punta al bersaglio
+        targets = numpy.broadcast_to(player - ENEMY_SIZE / 2, (len(following), 2)).copy()
+
+        # Il campo di flusso condiviso guida chi ci si trova dentro
+        if self.flow_field is not None and len(following):
+            tile_map = self.flow_field.tile_map
+            size = tile_map.cell_size
+            cells = (self.get_centers()[following] // size).astype(numpy.int64)
+            inside = ((cells[:, 0] >= 0) & (cells[:, 0] < tile_map.width) &
+                      (cells[:, 1] >= 0) & (cells[:, 1] < tile_map.height))
+            directions = numpy.zeros(len(following), dtype=numpy.int64)
+            field = numpy.frombuffer(self.flow_field.directions, dtype=numpy.uint8)
+            directions[inside] = field[cells[inside, 1] * tile_map.width + cells[inside, 0]]
+            steering = directions > 0
+            offsets = numpy.asarray(FLOW_DIRECTIONS)[directions[steering] - 1]
+            targets[steering] = (cells[steering] + offsets + 0.5) * size - ENEMY_SIZE / 2
+
+        self.move_towards(following, targets)
+        self.chase_timer[following] = 0
+
+        # Giocatore perso: verso l'ultima posizione nota finché non si arrendono
+        lost = indices[~detected[indices]]
+        if len(lost):
+            self.move_towards(lost, self.last_known[lost] - ENEMY_SIZE / 2)
+        self.chase_timer[lost] += 1
+        giving_up = lost[self.chase_timer[lost] >= self.max_chase_time]
+        self.states[giving_up] = SEARCH
+        self.search_center[giving_up] = self.last_known[giving_up]
+        self.search_index[giving_up] = 0
+        self.search_timer[giving_up] = 0
+
+    def update_search(self, indices):
+        """Search behavior for the selected enemies"""
+        if len(indices) == 0:
+            return
+        targets = self.get_search_points(indices)
+        self.move_towards(indices, targets - ENEMY_SIZE / 2)
+        distance = numpy.sqrt(((self.get_centers()[indices] - targets) ** 2).sum(axis=1))
+        reached = indices[distance < self.speed]
+        self.search_index[reached] = (self.search_index[reached] + 1) % SEARCH_POINTS
+        self.search_timer[indices] += 1
+        done = indices[self.search_timer[indices] >= self.max_search_time]
+        self.states[done] = PATROL
+        self.search_timer[done] = 0
+
+    def find_near(self, pos, radius, exclude_state=None):
+        """Get the indices of the enemies within radius of pos"""
+        delta = self.positions[:self.count] - numpy.asarray(pos, dtype=numpy.float64)
+        near = (delta ** 2).sum(axis=1) < radius ** 2
+        if exclude_state is not None:
+            near &= self.states[:self.count] != exclude_state
+        return numpy.flatnonzero(near)
+
+    def find_colliding(self, rect):
+        """Get the indices of the enemies whose rectangle overlaps rect"""
+        left = self.positions[:, 0].astype(numpy.int64)
+        top = self.positions[:, 1].astype(numpy.int64)
+        overlap = ((left < rect.right) & (left + ENEMY_SIZE > rect.left) &
+                   (top < rect.bottom) & (top + ENEMY_SIZE > rect.top))
+        return numpy.flatnonzero(overlap)
+
+    def draw(self, screen, alpha=1.0, camera_pos=(0, 0)):
+        """Draw every enemy between its last two ticks, relative to the camera, with a single blits call"""
+        try:
+            image = self.image
+            positions = lerp(self.previous, self.positions, alpha) if alpha < 1.0 else self.positions
+            positions = positions - numpy.asarray(camera_pos, dtype=numpy.float64)
+            screen.blits([(image, position) for position in
+                          positions.astype(numpy.int64).tolist()], False)
+        except Exception as e:
+            logging.error(f"Error drawing enemy swarm: {str(e)}")
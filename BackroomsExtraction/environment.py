@@ -1,11 +1,22 @@
 import pygame
 import random
 import logging
+import numpy
 from settings import *
+from lighting import LightMaskCache
+from static_layer import StaticGeometryLayer
+from spatial import SpatialGrid
+from render_targets import render_targets
+from level_generator import GENERATOR_RANDOM, GENERATOR_GRID, pack_rooms
+from room_graph import RoomGraph, connect_rooms
+from tilemap import TileMap, WALKABLE
+from particles import (ParticleSystem, DUST_PER_TILE, DUST_COLOR, DUST_SIZES, DUST_SPEED, DUST_MARGIN,
+                       DUST_RECYCLE_INTERVAL)
 
 class Room:
     def __init__(self, x, y, width, height):
         self.rect = pygame.Rect(x, y, width, height)
+        self.index = None  # Node of the room in Environment.room_graph
         self.connected_rooms = []
         self.doors = []  # (x, y, width, height) for each door
         self.lights = []  # [(x, y, intensity, flicker_rate)]
@@ -37,22 +48,43 @@ class Room:
 class Environment:
     def __init__(self):
         self.rooms = []
+        self.room_graph = RoomGraph()  # Rooms and doors as a compact graph
         self.corridors = []  # [(start_pos, end_pos, width)]
+        self.tile_map = TileMap()  # Walkable cells of the level
         self.extraction_points = []  # [(x, y, active)]
         self.current_level = 1
+        self.seed = None
+        self.rng = random.Random()
+        
+        # Spatial indexes for position queries
+        self.room_index = SpatialGrid()
+        self.door_index = SpatialGrid()
+        self.extraction_index = SpatialGrid()
         
         # Lighting
         self.ambient_light = 0.2  # Base ambient light level (0-1)
-        self.light_surfaces = {}  # Cache for light surfaces
+        self.light_masks = LightMaskCache()  # Cache for light surfaces
         self.flickering_lights = []  # [(x, y, intensity, time)]
         
         # Environment effects
-        self.particles = []  # [(pos, velocity, lifetime)] for dust/atmosphere
+        self.particles = ParticleSystem((0, 0), DUST_COLOR, DUST_SIZES)  # Dust/atmosphere
+        self.dust_count = 0  # Dust particles kept around the camera
+        self.dust_region = None  # Region of the last recycling pass
+        self.dust_ticks = 0  # Ticks since the last recycling pass
         self.wall_texture = None
         self.floor_texture = None
         
         self.load_assets()
-        self.generate_level()
+        self.static_layer = StaticGeometryLayer(self.floor_texture)
+        
+        level_data = BACKROOMS_LEVELS[0]
+        self.generate_level(
+            level_data['map_size'],
+            level_data['min_rooms'],
+            level_data['max_rooms'],
+            level_data['extraction_points'],
+            level_data['ambient_light']
+        )
 
     def load_assets(self):
         """Load environment textures and assets"""
@@ -84,76 +116,179 @@ class Environment:
             self.floor_texture = pygame.Surface((TILE_SIZE, TILE_SIZE))
             self.floor_texture.fill((30, 30, 30))
 
-    def generate_level(self, map_size, min_rooms, max_rooms, num_extraction_points, ambient_light):
+    def generate_level(self, map_size, min_rooms, max_rooms, num_extraction_points, ambient_light,
+                       seed=None, generator=GENERATOR_RANDOM, loop_ratio=0.0):
         """Generate a new level with rooms and corridors"""
         self.rooms = []
         self.corridors = []
         self.extraction_points = []
         self.ambient_light = ambient_light
         
+        # Lo stesso seed produce sempre lo stesso layout
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        rng = self.rng
+        
         map_width, map_height = map_size
         
         # Generate rooms
-        attempts = 0
-        num_rooms = random.randint(min_rooms, max_rooms)
+        num_rooms = rng.randint(min_rooms, max_rooms)
         
-        while len(self.rooms) < num_rooms and attempts < 100:
-            # Generate room with random size
-            width = random.randint(5, 10) * TILE_SIZE
-            height = random.randint(5, 10) * TILE_SIZE
-            x = random.randint(0, map_width * TILE_SIZE - width)
-            y = random.randint(0, map_height * TILE_SIZE - height)
-            
-            new_room = Room(x, y, width, height)
-            
-            # Check if room overlaps with existing rooms
-            can_place = True
-            for room in self.rooms:
-                if new_room.intersects(room):
-                    can_place = False
-                    break
-                    
-            if can_place:
-                # Add random lights to the room
-                num_lights = random.randint(1, 3)
-                for _ in range(num_lights):
-                    light_x = random.randint(new_room.rect.left + 50, new_room.rect.right - 50)
-                    light_y = random.randint(new_room.rect.top + 50, new_room.rect.bottom - 50)
-                    intensity = random.uniform(0.5, 1.0)
-                    # Più buio = più flickering
-                    flicker_rate = random.uniform(0.1, 0.4) * (1 - ambient_light)
-                    new_room.lights.append((light_x, light_y, intensity, flicker_rate))
-                
+        if generator == GENERATOR_GRID:
+            for x, y, width, height in pack_rooms(rng, map_size, num_rooms):
+                new_room = Room(x * TILE_SIZE, y * TILE_SIZE, width * TILE_SIZE, height * TILE_SIZE)
+                self.add_room_lights(new_room, ambient_light)
                 self.rooms.append(new_room)
+        else:
+            attempts = 0
+            while len(self.rooms) < num_rooms and attempts < 100:
+                # Generate room with random size
+                width = rng.randint(5, 10) * TILE_SIZE
+                height = rng.randint(5, 10) * TILE_SIZE
+                x = rng.randint(0, map_width * TILE_SIZE - width)
+                y = rng.randint(0, map_height * TILE_SIZE - height)
                 
-            attempts += 1
+                new_room = Room(x, y, width, height)
+                
+                # Check if room overlaps with existing rooms
+                can_place = True
+                for room in self.rooms:
+                    if new_room.intersects(room):
+                        can_place = False
+                        break
+                        
+                if can_place:
+                    self.add_room_lights(new_room, ambient_light)
+                    self.rooms.append(new_room)
+                    
+                attempts += 1
             
         # Connect rooms
+        centers = [room.rect.center for room in self.rooms]
+        edges = connect_rooms(centers, rng, loop_ratio)
+        doors = []
         for i, room in enumerate(self.rooms):
-            if i > 0:
-                closest_room = min([r for r in self.rooms[:i]], 
-                                 key=lambda r: abs(r.rect.centerx - room.rect.centerx) + 
-                                             abs(r.rect.centery - room.rect.centery))
-                room.connect_room(closest_room)
-                
-                # Create corridor
-                start_pos = (room.rect.centerx, room.rect.centery)
-                end_pos = (closest_room.rect.centerx, closest_room.rect.centery)
-                self.corridors.append((start_pos, end_pos, TILE_SIZE))
+            room.index = i
+        for a, b in edges:
+            room, other_room = self.rooms[b], self.rooms[a]
+            room.connect_room(other_room)
+            doors.append(room.doors[-1])
+            
+            # Create corridor
+            start_pos = (room.rect.centerx, room.rect.centery)
+            end_pos = (other_room.rect.centerx, other_room.rect.centery)
+            self.corridors.append((start_pos, end_pos, TILE_SIZE))
+        self.room_graph = RoomGraph(centers, edges, doors)
                 
         # Add extraction points
         possible_rooms = self.rooms.copy()
-        random.shuffle(possible_rooms)
+        rng.shuffle(possible_rooms)
         
         for i in range(num_extraction_points):
             if possible_rooms:
                 room = possible_rooms.pop()
-                x = random.randint(room.rect.left + 50, room.rect.right - 50)
-                y = random.randint(room.rect.top + 50, room.rect.bottom - 50)
+                x = rng.randint(room.rect.left + 50, room.rect.right - 50)
+                y = rng.randint(room.rect.top + 50, room.rect.bottom - 50)
                 self.extraction_points.append((x, y, True))
                 room.has_extraction_point = True
                 
-        logging.info(f"Generated level with {len(self.rooms)} rooms and {num_extraction_points} extraction points")
+        # Bake static geometry and index it for position queries
+        self.static_layer.build(self.rooms, self.corridors)
+        self.build_spatial_index()
+        self.tile_map.build(map_size, self.rooms, self.corridors)
+        self.spawn_dust(map_size)
+                
+        logging.info(f"Generated level with {len(self.rooms)} rooms and {num_extraction_points} "
+                     f"extraction points (seed {self.seed}, {generator} generator, "
+                     f"{self.tile_map.get_memory_usage()} byte tile map)")
+
+    def spawn_dust(self, map_size):
+        """Size the dust around the camera on the average walkable density; it spawns on the first update"""
+        width, height = map_size[0] * TILE_SIZE, map_size[1] * TILE_SIZE
+        self.particles = ParticleSystem((width, height), DUST_COLOR, DUST_SIZES,
+                                        numpy.random.default_rng(self.seed))
+        # Tante particelle quante celle percorribili ci sono in media nella regione attorno allo schermo
+        region = self.get_dust_region((0, 0))
+        walkable = numpy.count_nonzero(self.tile_map.grid == WALKABLE)
+        region_cells = (region[2] // TILE_SIZE) * (region[3] // TILE_SIZE)
+        self.dust_count = int(min(walkable, region_cells * walkable / max(1, len(self.tile_map.cells)))
+                              * DUST_PER_TILE)
+
+    def get_dust_region(self, camera_pos):
+        """Get the (x, y, width, height) world area, aligned to cells, where dust lives around the screen"""
+        margin = DUST_MARGIN * TILE_SIZE
+        left = int(camera_pos[0] // TILE_SIZE) * TILE_SIZE - margin
+        top = int(camera_pos[1] // TILE_SIZE) * TILE_SIZE - margin
+        width = (SCREEN_WIDTH // TILE_SIZE + 1) * TILE_SIZE + 2 * margin
+        height = (SCREEN_HEIGHT // TILE_SIZE + 1) * TILE_SIZE + 2 * margin
+        return (left, top, width, height)
+
+    def get_dust_cells(self, region, camera_pos=None):
+        """Get the walkable (column, row) cells of a region, leaving out the screen if others are left"""
+        left, top = region[0] // TILE_SIZE, region[1] // TILE_SIZE
+        grid = self.tile_map.grid
+        walkable = grid[max(0, top):max(0, top + region[3] // TILE_SIZE),
+                        max(0, left):max(0, left + region[2] // TILE_SIZE)] == WALKABLE
+        rows, columns = numpy.nonzero(walkable)
+        cells = numpy.stack((columns + max(0, left), rows + max(0, top)), axis=1)
+        if camera_pos is not None:
+            # Chi rientra compare fuori dallo schermo, non sotto gli occhi del giocatore
+            x, y = cells[:, 0] * TILE_SIZE, cells[:, 1] * TILE_SIZE
+            hidden = ((x + TILE_SIZE <= camera_pos[0]) | (x >= camera_pos[0] + SCREEN_WIDTH) |
+                      (y + TILE_SIZE <= camera_pos[1]) | (y >= camera_pos[1] + SCREEN_HEIGHT))
+            if hidden.any():
+                cells = cells[hidden]
+        return cells
+
+    def update_particles(self, camera_pos=(0, 0)):
+        """Move the dust around the camera, bringing back the particles left behind near the screen"""
+        particles = self.particles
+        region = self.get_dust_region(camera_pos)
+        if particles.count == 0:
+            cells = self.get_dust_cells(region)
+            if self.dust_count and len(cells):
+                particles.spawn(self.dust_count, velocity_x=(-DUST_SPEED, DUST_SPEED),
+                                velocity_y=(-DUST_SPEED, DUST_SPEED), alpha=(20, 90),
+                                cells=cells, cell_size=TILE_SIZE)
+            return
+        particles.update()
+        # Al massimo DUST_SPEED * DUST_RECYCLE_INTERVAL pixel fuori regione: ancora dentro il margine
+        self.dust_ticks += 1
+        if region == self.dust_region and self.dust_ticks < DUST_RECYCLE_INTERVAL:
+            return
+        self.dust_region = region
+        self.dust_ticks = 0
+        outside = particles.get_outside(region)
+        if outside.any():
+            cells = self.get_dust_cells(region, camera_pos)
+            if len(cells):
+                particles.place(outside, cells, TILE_SIZE)
+
+    def add_room_lights(self, room, ambient_light):
+        """Add random lights to a room"""
+        num_lights = self.rng.randint(1, 3)
+        for _ in range(num_lights):
+            light_x = self.rng.randint(room.rect.left + 50, room.rect.right - 50)
+            light_y = self.rng.randint(room.rect.top + 50, room.rect.bottom - 50)
+            intensity = self.rng.uniform(0.5, 1.0)
+            # Più buio = più flickering
+            flicker_rate = self.rng.uniform(0.1, 0.4) * (1 - ambient_light)
+            room.lights.append((light_x, light_y, intensity, flicker_rate))
+
+    def build_spatial_index(self):
+        """Index rooms, doors and extraction points by position"""
+        self.room_index.clear()
+        self.door_index.clear()
+        self.extraction_index.clear()
+        
+        for room in self.rooms:
+            self.room_index.insert(room.rect, room)
+            for door in room.doors:
+                if door not in self.door_index.query_rect(door):
+                    self.door_index.insert(door, door)
+                    
+        for i, (x, y, active) in enumerate(self.extraction_points):
+            self.extraction_index.insert((x - 20, y - 20, 40, 40), i)
 
     def update_lighting(self):
         """Update dynamic lighting effects"""
@@ -165,83 +300,56 @@ class Environment:
 
     def create_light_surface(self, radius, intensity):
         """Create a light surface with falloff"""
-        key = (radius, intensity)
-        if key in self.light_surfaces:
-            return self.light_surfaces[key]
-            
-        surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
-        for x in range(radius * 2):
-            for y in range(radius * 2):
-                distance = math.sqrt((x - radius) ** 2 + (y - radius) ** 2)
-                if distance < radius:
-                    alpha = int(255 * (1 - distance/radius) * intensity)
-                    surface.set_at((x, y), (255, 255, 255, alpha))
-                    
-        self.light_surfaces[key] = surface
-        return surface
+        return self.light_masks.get(radius, intensity)
+
+    def build_extraction_glow(self):
+        """Pre-render the glow rings and central point of an active extraction point"""
+        size = 25
+        glow = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+        glow.fill((*GREEN, 0))
+        # Glow effect
+        for radius in range(25, 15, -5):
+            alpha = int(100 * (radius/25))
+            ring = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
+            pygame.draw.circle(ring, (*GREEN, alpha), (radius, radius), radius)
+            glow.blit(ring, (size - radius, size - radius))
+        # Central point
+        pygame.draw.circle(glow, GREEN, (size, size), 15)
+        return glow
 
     def draw(self, screen, camera_pos=(0, 0)):
         """Draw the environment"""
         try:
-            # Create base surface for the level
-            level_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            level_surface.fill(BLACK)
+            # Reuse the pooled surface for the level
+            level_surface = render_targets.clear("level", (SCREEN_WIDTH, SCREEN_HEIGHT), BLACK)
             
-            # Draw rooms
-            for room in self.rooms:
-                # Draw floor
-                for x in range(room.rect.left, room.rect.right, TILE_SIZE):
-                    for y in range(room.rect.top, room.rect.bottom, TILE_SIZE):
-                        level_surface.blit(self.floor_texture, 
-                                       (x - camera_pos[0], y - camera_pos[1]))
-                
-                # Draw walls with texture
-                wall_rect = room.rect.move(-camera_pos[0], -camera_pos[1])
-                pygame.draw.rect(level_surface, DARK_GRAY, wall_rect, 2)
-                
-                # Draw doors with depth effect
-                for door in room.doors:
-                    door_rect = door.move(-camera_pos[0], -camera_pos[1])
-                    pygame.draw.rect(level_surface, (40, 40, 40), door_rect)
-                    # Aggiunge ombra alla porta
-                    pygame.draw.rect(level_surface, (20, 20, 20), door_rect, 2)
-                    
-            # Draw corridors with depth effect
-            for start, end, width in self.corridors:
-                start_pos = (start[0] - camera_pos[0], start[1] - camera_pos[1])
-                end_pos = (end[0] - camera_pos[0], end[1] - camera_pos[1])
-                # Corridoio principale
-                pygame.draw.line(level_surface, (25, 25, 25),
-                               start_pos, end_pos, width)
-                # Bordi del corridoio per effetto profondità
-                pygame.draw.line(level_surface, (35, 35, 35),
-                               start_pos, end_pos, width-2)
+            # Draw baked rooms, doors and corridors
+            self.static_layer.draw(level_surface, camera_pos)
                 
             # Draw extraction points with glow effect
+            glow = render_targets.get_sprite("extraction_glow", self.build_extraction_glow)
+            glow_radius = glow.get_width() // 2
             for x, y, active in self.extraction_points:
                 pos = (x - camera_pos[0], y - camera_pos[1])
                 if active:
-                    # Glow effect
-                    for radius in range(25, 15, -5):
-                        alpha = int(100 * (radius/25))
-                        glow_surface = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
-                        pygame.draw.circle(glow_surface, (*GREEN, alpha), 
-                                        (radius, radius), radius)
-                        level_surface.blit(glow_surface, 
-                                       (pos[0]-radius, pos[1]-radius))
-                    # Central point
-                    pygame.draw.circle(level_surface, GREEN, pos, 15)
+                    level_surface.blit(glow, (pos[0] - glow_radius, pos[1] - glow_radius))
                 else:
                     pygame.draw.circle(level_surface, (150, 0, 0), pos, 15)
+            
+            # Draw dust, below the fog so it only shows near lights
+            self.particles.draw(level_surface, camera_pos)
                 
             # Apply ambient lighting and fog
-            light_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
             fog_alpha = int(255 * (1 - self.ambient_light))
-            light_surface.fill((0, 0, 0, fog_alpha))
+            light_surface = render_targets.clear("light", (SCREEN_WIDTH, SCREEN_HEIGHT),
+                                                 (0, 0, 0, fog_alpha), pygame.SRCALPHA)
             
-            # Draw room lights with flickering
-            for room in self.rooms:
+            # Draw room lights with flickering, only from the rooms whose light can reach the screen
+            for room in self.get_lit_rooms(camera_pos):
                 for x, y, intensity, flicker_rate in room.lights:
+                    if not (-LIGHT_RADIUS < x - camera_pos[0] < SCREEN_WIDTH + LIGHT_RADIUS and
+                            -LIGHT_RADIUS < y - camera_pos[1] < SCREEN_HEIGHT + LIGHT_RADIUS):
+                        continue
                     # Applica flickering
                     current_intensity = intensity * (1 - random.uniform(0, flicker_rate))
                     light = self.create_light_surface(LIGHT_RADIUS, current_intensity)
@@ -256,24 +364,31 @@ class Environment:
         except Exception as e:
             logging.error(f"Error drawing environment: {str(e)}")
 
+    def get_lit_rooms(self, camera_pos):
+        """Get the rooms with a light that may reach the screen at a camera position"""
+        # Le luci stanno dentro la stanza: basta allargare lo schermo del raggio della luce
+        view = pygame.Rect(int(camera_pos[0]) - LIGHT_RADIUS, int(camera_pos[1]) - LIGHT_RADIUS,
+                           SCREEN_WIDTH + 2 * LIGHT_RADIUS + 1, SCREEN_HEIGHT + 2 * LIGHT_RADIUS + 1)
+        return [room for room in self.room_index.query_rect(view) if room.lights]
+
     def get_room_at_position(self, pos):
         """Get the room at a given position"""
-        for room in self.rooms:
-            if room.rect.collidepoint(pos):
-                return room
-        return None
+        rooms = self.room_index.query_point(pos)
+        return rooms[0] if rooms else None
+
+    def get_door_at_position(self, pos):
+        """Get the door at a given position"""
+        doors = self.door_index.query_point(pos)
+        return doors[0] if doors else None
 
     def check_collision(self, rect):
         """Check if a rectangle collides with walls"""
-        # Check room walls
-        for room in self.rooms:
-            if rect.colliderect(room.rect):
-                return True
-        return False
+        return self.tile_map.collides(rect)
 
     def is_extraction_point(self, pos):
         """Check if a position is an extraction point"""
-        for x, y, active in self.extraction_points:
-            if active and math.sqrt((pos[0] - x)**2 + (pos[1] - y)**2) < 20:
+        for i in self.extraction_index.query_point(pos):
+            x, y, active = self.extraction_points[i]
+            if active and (pos[0] - x)**2 + (pos[1] - y)**2 < 400:
                 return True
         return False
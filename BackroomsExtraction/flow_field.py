@@ -0,0 +1,163 @@
+import heapq
+import math
+
+# Distanza (in celle) entro cui il campo viene calcolato attorno al bersaglio
+FLOW_FIELD_RADIUS = 32
+# Spostamento accumulato del bersaglio oltre il quale il campo viene ricalcolato da zero
+FLOW_FIELD_REBUILD_DRIFT = FLOW_FIELD_RADIUS
+
+# Spostamenti verso le 8 celle vicine; il campo salva l'indice + 1 (0 = non raggiunta)
+DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1))
+OPPOSITE = (1, 0, 3, 2, 7, 6, 5, 4)
+STEP_COSTS = tuple(math.sqrt(2) if dx and dy else 1.0 for dx, dy in DIRECTIONS)
+
+
+class FlowField:
+    def __init__(self, tile_map, radius=FLOW_FIELD_RADIUS):
+        """Shared Dijkstra map pointing every walkable cell near the target towards it"""
+        self.tile_map = tile_map
+        self.radius = radius
+        self.target_cell = None
+        self.cells = None  # Tile map cells the field was computed on
+        self.directions = bytearray()
+        self.costs = []  # cell -> distance to the target minus offset, inf outside the field
+        self.offset = 0.0  # Added to every stored cost, so a target move does not rewrite them
+        self.frontier = []  # Dijkstra heap left at the radius, resumed when the target moves
+        self.touched = []  # Cells written since the last full computation
+        self.updates = 0
+        self.repairs = 0
+        self.reset()
+
+    def reset(self):
+        """Allocate an empty field for the current tile map"""
+        tile_map = self.tile_map
+        self.cells = tile_map.cells
+        self.directions = bytearray(tile_map.width * tile_map.height)
+        self.costs = [math.inf] * (tile_map.width * tile_map.height)
+        self.offset = 0.0
+        self.frontier = []
+        self.touched = []
+        self.target_cell = None
+
+    def update(self, target_pos):
+        """Update the field if the target moved to another cell, returns True if it did"""
+        tile_map = self.tile_map
+        if tile_map.cells is not self.cells:
+            self.reset()
+
+        cell = tile_map.get_cell(target_pos)
+        if cell == self.target_cell:
+            return False
+        previous = self.target_cell
+        self.target_cell = cell
+        self.updates += 1
+        if previous is None or not self.repair(previous, cell):
+            self.compute(cell)
+        return True
+
+    def compute(self, target):
+        """Dijkstra from the target cell, limited to the field radius"""
+        directions = self.directions
+        costs = self.costs
+        # Azzera solo le celle scritte dal calcolo precedente
+        for index in self.touched:
+            directions[index] = 0
+            costs[index] = math.inf
+        self.touched = []
+        self.frontier = []
+        self.offset = 0.0
+        if not self.tile_map.is_walkable_cell(*target):
+            return
+
+        start = target[1] * self.tile_map.width + target[0]
+        costs[start] = 0.0
+        self.touched.append(start)
+        self.frontier.append((0.0, start))
+        self.expand()
+
+    def repair(self, previous, target):
+        """Move the field from the previous target to a cell it already reaches, rewriting only the cells that got closer"""
+        tile_map = self.tile_map
+        if not (tile_map.is_walkable_cell(*previous) and tile_map.is_walkable_cell(*target)):
+            return False
+        start = target[1] * tile_map.width + target[0]
+        stored = self.costs[start]
+        if stored == math.inf:
+            return False
+        # Ogni cella dista dal nuovo bersaglio al più quanto dal vecchio più lo spostamento:
+        # basta alzare l'offset e propagare i miglioramenti a partire dal nuovo bersaglio
+        drift = stored + self.offset
+        if self.offset + drift > FLOW_FIELD_REBUILD_DRIFT:
+            return False
+        self.offset += drift
+        # Il vecchio bersaglio non ha direzione: viene ricalcolato dai vicini durante la propagazione
+        self.costs[previous[1] * tile_map.width + previous[0]] = math.inf
+        self.costs[start] = -self.offset
+        self.directions[start] = 0
+        heapq.heappush(self.frontier, (-self.offset, start))
+        self.expand()
+        self.repairs += 1
+        return True
+
+    def expand(self):
+        """Run Dijkstra from the pending frontier until the next cell lies beyond the radius"""
+        tile_map = self.tile_map
+        width = tile_map.width
+        height = tile_map.height
+        cells = tile_map.cells
+        directions = self.directions
+        costs = self.costs
+        touched = self.touched
+        frontier = self.frontier
+        limit = self.radius - self.offset
+        while frontier and frontier[0][0] <= limit:
+            cost, index = heapq.heappop(frontier)
+            if cost > costs[index]:
+                continue
+            x = index % width
+            y = index // width
+            for i, (dx, dy) in enumerate(DIRECTIONS):
+                nx, ny = x + dx, y + dy
+                if nx < 0 or nx >= width or ny < 0 or ny >= height:
+                    continue
+                neighbour = ny * width + nx
+                if not cells[neighbour]:
+                    continue
+                # Niente scorciatoie diagonali attraverso gli angoli dei muri
+                if dx and dy and not (cells[y * width + nx] and cells[ny * width + x]):
+                    continue
+                new_cost = cost + STEP_COSTS[i]
+                if new_cost < costs[neighbour]:
+                    if costs[neighbour] == math.inf:
+                        touched.append(neighbour)
+                    costs[neighbour] = new_cost
+                    directions[neighbour] = OPPOSITE[i] + 1
+                    heapq.heappush(frontier, (new_cost, neighbour))
+
+    def get_distance(self, pos):
+        """Get the walking distance in cells from pos to the target, or None outside the field"""
+        column, row = self.tile_map.get_cell(pos)
+        if not (0 <= column < self.tile_map.width and 0 <= row < self.tile_map.height):
+            return None
+        cost = self.costs[row * self.tile_map.width + column]
+        if cost == math.inf:
+            return None
+        return cost + self.offset
+
+    def get_direction(self, pos):
+        """Get the (dx, dy) cell step towards the target, or None outside the field"""
+        column, row = self.tile_map.get_cell(pos)
+        if not (0 <= column < self.tile_map.width and 0 <= row < self.tile_map.height):
+            return None
+        direction = self.directions[row * self.tile_map.width + column]
+        if not direction:
+            return None
+        return DIRECTIONS[direction - 1]
+
+    def get_next_position(self, pos):
+        """Get the center of the next cell towards the target, or None outside the field"""
+        direction = self.get_direction(pos)
+        if direction is None:
+            return None
+        column, row = self.tile_map.get_cell(pos)
+        return self.tile_map.get_cell_center((column + direction[0], row + direction[1]))
@@ -0,0 +1,103 @@
+import logging
+from collections import OrderedDict
+
+import pygame
+
+# Numero massimo di testi renderizzati tenuti in memoria
+TEXT_CACHE_SIZE = 256
+
+
+class FontRegistry:
+    def __init__(self):
+        """Fonts loaded once and shared by every screen"""
+        self.fonts = {}  # (name, size) -> Font
+        self.registered = False
+
+    def get(self, size, name=None):
+        """Get the font for a size, loading it on first use"""
+        # I font non sopravvivono a pygame.quit(): vanno dimenticati insieme a pygame
+        if not self.registered:
+            pygame.register_quit(self.clear)
+            self.registered = True
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            try:
+                font = pygame.font.Font(name, size)
+            except Exception as e:
+                logging.error(f"Failed to load font: {str(e)}")
+                font = pygame.font.SysFont('arial', size)
+            self.fonts[key] = font
+        return font
+
+    def clear(self):
+        """Forget every loaded font"""
+        self.fonts.clear()
+        self.registered = False
+
+
+class TextCache:
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        """Bounded LRU cache of rendered text surfaces"""
+        self.max_size = max_size
+        self.surfaces = OrderedDict()  # (font, text, color, antialias) -> Surface
+        self.registered = False
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color, antialias=True):
+        """Get the rendered surface for a text, rendering it only on a miss"""
+        if not self.registered:
+            pygame.register_quit(self.clear)
+            self.registered = True
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """Drop every cached surface"""
+        self.surfaces.clear()
+        self.registered = False
+
+    def get_stats(self):
+        """Get cache usage statistics"""
+        return {
+            'size': len(self.surfaces),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class TextLine:
+    def __init__(self, font, color):
+        """A text line that is re-rendered only when its string or colour changes"""
+        self.font = font
+        self.color = color
+        self.text = None
+        self.surface = None
+        self.renders = 0
+
+    def render(self, text, color=None):
+        """Get the surface for text, reusing the last one if nothing changed"""
+        color = color or self.color
+        if text != self.text or color != self.color or self.surface is None:
+            self.text = text
+            self.color = color
+            self.surface = self.font.render(text, True, color)
+            self.renders += 1
+        return self.surface
+
+
+# Istanze condivise da Menu, Button, GameState e overlay
+font_registry = FontRegistry()
+text_cache = TextCache()
@@ -0,0 +1,218 @@
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Stesso messaggio o evento: al massimo LOG_RATE_BURST record ogni LOG_RATE_INTERVAL secondi
+LOG_RATE_INTERVAL = 1.0
+LOG_RATE_BURST = 5
+# Record in attesa di essere scritti; oltre questo limite vengono scartati e contati
+LOG_QUEUE_SIZE = 10000
+# Finestre ricordate al massimo: oltre, si dimentica la meno recente
+LOG_RATE_KEYS = 1024
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, interval=LOG_RATE_INTERVAL, burst=LOG_RATE_BURST):
+        """Let through at most burst copies of a message or event per interval, counting the rest"""
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.windows = OrderedDict()  # key -> [window start, records passed, records suppressed]
+        self.passed = 0
+        self.suppressed = 0
+
+    def get_key(self, record):
+        """Events are limited by name, plain records by their text"""
+        event = getattr(record, 'event', None)
+        if event is not None:
+            return (record.levelno, event)
+        return (record.levelno, record.getMessage())
+
+    def check(self, key, now):
+        """Get None if a record with key must be dropped, else how many were dropped before it"""
+        with self.lock:
+            window = self.windows.get(key)
+            suppressed = 0
+            if window is None or now - window[0] >= self.interval:
+                # Nuova finestra: il primo record riporta quanti ne sono stati scartati nella precedente
+                if window is not None:
+                    suppressed = window[2]
+                self.windows[key] = [now, 1, 0]
+                self.windows.move_to_end(key)
+                if len(self.windows) > LOG_RATE_KEYS:
+                    self.windows.popitem(last=False)
+            elif window[1] < self.burst:
+                window[1] += 1
+            else:
+                window[2] += 1
+                self.suppressed += 1
+                return None
+            self.passed += 1
+            return suppressed
+
+    def filter(self, record):
+        # log_event controlla il limite prima ancora di creare il record
+        if getattr(record, 'rate_checked', False):
+            return True
+        suppressed = self.check(self.get_key(record), record.created)
+        if suppressed is None:
+            return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    def pop_suppressed(self):
+        """Get and reset the records suppressed in the open windows, by key"""
+        with self.lock:
+            pending = {key: window[2] for key, window in self.windows.items() if window[2]}
+            for window in self.windows.values():
+                window[2] = 0
+            return pending
+
+
+class GameQueueHandler(QueueHandler):
+    def __init__(self, log_queue):
+        """Hand records to a queue without blocking the game thread"""
+        super().__init__(log_queue)
+        self.dropped = 0  # Records lost because the queue was full
+
+    def prepare(self, record):
+        """Resolve the message only: timestamps and layout are formatted on the writer thread"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        """Queue a record, dropping it if the writer has fallen too far behind"""
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredFormatter(logging.Formatter):
+    def formatMessage(self, record):
+        """Append event fields as key=value and the count of suppressed repeats"""
+        text = super().formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            text += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" (+{suppressed} suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        """One JSON object per event"""
+        return json.dumps({
+            'time': record.created,
+            'level': record.levelname,
+            'event': record.event,
+            'suppressed': getattr(record, 'suppressed', 0),
+            **record.fields,
+        }, default=str)
+
+
+class LogPipeline:
+    def __init__(self):
+        """Root logging routed through a queue to a background writer thread"""
+        self.queue = None
+        self.handler = None
+        self.listener = None
+        self.rate_limit = None
+        self.registered = False
+
+    def start(self, filename='game.log', level=logging.INFO, events_file=None,
+              interval=LOG_RATE_INTERVAL, burst=LOG_RATE_BURST):
+        """Replace the root handlers with the queue; filename None logs to stderr"""
+        self.stop()
+        try:
+            output = logging.FileHandler(filename) if filename else logging.StreamHandler()
+            output.setFormatter(StructuredFormatter(LOG_FORMAT))
+            outputs = [output]
+            if events_file:
+                events = logging.FileHandler(events_file)
+                events.setFormatter(JsonFormatter())
+                events.addFilter(lambda record: hasattr(record, 'event'))
+                outputs.append(events)
+
+            self.queue = queue.Queue(LOG_QUEUE_SIZE)
+            self.rate_limit = RateLimitFilter(interval, burst)
+            self.handler = GameQueueHandler(self.queue)
+            self.handler.addFilter(self.rate_limit)
+            self.listener = QueueListener(self.queue, *outputs, respect_handler_level=True)
+
+            root = logging.getLogger()
+            for handler in root.handlers[:]:
+                root.removeHandler(handler)
+                handler.close()
+            root.addHandler(self.handler)
+            root.setLevel(level)
+            self.listener.start()
+            if not self.registered:
+                atexit.register(self.stop)
+                self.registered = True
+        except Exception as e:
+            logging.error(f"Failed to start logging pipeline: {str(e)}")
+
+    def stop(self):
+        """Write the suppressed counts and everything still queued, then close the outputs"""
+        if self.listener is None:
+            return
+        for (level, key), count in self.rate_limit.pop_suppressed().items():
+            logging.log(level, f"Suppressed {count} repeats of: {key}")
+        root = logging.getLogger()
+        root.removeHandler(self.handler)
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        self.listener = None
+
+    def get_stats(self):
+        """Get counters of records written, suppressed, dropped and waiting"""
+        if self.listener is None:
+            return {'passed': 0, 'suppressed': 0, 'dropped': 0, 'queued': 0}
+        return {
+            'passed': self.rate_limit.passed,
+            'suppressed': self.rate_limit.suppressed,
+            'dropped': self.handler.dropped,
+            'queued': self.queue.qsize(),
+        }
+
+
+# Pipeline condivisa da gioco, test e benchmark
+log_pipeline = LogPipeline()
+
+
+def setup_logging(filename='game.log', level=logging.INFO, events_file=None):
+    """Start asynchronous, rate-limited logging"""
+    log_pipeline.start(filename, level, events_file)
+
+
+def log_event(event, level=logging.INFO, **fields):
+    """Log a structured event: the name plus key=value fields"""
+    logger = logging.getLogger()
+    if not logger.isEnabledFor(level):
+        return
+    extra = {'event': event, 'fields': fields}
+    rate_limit = log_pipeline.rate_limit
+    if rate_limit is not None and log_pipeline.listener is not None:
+        suppressed = rate_limit.check((level, event), time.time())
+        if suppressed is None:
+            return
+        extra.update(rate_checked=True, suppressed=suppressed)
+    logger.log(level, event, extra=extra)
@@ -1,13 +1,29 @@
 import pygame
 import logging
-import random
+import math
 from settings import *
 from player import Player
+from survivor import SurvivorManager
 from enemy import Enemy
 from environment import Environment
+from navigation import Navigator
+from flow_field import FlowField
+from line_of_sight import LineOfSight
+from enemy_swarm import EnemySwarm, ENEMY_ENGINE_OBJECTS, ENEMY_ENGINE_SWARM
+from level_generator import GENERATOR_RANDOM
+from render_targets import render_targets
+from profiler import FrameProfiler, PROFILER_TOGGLE_KEY
+from timestep import FixedTimestep, lerp
+from fonts import font_registry, text_cache, TextLine
+from game_logging import log_event
+from broadphase import DynamicSpatialHash, ContactTracker, CONTACT_DAMAGE, CONTACT_DAMAGE_INTERVAL
+from ai_scheduler import AIScheduler
+from noise import NoiseField
 
 class GameState:
-    def __init__(self, selected_class=None, selected_level=0):
+    def __init__(self, selected_class=None, selected_level=0, seed=None, enemy_engine=None, store=None):
+        # Argomenti ripassati da reset(), store compreso
+        self.init_args = (selected_class, selected_level, seed, enemy_engine, store)
         self.running = True
         self.paused = False
         self.game_over = False
@@ -24,42 +40,70 @@ class GameState:
             self.level_data['min_rooms'],
             self.level_data['max_rooms'],
             self.level_data['extraction_points'],
-            self.level_data['ambient_light']
+            self.level_data['ambient_light'],
+            seed=seed,
+            generator=self.level_data.get('generator', GENERATOR_RANDOM),
+            loop_ratio=self.level_data.get('loop_ratio', 0.0)
         )
+        self.rng = self.environment.rng
         
         # Player setup
-        starting_room = random.choice(self.environment.rooms)
+        starting_room = self.rng.choice(self.environment.rooms)
         start_x = starting_room.rect.centerx
         start_y = starting_room.rect.centery
-        self.survivor_manager = SurvivorManager()
-        self.player = Player(start_x, start_y, selected_class, self.survivor_manager)
+        self.survivor_manager = SurvivorManager(store)
+        self.player = Player(start_x, start_y, selected_class, self.survivor_manager,
+                             self.environment.tile_map)
         
         # Enemy spawning
+        self.navigator = Navigator(self.environment)
+        self.flow_field = FlowField(self.environment.tile_map)
+        self.line_of_sight = LineOfSight(self.environment.tile_map)
+        self.noise_field = NoiseField(self.environment)  # Player noise spread through rooms and doors
         self.enemies = []
+        self.enemy_engine = enemy_engine or self.level_data.get('enemy_engine', ENEMY_ENGINE_OBJECTS)
+        self.swarm = EnemySwarm(self.flow_field, self.environment.tile_map) if self.enemy_engine == ENEMY_ENGINE_SWARM else None
+        self.enemy_hash = DynamicSpatialHash()  # Broadphase of the enemy objects (the swarm has its arrays)
+        self.contacts = ContactTracker()
+        self.ai_scheduler = AIScheduler()  # Level of detail for the enemy objects
+        self.tick = 0
         self.spawn_enemies(self.level_data['enemy_count'])
         
+        # Profiling
+        self.profiler = FrameProfiler()
+        
+        # Fixed-timestep simulation
+        self.timestep = FixedTimestep()
+        
         # Camera
         self.camera_x = 0
         self.camera_y = 0
+        self.prev_camera_x = 0
+        self.prev_camera_y = 0
         
         # UI elements
         self.setup_ui()
         
+        # Presentation: None while playing, else the screen drawn over the copied last frame
+        self.frozen_screen = None
+        
         # Game stats
         self.time_survived = 0
         self.items_collected = 0
         self.enemies_avoided = 0
         self.rooms_explored = set()  # Per tracciare le stanze esplorate
+        self.run_recorded = False
 
     def setup_ui(self):
         """Setup UI elements"""
-        try:
-            self.font = pygame.font.Font(None, FONT_SIZE_MEDIUM)
-            self.large_font = pygame.font.Font(None, FONT_SIZE_LARGE)
-        except Exception as e:
-            logging.error(f"Failed to load fonts: {str(e)}")
-            self.font = pygame.font.SysFont('arial', FONT_SIZE_MEDIUM)
-            self.large_font = pygame.font.SysFont('arial', FONT_SIZE_LARGE)
+        self.font = font_registry.get(FONT_SIZE_MEDIUM)
+        self.large_font = font_registry.get(FONT_SIZE_LARGE)
+        
+        # Righe dell'HUD, ridisegnate solo quando il loro valore cambia
+        self.hud_lines = {
+            name: TextLine(self.font, WHITE)
+            for name in ('health', 'stamina', 'time', 'level', 'experience', 'stats', 'noise')
+        }
 
     def load_sounds(self):
         """Load game sound effects"""
@@ -80,16 +124,52 @@ class GameState:
                          if not room.has_extraction_point]
         
         num_enemies = min(len(available_rooms), enemy_count)
-        spawn_rooms = random.sample(available_rooms, num_enemies)
+        spawn_rooms = self.rng.sample(available_rooms, num_enemies)
         
+        spawns = []
         for room in spawn_rooms:
             patrol_points = [
-                (random.randint(room.rect.left + 50, room.rect.right - 50),
-                 random.randint(room.rect.top + 50, room.rect.bottom - 50))
+                (self.rng.randint(room.rect.left + 50, room.rect.right - 50),
+                 self.rng.randint(room.rect.top + 50, room.rect.bottom - 50))
                 for _ in range(3)
             ]
-            enemy = Enemy(room.rect.centerx, room.rect.centery, patrol_points)
-            self.enemies.append(enemy)
+            spawns.append((room.rect.centerx, room.rect.centery, patrol_points))
+            
+        if self.swarm is not None:
+            # Le viste mantengono l'interfaccia di Enemy per il resto del gioco
+            self.swarm.spawn(spawns)
+            self.enemies.extend(self.swarm.views)
+        else:
+            for x, y, patrol_points in spawns:
+                enemy = Enemy(x, y, patrol_points, self.navigator, self.flow_field,
+                              self.environment.tile_map)
+                self.enemies.append(enemy)
+        self.index_enemies()
+
+    def index_enemies(self):
+        """Rebuild the enemy broadphase after the enemy list has been replaced"""
+        self.enemy_hash.clear()
+        self.contacts.clear()
+        self.ai_scheduler.reset(len(self.enemies))
+        if self.swarm is None:
+            for i, enemy in enumerate(self.enemies):
+                self.enemy_hash.move(i, enemy.rect)
+
+    def get_enemies_near(self, pos, radius):
+        """Get the enemies that may be within radius of pos"""
+        if self.swarm is not None:
+            return [self.enemies[i] for i in self.swarm.find_near(pos, radius)]
+        return self.enemies
+
+    def get_enemy_contacts(self, rect):
+        """Get the indices of the enemies overlapping rect"""
+        if self.swarm is not None:
+            return self.swarm.find_colliding(rect).tolist()
+        return self.enemy_hash.query(rect)
+
+    def get_enemies_touching(self, rect):
+        """Get the enemies that overlap rect"""
+        return [self.enemies[i] for i in self.get_enemy_contacts(rect)]
 
     def check_room_exploration(self):
         """Check if player has entered a new room and award experience"""
@@ -97,12 +177,12 @@ class GameState:
         if current_room and current_room not in self.rooms_explored:
             self.rooms_explored.add(current_room)
             self.player.add_experience(XP_EXPLORE)
-            logging.info(f"Explored new room! Total rooms: {len(self.rooms_explored)}")
+            log_event("room_explored", rooms=len(self.rooms_explored))
 
     def check_enemy_avoidance(self):
         """Check if player successfully avoided nearby enemies"""
         player_pos = self.player.get_position()
-        for enemy in self.enemies:
+        for enemy in self.get_enemies_near(player_pos, ENEMY_DETECTION_RANGE * 1.5):
             enemy_pos = enemy.get_position()
             distance = math.sqrt((player_pos[0] - enemy_pos[0])**2 + 
                                (player_pos[1] - enemy_pos[1])**2)
@@ -110,7 +190,7 @@ class GameState:
                 if enemy.current_state != enemy.CHASE:
                     self.enemies_avoided += 1
                     self.player.add_experience(XP_AVOID_ENEMY)
-                    logging.info("Successfully avoided enemy!")
+                    log_event("enemy_avoided", total=self.enemies_avoided)
 
     def check_extraction(self):
         """Check if player has reached an extraction point"""
@@ -118,7 +198,19 @@ class GameState:
             self.extraction_successful = True
             self.game_over = True
             self.player.add_experience(XP_EXTRACTION)
-            logging.info("Extraction successful!")
+            self.finish_run()
+            log_event("extraction", time=round(self.time_survived, 1), rooms=len(self.rooms_explored))
+
+    def finish_run(self):
+        """Record the finished run in the save history, once, and ask for it to be written"""
+        if self.run_recorded:
+            return
+        self.run_recorded = True
+        self.survivor_manager.record_run(
+            self.player.survivor_class, self.current_level, self.environment.seed,
+            self.extraction_successful, self.time_survived, len(self.rooms_explored),
+            self.enemies_avoided, self.player.experience_gained)
+        self.survivor_manager.checkpoint()
 
     def update_camera(self):
         """Update camera position to follow player"""
@@ -129,89 +221,149 @@ class GameState:
         self.camera_x += (target_x - self.camera_x) * 0.1
         self.camera_y += (target_y - self.camera_y) * 0.1
         
-        # Keep camera within map bounds
-        self.camera_x = max(0, min(self.camera_x, MAP_WIDTH * TILE_SIZE - SCREEN_WIDTH))
-        self.camera_y = max(0, min(self.camera_y, MAP_HEIGHT * TILE_SIZE - SCREEN_HEIGHT))
+        # Keep camera within the bounds of the current level
+        tile_map = self.environment.tile_map
+        self.camera_x = max(0, min(self.camera_x, tile_map.width * tile_map.cell_size - SCREEN_WIDTH))
+        self.camera_y = max(0, min(self.camera_y, tile_map.height * tile_map.cell_size - SCREEN_HEIGHT))
 
     def handle_collisions(self):
         """Handle collisions between game objects"""
-        # Player-Enemy collisions
-        player_rect = self.player.rect
-        for enemy in self.enemies:
-            if player_rect.colliderect(enemy.rect):
-                self.player.take_damage(10)
-                if not self.player.is_alive():
-                    self.game_over = True
-                    return
+        # Player-Enemy contacts: danno all'inizio del contatto e poi a intervalli regolari
+        began, ended = self.contacts.update("player", self.get_enemy_contacts(self.player.rect), self.tick)
+        for enemy in began:
+            log_event("contact_begin", enemy=enemy, tick=self.tick)
+        for enemy in ended:
+            log_event("contact_end", enemy=enemy, tick=self.tick)
+        for enemy in self.contacts.get_due("player", self.tick, CONTACT_DAMAGE_INTERVAL):
+            self.player.take_damage(CONTACT_DAMAGE)
+            if not self.player.is_alive():
+                self.game_over = True
+                self.finish_run()
+                return
         
         # Player-Extraction point collisions
         player_pos = self.player.get_position()
         if self.environment.is_extraction_point(player_pos):
             self.extraction_successful = True
             self.game_over = True
+            self.finish_run()
+
+    def save_previous(self):
+        """Remember positions before a tick so drawing can interpolate between ticks"""
+        self.player.save_previous()
+        if self.swarm is not None:
+            self.swarm.save_previous()
+        else:
+            for enemy in self.enemies:
+                enemy.save_previous()
+        self.prev_camera_x = self.camera_x
+        self.prev_camera_y = self.camera_y
 
-    def update(self):
-        """Update game state"""
+    def advance(self, dt, keys=None):
+        """Run as many fixed ticks as dt seconds of real time (e.g. clock.tick() / 1000) allow, returns how many ran"""
+        ticks = self.timestep.advance(dt)
+        # Una riga del profiler per frame disegnato: i tick di recupero si sommano nelle stesse fasi
+        self.profiler.begin_frame()
+        for _ in range(ticks):
+            self.save_previous()
+            self.update(keys)
+        return ticks
+
+    def get_render_camera(self):
+        """Get the camera position interpolated between the last two ticks"""
+        alpha = self.timestep.alpha
+        return (lerp(self.prev_camera_x, self.camera_x, alpha),
+                lerp(self.prev_camera_y, self.camera_y, alpha))
+
+    def update(self, keys=None):
+        """Update game state, reading the keyboard unless keys are given"""
         if self.paused or self.game_over:
             return
+        profiler = self.profiler
+        profiler.resume()
+        self.tick += 1
 
         # Update time survived
-        self.time_survived += 1/FPS
+        self.time_survived += self.timestep.tick_time
 
         # Handle input
-        keys = pygame.key.get_pressed()
+        if keys is None:
+            keys = pygame.key.get_pressed()
         self.player.handle_input(keys)
+        profiler.mark("input")
         
         # Update player
         self.player.update()
+        profiler.mark("player")
         
         # Update enemies
         player_pos = self.player.get_position()
-        player_noise = self.player.get_noise_level()
-        for enemy in self.enemies:
-            enemy.update(player_pos, player_noise)
+        self.navigator.begin_frame()
+        self.flow_field.update(self.player.rect.center)
+        self.noise_field.update(self.player.rect.center, self.player.get_noise_level())
+        
+        # Test line of sight and read the noise heard in one batch, only for the enemies updated this tick
+        if self.swarm is not None:
+            centers = self.swarm.get_centers()
+            sight = self.line_of_sight.check(self.player.rect.center, centers, ENEMY_DETECTION_RANGE)
+            self.swarm.update(player_pos, self.noise_field.get_levels(centers), sight)
+        else:
+            due = self.ai_scheduler.get_due(self.enemies)
+            centers = [self.enemies[i].rect.center for i in due]
+            sight = self.line_of_sight.check(self.player.rect.center, centers, ENEMY_DETECTION_RANGE)
+            heard = self.noise_field.get_levels(centers).tolist()
+            # Solo i nemici aggiornati si sono spostati
+            for i in self.ai_scheduler.update(self.enemies, player_pos, due, heard, sight):
+                self.enemy_hash.move(i, self.enemies[i].rect)
+        profiler.mark("enemies")
         
         # Update environment
         self.environment.update_lighting()
+        self.environment.update_particles((self.camera_x, self.camera_y))
+        profiler.mark("lighting")
         
         # Update camera
         self.update_camera()
+        profiler.mark("camera")
         
         # Check various game conditions
         self.check_room_exploration()
         self.check_enemy_avoidance()
         self.check_extraction()
+        profiler.mark("checks")
         
         # Handle collisions
         self.handle_collisions()
+        profiler.mark("collisions")
 
     def draw_hud(self, screen):
         """Draw heads-up display"""
         try:
+            lines = self.hud_lines
+            
             # Health bar
             health_text = f"Health: {self.player.health}/{self.player.max_health}"
-            health_surface = self.font.render(health_text, True, WHITE)
-            screen.blit(health_surface, (20, 20))
+            screen.blit(lines['health'].render(health_text), (20, 20))
             
             # Stamina bar
             stamina_text = f"Stamina: {int(self.player.stamina)}/{self.player.max_stamina}"
-            stamina_surface = self.font.render(stamina_text, True, WHITE)
-            screen.blit(stamina_surface, (20, 50))
+            screen.blit(lines['stamina'].render(stamina_text), (20, 50))
+            
+            # Time survived
+            time_text = f"Time: {int(self.time_survived)}s"
+            screen.blit(lines['time'].render(time_text), (20, 80))
             
             # Level info
             level_text = f"Level {self.current_level}: {BACKROOMS_LEVELS[self.current_level]['name']}"
-            level_surface = self.font.render(level_text, True, WHITE)
-            screen.blit(level_surface, (20, 80))
+            screen.blit(lines['level'].render(level_text), (20, 110))
             
             # Experience
             exp_text = f"XP: {self.player.experience_gained}"
-            exp_surface = self.font.render(exp_text, True, WHITE)
-            screen.blit(exp_surface, (20, 110))
+            screen.blit(lines['experience'].render(exp_text), (20, 140))
             
             # Stats
             stats_text = f"Rooms: {len(self.rooms_explored)} | Avoided: {self.enemies_avoided}"
-            stats_surface = self.font.render(stats_text, True, WHITE)
-            screen.blit(stats_surface, (20, 140))
+            screen.blit(lines['stats'].render(stats_text), (20, 170))
             
             # Noise level indicator
             noise_level = self.player.get_noise_level()
@@ -221,8 +373,7 @@ class GameState:
                 max(0, 255 - noise_level * 2),
                 0
             )
-            noise_surface = self.font.render(noise_text, True, noise_color)
-            screen.blit(noise_surface, (20, 170))
+            screen.blit(lines['noise'].render(noise_text, noise_color), (20, 200))
             
         except Exception as e:
             logging.error(f"Error drawing HUD: {str(e)}")
@@ -231,8 +382,7 @@ class GameState:
         """Draw game over screen overlay"""
         try:
             # Semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            overlay.fill(BLACK)
+            overlay = render_targets.clear("overlay", (SCREEN_WIDTH, SCREEN_HEIGHT), BLACK)
             overlay.set_alpha(192)
             screen.blit(overlay, (0, 0))
             
@@ -244,7 +394,7 @@ class GameState:
                 title_text = "GAME OVER"
                 title_color = RED
             
-            title_surface = self.large_font.render(title_text, True, title_color)
+            title_surface = text_cache.render(self.large_font, title_text, title_color)
             title_rect = title_surface.get_rect(center=(SCREEN_WIDTH//2, 
                                                       SCREEN_HEIGHT//2 - 50))
             screen.blit(title_surface, title_rect)
@@ -259,88 +409,108 @@ class GameState:
             
             y_offset = 20
             for text in stats_text:
-                surface = self.font.render(text, True, WHITE)
+                surface = text_cache.render(self.font, text, WHITE)
                 rect = surface.get_rect(center=(SCREEN_WIDTH//2, 
                                               SCREEN_HEIGHT//2 + y_offset))
                 screen.blit(surface, rect)
                 y_offset += 30
             
             # Instructions
-            instructions = self.font.render("Press SPACE to restart", True, WHITE)
+            instructions = text_cache.render(self.font, "Press SPACE to restart", WHITE)
             inst_rect = instructions.get_rect(center=(SCREEN_WIDTH//2, 
-                                                    SCREEN_HEIGHT//2 + 100))
+                                                    SCREEN_HEIGHT//2 + 150))
             screen.blit(instructions, inst_rect)
             
         except Exception as e:
             logging.error(f"Error drawing game over screen: {str(e)}")
 
     def draw(self, screen):
-        """Draw game state"""
+        """Draw game state, returns the changed rectangles for pygame.display.update or None to flip"""
+        if self.paused or self.game_over:
+            return self.draw_frozen(screen)
+        self.frozen_screen = None
+        
+        profiler = self.profiler
+        profiler.resume()
         try:
-            # Clear screen
-            screen.fill(BLACK)
-            
-            # Draw environment
-            self.environment.draw(screen, (self.camera_x, self.camera_y))
-            
-            # Draw enemies
-            for enemy in self.enemies:
-                enemy.draw(screen)
-            
-            # Draw player
-            self.player.draw(screen)
-            
-            # Draw HUD
-            self.draw_hud(screen)
+            self.draw_world(screen)
+            profiler.end_frame()
             
-            # Draw pause/game over screen if necessary
-            if self.paused:
-                self.draw_pause_screen(screen)
-            elif self.game_over:
-                self.draw_game_over_screen(screen)
+            # Draw profiler overlay
+            profiler.draw(screen)
                 
         except Exception as e:
             logging.error(f"Error drawing game state: {str(e)}")
+        return None
 
-    def draw_hud(self, screen):
-        """Draw heads-up display"""
+    def draw_world(self, screen):
+        """Draw environment, entities and HUD"""
+        profiler = self.profiler
+        
+        # Clear screen
+        screen.fill(BLACK)
+        
+        # Draw environment
+        alpha = self.timestep.alpha
+        camera = self.get_render_camera()
+        self.environment.draw(screen, camera)
+        profiler.mark("environment_draw")
+        
+        # Draw enemies
+        if self.swarm is not None:
+            self.swarm.draw(screen, alpha, camera)
+        else:
+            for enemy in self.enemies:
+                enemy.draw(screen, alpha, camera)
+        
+        # Draw player
+        self.player.draw(screen, alpha, camera)
+        profiler.mark("entity_draw")
+        
+        # Draw HUD
+        self.draw_hud(screen)
+        profiler.mark("hud")
+
+    def draw_frozen(self, screen):
+        """Draw the pause/game over screen over a copy of the last gameplay frame"""
+        frozen_screen = "paused" if self.paused else "game_over"
+        # Niente è cambiato dall'ultimo frame: non c'è nulla da aggiornare
+        if frozen_screen == self.frozen_screen:
+            return []
+        
         try:
-            # Health bar
-            health_text = f"Health: {self.player.health}"
-            health_surface = self.font.render(health_text, True, WHITE)
-            screen.blit(health_surface, (20, 20))
-            
-            # Time survived
-            time_text = f"Time: {int(self.time_survived)}s"
-            time_surface = self.font.render(time_text, True, WHITE)
-            screen.blit(time_surface, (20, 50))
+            snapshot = render_targets.get("frozen_frame", screen.get_size())
+            if self.frozen_screen is None:
+                # Lo schermo contiene ancora l'ultimo frame di gioco: copiarlo costa un blit,
+                # ridisegnarlo rifarebbe tutto il mondo con flicker e polvere diversi
+                snapshot.blit(screen, (0, 0))
+            screen.blit(snapshot, (0, 0))
             
-            # Noise level indicator
-            noise_level = self.player.get_noise_level()
-            noise_text = f"Noise: {'!' * (noise_level // 20)}"
-            noise_surface = self.font.render(noise_text, True, 
-                                           (255, min(255, noise_level * 2), 0))
-            screen.blit(noise_surface, (20, 80))
+            if self.paused:
+                self.draw_pause_screen(screen)
+            else:
+                self.draw_game_over_screen(screen)
+            self.frozen_screen = frozen_screen
             
         except Exception as e:
-            logging.error(f"Error drawing HUD: {str(e)}")
+            logging.error(f"Error drawing frozen screen: {str(e)}")
+        return None
 
     def draw_pause_screen(self, screen):
         """Draw pause screen overlay"""
         try:
             # Semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            overlay.fill(BLACK)
+            overlay = render_targets.clear("overlay", (SCREEN_WIDTH, SCREEN_HEIGHT), BLACK)
             overlay.set_alpha(128)
             screen.blit(overlay, (0, 0))
             
             # Pause text
-            pause_text = self.large_font.render("PAUSED", True, WHITE)
+            pause_text = text_cache.render(self.large_font, "PAUSED", WHITE)
             text_rect = pause_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
             screen.blit(pause_text, text_rect)
             
             # Instructions
-            instructions = self.font.render("Press ESC to resume", True, WHITE)
+            instructions = text_cache.render(self.font, "Press ESC to resume", WHITE)
             inst_rect = instructions.get_rect(center=(SCREEN_WIDTH//2, 
                                                     SCREEN_HEIGHT//2 + 50))
             screen.blit(instructions, inst_rect)
@@ -348,61 +518,17 @@ class GameState:
         except Exception as e:
             logging.error(f"Error drawing pause screen: {str(e)}")
 
-    def draw_game_over_screen(self, screen):
-        """Draw game over screen overlay"""
-        try:
-            # Semi-transparent overlay
-            overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            overlay.fill(BLACK)
-            overlay.set_alpha(192)
-            screen.blit(overlay, (0, 0))
-            
-            # Game over message
-            if self.extraction_successful:
-                title_text = "EXTRACTION SUCCESSFUL"
-                title_color = (0, 255, 0)
-            else:
-                title_text = "GAME OVER"
-                title_color = (255, 0, 0)
-            
-            title_surface = self.large_font.render(title_text, True, title_color)
-            title_rect = title_surface.get_rect(center=(SCREEN_WIDTH//2, 
-                                                      SCREEN_HEIGHT//2 - 50))
-            screen.blit(title_surface, title_rect)
-            
-            # Stats
-            stats_text = [
-                f"Time Survived: {int(self.time_survived)}s",
-                f"Items Collected: {self.items_collected}",
-                f"Enemies Avoided: {self.enemies_avoided}"
-            ]
-            
-            y_offset = 20
-            for text in stats_text:
-                surface = self.font.render(text, True, WHITE)
-                rect = surface.get_rect(center=(SCREEN_WIDTH//2, 
-                                              SCREEN_HEIGHT//2 + y_offset))
-                screen.blit(surface, rect)
-                y_offset += 30
-            
-            # Instructions
-            instructions = self.font.render("Press SPACE to restart", True, WHITE)
-            inst_rect = instructions.get_rect(center=(SCREEN_WIDTH//2, 
-                                                    SCREEN_HEIGHT//2 + 100))
-            screen.blit(instructions, inst_rect)
-            
-        except Exception as e:
-            logging.error(f"Error drawing game over screen: {str(e)}")
-
     def handle_event(self, event):
         """Handle game events"""
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_ESCAPE:
                 self.paused = not self.paused
+            elif event.key == PROFILER_TOGGLE_KEY:
+                self.profiler.toggle_overlay()
             elif event.key == pygame.K_SPACE and self.game_over:
                 return "restart"
         return None
 
     def reset(self):
-        """Reset game state"""
-        self.__init__()
+        """Reset game state, keeping the class, level, seed, engine and store it was created with"""
+        self.__init__(*self.init_args)
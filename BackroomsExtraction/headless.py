@@ -0,0 +1,186 @@
+import os
+import time
+import logging
+
+# Niente finestra né audio: il driver dummy deve essere scelto prima di pygame.init()
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+from settings import *
+from game_state import GameState
+from save_store import create_temp_store
+from game_logging import setup_logging
+
+
+class KeyState:
+    def __init__(self, pressed=()):
+        """Stand-in for pygame.key.get_pressed(), indexable by key code"""
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class ScriptedInput:
+    def __init__(self, script, loop=True):
+        """Input from a script of (steps, keys) segments"""
+        self.script = [(steps, KeyState(keys)) for steps, keys in script]
+        self.loop = loop
+        self.segment = 0
+        self.remaining = self.script[0][0] if self.script else 0
+
+    def get_keys(self, game_state):
+        """Get the keys held during the next step"""
+        if not self.script:
+            return KeyState()
+        while self.remaining <= 0:
+            self.segment += 1
+            if self.segment >= len(self.script):
+                if not self.loop:
+                    return KeyState()
+                self.segment = 0
+            self.remaining = self.script[self.segment][0]
+        self.remaining -= 1
+        return self.script[self.segment][1]
+
+
+class RecordedInput:
+    def __init__(self, frames=None):
+        """Input replayed from one set of pressed keys per step"""
+        self.frames = [KeyState(keys) for keys in frames or []]
+        self.index = 0
+
+    @classmethod
+    def load(cls, path):
+        """Load a recording saved by InputRecorder.save"""
+        frames = []
+        with open(path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                frames.append([int(key) for key in line.split(',')] if line else [])
+        return cls(frames)
+
+    def get_keys(self, game_state):
+        """Get the keys held during the next step, nothing once the recording ends"""
+        if self.index >= len(self.frames):
+            return KeyState()
+        keys = self.frames[self.index]
+        self.index += 1
+        return keys
+
+
+class PolicyInput:
+    def __init__(self, policy):
+        """Input chosen by a policy(game_state) returning the keys to hold"""
+        self.policy = policy
+
+    def get_keys(self, game_state):
+        """Get the keys held during the next step"""
+        return KeyState(self.policy(game_state))
+
+
+class InputRecorder:
+    def __init__(self, source, keys=None):
+        """Wrap an input source and remember the watched keys it pressed each step"""
+        self.source = source
+        self.keys = keys or (pygame.K_w, pygame.K_a, pygame.K_s, pygame.K_d,
+                             pygame.K_LSHIFT, pygame.K_LCTRL)
+        self.frames = []
+
+    def get_keys(self, game_state):
+        """Get the keys from the wrapped source and record them"""
+        keys = self.source.get_keys(game_state)
+        self.frames.append([key for key in self.keys if keys[key]])
+        return keys
+
+    def save(self, path):
+        """Save the recording, one comma separated line of key codes per step"""
+        try:
+            with open(path, 'w') as f:
+                for frame in self.frames:
+                    f.write(','.join(str(key) for key in frame) + '\n')
+        except Exception as e:
+            logging.error(f"Failed to save input recording: {str(e)}")
+
+
+class HeadlessSimulation:
+    def __init__(self, input_source=None, selected_class=None, selected_level=0,
+                 seed=None, enemy_engine=None, store=None):
+        """GameState stepped without drawing, as fast as the CPU allows, saving to a temporary store by default"""
+        if not pygame.get_init():
+            pygame.init()
+        if pygame.display.get_surface() is None:
+            pygame.display.set_mode((1, 1))
+        self.input_source = input_source or ScriptedInput([])
+        self.own_store = create_temp_store() if store is None else None
+        self.game_state = GameState(selected_class, selected_level, seed, enemy_engine,
+                                    store if store is not None else self.own_store)
+        # Il budget a tempo dell'AI dipende dalla velocità della macchina: senza, i replay sono identici
+        self.game_state.ai_scheduler.budget_ms = None
+        self.steps = 0
+
+    def step(self):
+        """Advance the simulation by one tick"""
+        keys = self.input_source.get_keys(self.game_state)
+        self.game_state.update(keys)
+        self.steps += 1
+
+    def run(self, steps, stop_on_game_over=True):
+        """Run up to steps ticks and report how fast they went"""
+        game_state = self.game_state
+        start = time.perf_counter()
+        done = 0
+        for _ in range(steps):
+            if stop_on_game_over and game_state.game_over:
+                break
+            self.step()
+            done += 1
+        elapsed = time.perf_counter() - start
+
+        return {
+            'steps': done,
+            'seconds': elapsed,
+            'ticks_per_second': done / elapsed if elapsed > 0 else 0.0,
+            'speedup': done / FPS / elapsed if elapsed > 0 else 0.0,
+            'time_survived': game_state.time_survived,
+            'game_over': game_state.game_over,
+            'extraction_successful': game_state.extraction_successful,
+            'health': game_state.player.health,
+            'rooms_explored': len(game_state.rooms_explored),
+            'enemies_avoided': game_state.enemies_avoided,
+        }
+
+    def close(self):
+        """Close the temporary store made for this simulation, if any"""
+        if self.own_store is not None:
+            self.own_store.close()
+            self.own_store = None
+
+
+def wander_policy(game_state):
+    """Simple policy that walks towards the nearest extraction point"""
+    player_x, player_y = game_state.player.get_position()
+    points = game_state.environment.extraction_points
+    if not points:
+        return ()
+    target = min(points, key=lambda p: (p[0] - player_x) ** 2 + (p[1] - player_y) ** 2)
+    keys = []
+    if target[0] > player_x + 4:
+        keys.append(pygame.K_d)
+    elif target[0] < player_x - 4:
+        keys.append(pygame.K_a)
+    if target[1] > player_y + 4:
+        keys.append(pygame.K_s)
+    elif target[1] < player_y - 4:
+        keys.append(pygame.K_w)
+    return keys
+
+
+if __name__ == "__main__":
+    setup_logging(None, logging.WARNING)
+    simulation = HeadlessSimulation(PolicyInput(wander_policy), seed=0)
+    report = simulation.run(FPS * 60 * 10)
+    simulation.close()
+    print(f"{report['steps']} ticks in {report['seconds']:.2f}s "
+          f"({report['ticks_per_second']:.0f} ticks/s, {report['speedup']:.0f}x real time)")
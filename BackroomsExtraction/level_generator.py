@@ -0,0 +1,43 @@
+import logging
+
+# Modalità di generazione delle stanze
+GENERATOR_RANDOM = "random"  # Posizionamento casuale con tentativi (originale)
+GENERATOR_GRID = "grid"  # Impacchettamento su griglia, deterministico dato il seed
+
+# Dimensioni delle stanze in tile
+MIN_ROOM_TILES = 5
+MAX_ROOM_TILES = 10
+# Spazio minimo tra due stanze in tile
+ROOM_GAP_TILES = 1
+
+
+def pack_rooms(rng, map_size, num_rooms):
+    """Place num_rooms non-overlapping rooms on a jittered grid, as (x, y, w, h) in tiles"""
+    # Ogni stanza ha la sua cella: nessun tentativo a vuoto e nessuna sovrapposizione
+    map_width, map_height = map_size
+    min_cell = MIN_ROOM_TILES + ROOM_GAP_TILES
+    cell = MAX_ROOM_TILES + ROOM_GAP_TILES
+
+    # Rimpicciolisce le celle finché la mappa non contiene tutte le stanze
+    if (map_width // cell) * (map_height // cell) < num_rooms:
+        cell = max(min_cell, int((map_width * map_height / max(1, num_rooms)) ** 0.5))
+        while cell > min_cell and (map_width // cell) * (map_height // cell) < num_rooms:
+            cell -= 1
+
+    columns = map_width // cell
+    rows = map_height // cell
+    capacity = columns * rows
+    if capacity < num_rooms:
+        logging.warning(f"Map {map_width}x{map_height} fits only {capacity} of {num_rooms} rooms")
+        num_rooms = capacity
+
+    max_room = min(MAX_ROOM_TILES, cell - ROOM_GAP_TILES)
+    rooms = []
+    for index in rng.sample(range(capacity), num_rooms):
+        column, row = index % columns, index // columns
+        width = rng.randint(MIN_ROOM_TILES, max_room)
+        height = rng.randint(MIN_ROOM_TILES, max_room)
+        x = column * cell + rng.randint(0, cell - ROOM_GAP_TILES - width)
+        y = row * cell + rng.randint(0, cell - ROOM_GAP_TILES - height)
+        rooms.append((x, y, width, height))
+    return rooms
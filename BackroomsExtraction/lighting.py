@@ -0,0 +1,87 @@
+import logging
+from collections import OrderedDict
+
+import numpy
+import pygame
+
+# Numero di livelli di intensità distinti per cui viene generata una maschera
+LIGHT_INTENSITY_BUCKETS = 16
+# Numero massimo di maschere tenute in memoria
+LIGHT_CACHE_SIZE = 64
+
+
+class LightMaskCache:
+    def __init__(self, buckets=LIGHT_INTENSITY_BUCKETS, max_size=LIGHT_CACHE_SIZE):
+        """Bounded LRU cache of radial light masks with whole-pixel radius and quantized intensity"""
+        self.buckets = buckets
+        self.max_size = max_size
+        self.masks = OrderedDict()  # (radius, bucket) -> Surface
+        self.falloffs = {}  # radius -> float32 array with the 0-1 falloff, kept while a mask uses it
+        self.radius_masks = {}  # radius -> number of cached masks with that radius
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, intensity):
+        """Map an intensity in the 0-1 range to its bucket index"""
+        intensity = max(0.0, min(1.0, intensity))
+        return int(round(intensity * self.buckets))
+
+    def get(self, radius, intensity):
+        """Get the light mask for a radius and intensity, building it if needed"""
+        key = (int(round(radius)), self.quantize(intensity))
+        mask = self.masks.get(key)
+        if mask is not None:
+            self.masks.move_to_end(key)
+            self.hits += 1
+            return mask
+
+        self.misses += 1
+        radius = key[0]
+        mask = self.build_mask(radius, key[1] / self.buckets)
+        self.masks[key] = mask
+        self.radius_masks[radius] = self.radius_masks.get(radius, 0) + 1
+        if len(self.masks) > self.max_size:
+            (evicted, _), _ = self.masks.popitem(last=False)
+            # La curva di un raggio se ne va con l'ultima maschera che la usa
+            self.radius_masks[evicted] -= 1
+            if not self.radius_masks[evicted]:
+                del self.radius_masks[evicted]
+                self.falloffs.pop(evicted, None)
+        return mask
+
+    def get_falloff(self, radius):
+        """Get the linear falloff (1 at the center, 0 at the edge) for a radius"""
+        falloff = self.falloffs.get(radius)
+        if falloff is None:
+            offsets = numpy.arange(radius * 2, dtype=numpy.float32) - radius
+            distance = numpy.sqrt(offsets[:, None] ** 2 + offsets[None, :] ** 2)
+            falloff = numpy.clip(1 - distance / radius, 0, 1)
+            self.falloffs[radius] = falloff
+        return falloff
+
+    def build_mask(self, radius, intensity):
+        """Build a white SRCALPHA mask whose alpha fades out from the center"""
+        surface = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        surface.fill((255, 255, 255, 0))
+        try:
+            alpha = pygame.surfarray.pixels_alpha(surface)
+            alpha[...] = (self.get_falloff(radius) * (255 * intensity)).astype(numpy.uint8)
+            del alpha  # Sblocca la superficie
+        except Exception as e:
+            logging.error(f"Failed to build light mask: {str(e)}")
+        return surface
+
+    def clear(self):
+        """Drop every cached mask and falloff"""
+        self.masks.clear()
+        self.radius_masks.clear()
+        self.falloffs.clear()
+
+    def get_stats(self):
+        """Get cache statistics"""
+        return {
+            'size': len(self.masks),
+            'falloffs': len(self.falloffs),
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,76 @@
+import numpy
+from tilemap import WALKABLE
+
+# Campioni per cella lungo ogni raggio
+SIGHT_SAMPLES_PER_CELL = 3
+
+
+class LineOfSight:
+    def __init__(self, tile_map, samples_per_cell=SIGHT_SAMPLES_PER_CELL):
+        """Batched line-of-sight tests on the tile map, cached per (viewer cell, target cell)"""
+        self.tile_map = tile_map
+        self.samples_per_cell = samples_per_cell
+        self.target_cell = None
+        self.cells = None  # Tile map storage the cache refers to
+        self.cache = {}  # viewer cell -> visible
+        self.rays = 0
+        self.cache_hits = 0
+
+    def check(self, target_pos, positions, max_distance=None):
+        """Get a list telling which positions can see target_pos without a wall in between"""
+        tile_map = self.tile_map
+        size = tile_map.cell_size
+        target_cell = tile_map.get_cell(target_pos)
+        if target_cell != self.target_cell or tile_map.cells is not self.cells:
+            self.target_cell = target_cell
+            self.cells = tile_map.cells
+            self.cache = {}
+        if len(positions) == 0:
+            return []
+
+        points = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 2)
+        viewer_cells = (points // size).astype(numpy.int64)
+        keys = list(map(tuple, viewer_cells.tolist()))
+        visible = numpy.zeros(len(keys), dtype=bool)
+
+        # Chi è troppo lontano non vede comunque il bersaglio
+        in_range = numpy.ones(len(keys), dtype=bool)
+        if max_distance is not None:
+            delta = points - numpy.asarray(target_pos, dtype=numpy.float64)
+            in_range = (delta ** 2).sum(axis=1) <= max_distance ** 2
+
+        pending = {}
+        for i, key in enumerate(keys):
+            if not in_range[i]:
+                continue
+            cached = self.cache.get(key)
+            if cached is None:
+                pending.setdefault(key, []).append(i)
+            else:
+                visible[i] = cached
+                self.cache_hits += 1
+
+        if pending:
+            results = self.cast_rays(numpy.array(list(pending), dtype=numpy.int64), target_cell)
+            for (key, indices), result in zip(pending.items(), results.tolist()):
+                self.cache[key] = result
+                visible[indices] = result
+
+        return visible.tolist()
+
+    def cast_rays(self, viewer_cells, target_cell):
+        """Cast one ray per viewer cell to the target cell in a single vectorized pass"""
+        tile_map = self.tile_map
+        self.rays += len(viewer_cells)
+        start = viewer_cells + 0.5
+        end = numpy.asarray(target_cell, dtype=numpy.float64) + 0.5
+        span = int(numpy.abs(viewer_cells - numpy.asarray(target_cell)).max()) + 1
+        steps = numpy.linspace(0.0, 1.0, span * self.samples_per_cell + 1)
+
+        xs = numpy.floor(start[:, 0:1] + (end[0] - start[:, 0:1]) * steps).astype(numpy.int64)
+        ys = numpy.floor(start[:, 1:2] + (end[1] - start[:, 1:2]) * steps).astype(numpy.int64)
+        inside = (xs >= 0) & (xs < tile_map.width) & (ys >= 0) & (ys < tile_map.height)
+        grid = tile_map.grid
+        open_cells = numpy.zeros(xs.shape, dtype=bool)
+        open_cells[inside] = grid[ys[inside], xs[inside]] == WALKABLE
+        return open_cells.all(axis=1)
@@ -1,9 +1,25 @@
 import pygame
 import logging
-import random
 import math
+import numpy
 from settings import *
 from survivor import SurvivorManager
+from render_targets import render_targets
+from fonts import font_registry, text_cache
+from particles import ParticleSystem
+
+# Opacità finale dello sfondo del menu
+MENU_BACKGROUND_ALPHA = 200
+
+# Particelle dello sfondo; oltre il limite di particelle mosse si ridisegna tutto
+MENU_PARTICLE_COUNT = 50
+MENU_DIRTY_LIMIT = 400
+
+# Frame pre-renderizzati dei bottoni: passi di hover e di fade
+BUTTON_HOVER_STEPS = 10
+BUTTON_FADE_STEPS = 8
+# Ampiezza della pulsazione in hover, in pixel
+BUTTON_PULSE = 5
 
 class Button:
     def __init__(self, x, y, width, height, text, font_size=FONT_SIZE_MEDIUM):
@@ -18,12 +34,7 @@ class Button:
         self.normal_color = (*DARK_GRAY, 255)
         self.hover_color = (*LIGHT_GRAY, 255)
         self.text_color = (*WHITE, 255)
-        
-        try:
-            self.font = pygame.font.Font(None, self.font_size)
-        except Exception as e:
-            logging.error(f"Failed to load font: {str(e)}")
-            self.font = pygame.font.SysFont('arial', self.font_size)
+        self.font = font_registry.get(self.font_size)
 
     def update(self, mouse_pos):
         """Update button state based on mouse position"""
@@ -38,71 +49,114 @@ class Button:
         # Aggiorna fade
         self.alpha = min(255, self.alpha + 10)
 
+    def get_hover_step(self):
+        """Hover blend quantized to one of HOVER_STEPS + 1 frames"""
+        return int(round(self.hover_effect * BUTTON_HOVER_STEPS))
+
+    def get_fade_step(self):
+        """Fade alpha quantized to one of FADE_STEPS + 1 frames"""
+        return int(round(self.alpha * BUTTON_FADE_STEPS / 255))
+
+    def get_pulse(self):
+        """Current pulse inflation in pixels, 0 when not hovered"""
+        return int(round(math.sin(pygame.time.get_ticks() * 0.005) * BUTTON_PULSE * self.hover_effect))
+
+    def is_highlighted(self):
+        """Check if the button is animating its hover effect and is drawn over the cached contents"""
+        return self.hover_effect > 0
+
+    def get_frame_key(self):
+        """Describe what the cached contents layer holds for this button"""
+        return (self.get_fade_step(), self.is_hovered, self.is_highlighted())
+
+    def get_overlay_key(self):
+        """Describe the hover frame drawn over the contents layer"""
+        return (self.get_hover_step(), self.get_pulse())
+
+    def get_overlay_rect(self):
+        """Area the pulsing button can cover"""
+        return self.rect.inflate(BUTTON_PULSE, BUTTON_PULSE)
+
+    def build_gradient(self):
+        """Build the vertical multiply gradient shared by every button of this size"""
+        gradient_surface = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
+        for i in range(self.rect.height):
+            alpha = int(128 + (i / self.rect.height) * 127)
+            pygame.draw.line(gradient_surface, (*WHITE, alpha), 
+                           (0, i), (self.rect.width, i))
+        return gradient_surface
+
+    def build_frame(self, hover_step, fade_step):
+        """Render the button for a quantized hover blend and fade alpha"""
+        hover_effect = hover_step / BUTTON_HOVER_STEPS
+        size = (self.rect.width, self.rect.height)
+        
+        # Crea superficie per il bottone con alpha
+        button_surface = pygame.Surface(size, pygame.SRCALPHA)
+        
+        # Calcola colore corrente basato su hover
+        current_color = [
+            int(self.normal_color[i] + (self.hover_color[i] - self.normal_color[i]) * hover_effect)
+            for i in range(3)
+        ]
+        current_color.append(fade_step * 255 // BUTTON_FADE_STEPS)  # Aggiungi alpha
+        
+        # Disegna il bordo del bottone
+        pygame.draw.rect(button_surface, current_color, 
+                       (0, 0, self.rect.width, self.rect.height), 
+                       border_radius=10)
+        
+        # Aggiungi effetto gradiente
+        gradient_surface = render_targets.get_sprite(("button_gradient", size), self.build_gradient)
+        button_surface.blit(gradient_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        
+        # Renderizza il testo
+        text_surface = text_cache.render(self.font, self.text, self.text_color)
+        text_rect = text_surface.get_rect(center=button_surface.get_rect().center)
+        button_surface.blit(text_surface, text_rect)
+        return button_surface
+
+    def get_frame(self, hover_step, fade_step):
+        """Get the cached frame, shared by buttons with the same size and label"""
+        key = ("button", self.rect.size, self.text, self.font_size, hover_step, fade_step)
+        return render_targets.get_sprite(key, lambda: self.build_frame(hover_step, fade_step))
+
     def draw(self, screen):
         """Draw the button with effects"""
         try:
-            # Crea superficie per il bottone con alpha
-            button_surface = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-            
-            # Calcola colore corrente basato su hover
-            current_color = [
-                int(self.normal_color[i] + (self.hover_color[i] - self.normal_color[i]) * self.hover_effect)
-                for i in range(3)
-            ]
-            current_color.append(self.alpha)  # Aggiungi alpha
-            
-            # Disegna il bottone con effetto pulsante quando hover
-            hover_expansion = math.sin(pygame.time.get_ticks() * 0.005) * 5 * self.hover_effect
-            hover_rect = self.rect.inflate(hover_expansion, hover_expansion)
-            
-            # Disegna il bordo del bottone
-            pygame.draw.rect(button_surface, current_color, 
-                           (0, 0, self.rect.width, self.rect.height), 
-                           border_radius=10)
+            frame = self.get_frame(self.get_hover_step(), self.get_fade_step())
             
-            # Aggiungi effetto gradiente
-            gradient_surface = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-            for i in range(self.rect.height):
-                alpha = int(128 + (i / self.rect.height) * 127)
-                pygame.draw.line(gradient_surface, (*WHITE, alpha), 
-                               (0, i), (self.rect.width, i))
-            button_surface.blit(gradient_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-            
-            # Renderizza il testo
-            text_surface = self.font.render(self.text, True, self.text_color)
-            text_rect = text_surface.get_rect(center=button_surface.get_rect().center)
-            button_surface.blit(text_surface, text_rect)
-            
-            # Disegna il bottone sullo schermo
-            screen.blit(button_surface, self.rect)
+            # Effetto pulsante quando hover: il frame viene scalato, non ridisegnato
+            pulse = self.get_pulse()
+            if pulse:
+                hover_rect = self.rect.inflate(pulse, pulse)
+                screen.blit(pygame.transform.smoothscale(frame, hover_rect.size), hover_rect)
+            else:
+                screen.blit(frame, self.rect)
             
         except Exception as e:
             logging.error(f"Error drawing button: {str(e)}")
 
 class Menu:
-    def __init__(self):
+    def __init__(self, store=None):
         self.state = "main"  # main, class_select, level_select, credits
         self.buttons = {}
         self.background_alpha = 0
         self.title_alpha = 0
+        self.contents_key = None  # Stato gia' disegnato sul livello dei contenuti
+        self.overlay_keys = []  # Frames of the highlighted buttons drawn over the contents
         
         # Survivor manager per la selezione della classe
-        self.survivor_manager = SurvivorManager()
+        self.survivor_manager = SurvivorManager(store)
         self.selected_class = None
         self.selected_level = None
         
         # Effetti particellari per lo sfondo
-        self.particles = []
+        self.particles = None
         
-        try:
-            self.title_font = pygame.font.Font(None, FONT_SIZE_LARGE * 2)
-            self.subtitle_font = pygame.font.Font(None, FONT_SIZE_MEDIUM)
-            self.description_font = pygame.font.Font(None, FONT_SIZE_SMALL)
-        except Exception as e:
-            logging.error(f"Failed to load fonts: {str(e)}")
-            self.title_font = pygame.font.SysFont('arial', FONT_SIZE_LARGE * 2)
-            self.subtitle_font = pygame.font.SysFont('arial', FONT_SIZE_MEDIUM)
-            self.description_font = pygame.font.SysFont('arial', FONT_SIZE_SMALL)
+        self.title_font = font_registry.get(FONT_SIZE_LARGE * 2)
+        self.subtitle_font = font_registry.get(FONT_SIZE_MEDIUM)
+        self.description_font = font_registry.get(FONT_SIZE_SMALL)
             
         self.setup_menu()
         self.generate_particles()
@@ -166,7 +220,7 @@ class Menu:
             desc = stats['description']
             
             # Draw description
-            desc_surface = self.description_font.render(desc, True, WHITE)
+            desc_surface = text_cache.render(self.description_font, desc, WHITE)
             desc_rect = desc_surface.get_rect(
                 center=(SCREEN_WIDTH//2, SCREEN_HEIGHT - 150))
             screen.blit(desc_surface, desc_rect)
@@ -176,8 +230,7 @@ class Menu:
             for stat, value in stats.items():
                 if stat != 'description':
                     stat_text = f"{stat.capitalize()}: {value}"
-                    stat_surface = self.description_font.render(stat_text, 
-                                                              True, LIGHT_GRAY)
+                    stat_surface = text_cache.render(self.description_font, stat_text, LIGHT_GRAY)
                     stat_rect = stat_surface.get_rect(
                         center=(SCREEN_WIDTH//2, stat_y))
                     screen.blit(stat_surface, stat_rect)
@@ -189,15 +242,15 @@ class Menu:
             level_data = BACKROOMS_LEVELS[level_id]
             
             # Draw description
-            desc_surface = self.description_font.render(
-                level_data['description'], True, WHITE)
+            desc_surface = text_cache.render(
+                self.description_font, level_data['description'], WHITE)
             desc_rect = desc_surface.get_rect(
                 center=(SCREEN_WIDTH//2, SCREEN_HEIGHT - 150))
             screen.blit(desc_surface, desc_rect)
             
             # Draw difficulty
-            diff_surface = self.description_font.render(
-                f"Difficulty: {level_data['difficulty']}", True, 
+            diff_surface = text_cache.render(
+                self.description_font, f"Difficulty: {level_data['difficulty']}",
                 GREEN if level_data['difficulty'] == 'Normal' else RED)
             diff_rect = diff_surface.get_rect(
                 center=(SCREEN_WIDTH//2, SCREEN_HEIGHT - 120))
@@ -205,40 +258,22 @@ class Menu:
 
     def generate_particles(self):
         """Generate background particles"""
-        for _ in range(50):
-            x = random.randint(0, SCREEN_WIDTH)
-            y = random.randint(0, SCREEN_HEIGHT)
-            speed = random.uniform(0.5, 2.0)
-            size = random.randint(1, 3)
-            self.particles.append({
-                'pos': [x, y],
-                'speed': speed,
-                'size': size,
-                'alpha': random.randint(50, 200)
-            })
+        self.particles = ParticleSystem((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.particles.spawn(MENU_PARTICLE_COUNT, velocity_y=(0.5, 2.0), alpha=(50, 200))
+        self.particle_corners = None  # Particle positions on screen at the last draw
 
     def update_particles(self):
         """Update particle positions and properties"""
-        for particle in self.particles:
-            particle['pos'][1] += particle['speed']
-            if particle['pos'][1] > SCREEN_HEIGHT:
-                particle['pos'][1] = 0
-                particle['pos'][0] = random.randint(0, SCREEN_WIDTH)
+        self.particles.update()
 
     def draw_particles(self, screen):
         """Draw background particles"""
-        particle_surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        for particle in self.particles:
-            pygame.draw.circle(particle_surface, 
-                             (255, 255, 255, particle['alpha']),
-                             (int(particle['pos'][0]), int(particle['pos'][1])),
-                             particle['size'])
-        screen.blit(particle_surface, (0, 0))
+        self.particles.draw(screen)
 
     def update(self, mouse_pos):
         """Update menu state"""
         # Aggiorna fade degli elementi
-        self.background_alpha = min(200, self.background_alpha + 5)
+        self.background_alpha = min(MENU_BACKGROUND_ALPHA, self.background_alpha + 5)
         self.title_alpha = min(255, self.title_alpha + 5)
         
         # Aggiorna particelle
@@ -280,74 +315,170 @@ class Menu:
                                 self.state = "main"
         return None
 
+    def get_contents_key(self):
+        """Describe everything drawn on the contents layer, to know when to rebuild it"""
+        return (self.state, tuple(button.get_frame_key() for button in self.buttons[self.state]))
+
+    def get_highlighted(self):
+        """Get the buttons of the current state drawn over the contents layer"""
+        return [button for button in self.buttons[self.state] if button.is_highlighted()]
+
+    def is_fading(self):
+        """Check if the fade-in is still running"""
+        return self.background_alpha < MENU_BACKGROUND_ALPHA or self.title_alpha < 255
+
     def draw(self, screen):
-        """Draw the menu"""
+        """Draw the menu, returns the changed rectangles or None for the whole screen"""
         try:
-            # Disegna sfondo scuro con fade
-            background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-            background.fill(BLACK)
-            background.set_alpha(self.background_alpha)
-            screen.blit(background, (0, 0))
+            # Durante il fade-in lo sfondo sfuma sul frame precedente: serve il ridisegno completo
+            if self.is_fading():
+                self.draw_full(screen)
+                self.contents_key = None
+                return None
             
-            # Disegna particelle
-            self.draw_particles(screen)
+            key = self.get_contents_key()
+            if key != self.contents_key:
+                contents = render_targets.clear("menu_contents", (SCREEN_WIDTH, SCREEN_HEIGHT),
+                                                (0, 0, 0, 0), pygame.SRCALPHA)
+                self.draw_contents(contents, skip_highlighted=True)
+                self.contents_key = key
+                self.compose(screen, contents)
+                return None
             
-            # Disegna titolo con effetto fade
-            title_text = self.title_font.render("Backrooms Extraction", True, WHITE)
-            title_text.set_alpha(self.title_alpha)
-            title_rect = title_text.get_rect(center=(SCREEN_WIDTH//2, 150))
-            screen.blit(title_text, title_rect)
+            return self.draw_dirty(screen)
             
-            # Disegna sottotitolo specifico per ogni stato
-            if self.state == "main":
-                subtitle_text = self.subtitle_font.render(
-                    "Survive. Extract. Escape.", True, LIGHT_GRAY)
-                subtitle_rect = subtitle_text.get_rect(
-                    center=(SCREEN_WIDTH//2, 220))
-                screen.blit(subtitle_text, subtitle_rect)
-            elif self.state == "class_select":
-                subtitle_text = self.subtitle_font.render(
-                    "Choose Your Class", True, LIGHT_GRAY)
-                subtitle_rect = subtitle_text.get_rect(
-                    center=(SCREEN_WIDTH//2, 220))
-                screen.blit(subtitle_text, subtitle_rect)
-            elif self.state == "level_select":
-                subtitle_text = self.subtitle_font.render(
-                    "Select Backrooms Level", True, LIGHT_GRAY)
-                subtitle_rect = subtitle_text.get_rect(
-                    center=(SCREEN_WIDTH//2, 220))
-                screen.blit(subtitle_text, subtitle_rect)
-            
-            # Disegna i bottoni dello stato corrente
-            for button in self.buttons[self.state]:
-                button.draw(screen)
-                if self.state == "class_select" and button.is_hovered:
-                    self.draw_class_info(screen, button.text)
-                elif self.state == "level_select" and button.is_hovered:
-                    try:
-                        level_num = int(button.text.split()[-1])
-                        self.draw_level_info(screen, level_num)
-                    except ValueError:
-                        pass
-            
-            # Disegna i credits se necessario
-            if self.state == "credits":
-                credits_text = [
-                    "Backrooms Extraction",
-                    "A Horror Extraction Game",
-                    "",
-                    "Created by: Your Name",
-                    "Graphics: Procedurally Generated",
-                    "",
-                    "Thanks for playing!"
-                ]
-                
-                y = 150
-                for line in credits_text:
-                    text = self.subtitle_font.render(line, True, WHITE)
-                    rect = text.get_rect(center=(SCREEN_WIDTH//2, y))
-                    screen.blit(text, rect)
-                    y += 40
-                    
         except Exception as e:
             logging.error(f"Error drawing menu: {str(e)}")
+            return None
+
+    def compose(self, screen, contents):
+        """Redraw the whole menu from the black background, particles, contents layer and highlighted buttons"""
+        screen.fill(BLACK)
+        self.particles.draw(screen)
+        screen.blit(contents, (0, 0))
+        highlighted = self.get_highlighted()
+        for button in highlighted:
+            button.draw(screen)
+        self.overlay_keys = [button.get_overlay_key() for button in highlighted]
+        self.particle_corners = self.particles.get_rects()
+
+    def draw_dirty(self, screen):
+        """Redraw only the areas the particles left or entered and the buttons whose hover frame changed"""
+        contents = render_targets.get("menu_contents", (SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        corners = self.particles.get_rects()
+        previous = self.particle_corners
+        if previous is None or len(previous) != len(corners):
+            self.compose(screen, contents)
+            return None
+        moved = numpy.flatnonzero((corners != previous).any(axis=1))
+        # Con troppe particelle in movimento conviene ridisegnare tutto
+        if len(moved) > MENU_DIRTY_LIMIT:
+            self.compose(screen, contents)
+            return None
+        self.particle_corners = corners
+        
+        # La pulsazione cambia il frame del bottone, non il livello dei contenuti
+        highlighted = self.get_highlighted()
+        overlay_keys = [button.get_overlay_key() for button in highlighted]
+        dirty = [button.get_overlay_rect() for button, key, old_key
+                 in zip(highlighted, overlay_keys, self.overlay_keys) if key != old_key]
+        self.overlay_keys = overlay_keys
+        
+        cell = self.particles.cell
+        for i in moved.tolist():
+            old_rect = pygame.Rect(previous[i].tolist(), (cell, cell))
+            rect = pygame.Rect(corners[i].tolist(), (cell, cell))
+            # Una particella che ricomincia dall'alto non deve sporcare tutta la colonna
+            if rect.colliderect(old_rect):
+                dirty.append(rect.union(old_rect))
+            else:
+                dirty.extend((old_rect, rect))
+        if not dirty:
+            return []
+        
+        # Ogni area viene ricomposta per intero: sfondo, particelle, contenuti e bottoni evidenziati
+        rects = [pygame.Rect(corner, (cell, cell)) for corner in corners.tolist()]
+        overlay_rects = [button.get_overlay_rect() for button in highlighted]
+        for area in dirty:
+            screen.set_clip(area)
+            screen.fill(BLACK, area)
+            self.particles.draw(screen, indices=area.collidelistall(rects))
+            screen.blit(contents, area, area)
+            for i in area.collidelistall(overlay_rects):
+                highlighted[i].draw(screen)
+        screen.set_clip(None)
+        return dirty
+
+    def draw_full(self, screen):
+        """Draw the whole menu over the previous frame"""
+        # Disegna sfondo scuro con fade
+        background = render_targets.clear("menu_background", (SCREEN_WIDTH, SCREEN_HEIGHT), BLACK)
+        background.set_alpha(self.background_alpha)
+        screen.blit(background, (0, 0))
+        
+        # Disegna particelle
+        self.draw_particles(screen)
+        
+        self.draw_contents(screen)
+
+    def draw_contents(self, screen, skip_highlighted=False):
+        """Draw title, buttons and texts of the current state, optionally leaving out the highlighted buttons"""
+        # Disegna titolo con effetto fade
+        title_text = text_cache.render(self.title_font, "Backrooms Extraction", WHITE)
+        title_rect = title_text.get_rect(center=(SCREEN_WIDTH//2, 150))
+        # La superficie è condivisa: l'alpha va ripristinato dopo il blit
+        title_text.set_alpha(self.title_alpha)
+        screen.blit(title_text, title_rect)
+        title_text.set_alpha(None)
+        
+        # Disegna sottotitolo specifico per ogni stato
+        if self.state == "main":
+            subtitle_text = text_cache.render(
+                self.subtitle_font, "Survive. Extract. Escape.", LIGHT_GRAY)
+            subtitle_rect = subtitle_text.get_rect(
+                center=(SCREEN_WIDTH//2, 220))
+            screen.blit(subtitle_text, subtitle_rect)
+        elif self.state == "class_select":
+            subtitle_text = text_cache.render(
+                self.subtitle_font, "Choose Your Class", LIGHT_GRAY)
+            subtitle_rect = subtitle_text.get_rect(
+                center=(SCREEN_WIDTH//2, 220))
+            screen.blit(subtitle_text, subtitle_rect)
+        elif self.state == "level_select":
+            subtitle_text = text_cache.render(
+                self.subtitle_font, "Select Backrooms Level", LIGHT_GRAY)
+            subtitle_rect = subtitle_text.get_rect(
+                center=(SCREEN_WIDTH//2, 220))
+            screen.blit(subtitle_text, subtitle_rect)
+        
+        # Disegna i bottoni dello stato corrente
+        for button in self.buttons[self.state]:
+            if not (skip_highlighted and button.is_highlighted()):
+                button.draw(screen)
+            if self.state == "class_select" and button.is_hovered:
+                self.draw_class_info(screen, button.text)
+            elif self.state == "level_select" and button.is_hovered:
+                try:
+                    level_num = int(button.text.split()[-1])
+                    self.draw_level_info(screen, level_num)
+                except ValueError:
+                    pass
+        
+        # Disegna i credits se necessario
+        if self.state == "credits":
+            credits_text = [
+                "Backrooms Extraction",
+                "A Horror Extraction Game",
+                "",
+                "Created by: Your Name",
+                "Graphics: Procedurally Generated",
+                "",
+                "Thanks for playing!"
+            ]
+            
+            y = 150
+            for line in credits_text:
+                text = text_cache.render(self.subtitle_font, line, WHITE)
+                rect = text.get_rect(center=(SCREEN_WIDTH//2, y))
+                screen.blit(text, rect)
+                y += 40
@@ -0,0 +1,246 @@
+import heapq
+import math
+import logging
+from collections import OrderedDict
+
+# Numero massimo di percorsi (stanza di partenza, stanza di arrivo) in memoria
+PATH_CACHE_SIZE = 512
+# Numero massimo di ricerche A* per frame
+PATH_REQUESTS_PER_FRAME = 4
+# Celle espanse al massimo da una ricerca sulla griglia prima di arrendersi
+CELL_SEARCH_NODES = 4096
+
+# Passi verso le 8 celle vicine con il loro costo
+CELL_STEPS = ((1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+              (1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (-1, -1, math.sqrt(2)))
+
+
+def find_cell_path(tile_map, start, goal=None, is_goal=None, max_nodes=CELL_SEARCH_NODES):
+    """A* over walkable cells from start to goal, or to the nearest cell passing is_goal; None if not found"""
+    width = tile_map.width
+    height = tile_map.height
+    cells = tile_map.cells
+    if not tile_map.is_walkable_cell(*start):
+        return None
+    if goal is not None:
+        if not tile_map.is_walkable_cell(*goal):
+            return None
+        is_goal = goal.__eq__
+        goal_x, goal_y = goal
+
+    def estimate(x, y):
+        # Distanza ottagonale: ammissibile con passi diagonali da sqrt(2)
+        if goal is None:
+            return 0.0
+        dx = abs(x - goal_x)
+        dy = abs(y - goal_y)
+        return dx + dy + (math.sqrt(2) - 2) * min(dx, dy)
+
+    costs = {start: 0.0}
+    came_from = {start: None}
+    frontier = [(estimate(*start), 0.0, start)]
+    expanded = 0
+    while frontier:
+        _, cost, cell = heapq.heappop(frontier)
+        if cost > costs[cell]:
+            continue
+        if is_goal(cell):
+            path = []
+            while cell is not None:
+                path.append(cell)
+                cell = came_from[cell]
+            path.reverse()
+            return path
+        expanded += 1
+        if expanded > max_nodes:
+            return None
+
+        x, y = cell
+        for dx, dy, step in CELL_STEPS:
+            nx, ny = x + dx, y + dy
+            if nx < 0 or nx >= width or ny < 0 or ny >= height or not cells[ny * width + nx]:
+                continue
+            # Niente scorciatoie diagonali attraverso gli angoli dei muri
+            if dx and dy and not (cells[y * width + nx] and cells[ny * width + x]):
+                continue
+            new_cost = cost + step
+            neighbour = (nx, ny)
+            if new_cost < costs.get(neighbour, math.inf):
+                costs[neighbour] = new_cost
+                came_from[neighbour] = cell
+                heapq.heappush(frontier, (new_cost + estimate(nx, ny), new_cost, neighbour))
+    return None
+
+
+class Navigator:
+    def __init__(self, environment, max_requests=PATH_REQUESTS_PER_FRAME, cache_size=PATH_CACHE_SIZE):
+        """A* pathfinding over the room graph with a per-frame search budget"""
+        self.environment = environment
+        self.max_requests = max_requests
+        self.cache_size = cache_size
+        self.budget = max_requests
+        self.paths = OrderedDict()  # (start room, goal room) -> [room index] or None
+        self.edge_cells = {}  # edge -> cells of its corridor, from the first room to the second
+        self.graph = None
+        self.cells = None
+
+        # Statistiche
+        self.hits = 0
+        self.misses = 0
+        self.deferred = 0
+
+    def begin_frame(self):
+        """Reset the search budget, call once per frame"""
+        self.budget = self.max_requests
+
+    def invalidate(self):
+        """Forget every cached path"""
+        self.paths.clear()
+        self.edge_cells.clear()
+
+    def check_graph(self):
+        """Invalidate the cache when the level has been regenerated"""
+        graph = self.environment.room_graph
+        cells = self.environment.tile_map.cells
+        if graph is not self.graph or cells is not self.cells:
+            self.graph = graph
+            self.cells = cells
+            self.edges = graph.edges.tolist()
+            self.centers = graph.centers.tolist()
+            self.offsets = graph.offsets.tolist()
+            self.neighbours = graph.neighbours.tolist()
+            self.neighbour_edges = graph.neighbour_edges.tolist()
+            self.lengths = graph.lengths.tolist()
+            self.invalidate()
+
+    def find_room_path(self, start, goal):
+        """Get the room indices from start to goal with A*, or None if unreachable"""
+        centers = self.centers
+        goal_x, goal_y = centers[goal]
+        costs = {start: 0.0}
+        came_from = {start: None}
+        frontier = [(0.0, 0.0, start)]
+
+        while frontier:
+            _, cost, node = heapq.heappop(frontier)
+            # Voce superata da un costo migliore trovato dopo l'inserimento
+            if cost > costs[node]:
+                continue
+            if node == goal:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = came_from[node]
+                path.reverse()
+                return path
+
+            for i in range(self.offsets[node], self.offsets[node + 1]):
+                neighbour = self.neighbours[i]
+                new_cost = cost + self.lengths[self.neighbour_edges[i]]
+                if new_cost < costs.get(neighbour, math.inf):
+                    costs[neighbour] = new_cost
+                    came_from[neighbour] = node
+                    x, y = centers[neighbour]
+                    heapq.heappush(frontier, (new_cost + math.hypot(goal_x - x, goal_y - y), new_cost, neighbour))
+        return None
+
+    def get_room_path(self, start, goal):
+        """Get a cached room path, or False when this frame's budget is exhausted"""
+        key = (start, goal)
+        if key in self.paths:
+            self.paths.move_to_end(key)
+            self.hits += 1
+            return self.paths[key]
+
+        if self.budget <= 0:
+            self.deferred += 1
+            return False
+        self.budget -= 1
+        self.misses += 1
+
+        path = self.find_room_path(start, goal)
+        self.paths[key] = path
+        if len(self.paths) > self.cache_size:
+            self.paths.popitem(last=False)
+        if path is None:
+            logging.warning(f"No path between rooms {start} and {goal}")
+        return path
+
+    def get_edge_cells(self, start, goal):
+        """Get the cells of the corridor from the center of room start to the center of room goal"""
+        edge = self.graph.get_edge(start, goal)
+        cells = self.edge_cells.get(edge)
+        if cells is None:
+            tile_map = self.environment.tile_map
+            a, b = self.edges[edge]
+            cells = find_cell_path(tile_map, tile_map.get_cell(self.centers[a]),
+                                   tile_map.get_cell(self.centers[b]))
+            if cells is None:
+                cells = [tile_map.get_cell(self.centers[a]), tile_map.get_cell(self.centers[b])]
+            self.edge_cells[edge] = cells
+        return cells if start == self.edges[edge][0] else cells[::-1]
+
+    def find_room_cells(self, pos):
+        """Get the cells from pos to the nearest room and that room, or ([], room) inside one"""
+        room = self.environment.get_room_at_position(pos)
+        if room is not None:
+            return [], room
+        environment = self.environment
+        tile_map = environment.tile_map
+
+        def get_room(cell):
+            return environment.get_room_at_position(tile_map.get_cell_center(cell))
+
+        cells = find_cell_path(tile_map, tile_map.get_cell(pos),
+                               is_goal=lambda cell: get_room(cell) is not None)
+        if cells is None:
+            return None, None
+        return cells, get_room(cells[-1])
+
+    def get_path(self, start_pos, goal_pos):
+        """Get cell-center waypoints from start_pos to goal_pos, or None if the budget is exhausted"""
+        self.check_graph()
+        start_room = self.environment.get_room_at_position(start_pos)
+        goal_room = self.environment.get_room_at_position(goal_pos)
+        if start_room is not None and start_room is goal_room:
+            # Le stanze sono rettangoli: dentro la stessa basta la linea retta
+            return [goal_pos]
+
+        if start_room is None or goal_room is None:
+            # Da o verso un corridoio serve una ricerca sulla griglia fino alla stanza più vicina
+            if self.budget <= 0:
+                self.deferred += 1
+                return None
+            self.budget -= 1
+        start_cells, start_room = self.find_room_cells(start_pos)
+        goal_cells, goal_room = self.find_room_cells(goal_pos)
+        if start_room is None or goal_room is None:
+            return [goal_pos]
+
+        rooms = self.get_room_path(start_room.index, goal_room.index)
+        if rooms is False:
+            return None
+        if rooms is None:
+            return [goal_pos]
+
+        # I corridoi sono linee rasterizzate: si seguono cella per cella, da centro a centro
+        cells = list(start_cells)
+        for room, next_room in zip(rooms, rooms[1:]):
+            cells.extend(self.get_edge_cells(room, next_room))
+        cells.extend(reversed(goal_cells))
+        tile_map = self.environment.tile_map
+        waypoints = []
+        for i, cell in enumerate(cells):
+            if i == 0 or cell != cells[i - 1]:
+                waypoints.append(tile_map.get_cell_center(cell))
+        waypoints.append(goal_pos)
+        return waypoints
+
+    def get_stats(self):
+        """Get cache and budget statistics"""
+        return {
+            'cached': len(self.paths),
+            'hits': self.hits,
+            'misses': self.misses,
+            'deferred': self.deferred
+        }
@@ -0,0 +1,176 @@
+import heapq
+
+import numpy
+import pygame
+from settings import *
+
+# Frazione del rumore che passa da una porta
+NOISE_DOOR_FACTOR = 0.6
+# Rumore perso per ogni tile di corridoio tra i centri di due stanze
+NOISE_FALLOFF = 1.0
+# Sotto questo livello il rumore smette di propagarsi
+NOISE_MIN_LEVEL = 1.0
+# Livello dal quale un nemico sente il giocatore
+NOISE_HEARING_THRESHOLD = 25
+
+
+class NoiseField:
+    def __init__(self, environment):
+        """Player noise spread through rooms, doors and corridors, read per position in O(1)"""
+        self.environment = environment
+        self.graph = None
+        self.cells = None
+        self.num_rooms = 0
+        self.width = 0
+        self.height = 0
+        self.cell_size = TILE_SIZE
+        self.zones = numpy.zeros((0, 0), dtype=numpy.int32)  # (row, column) -> zone, -1 outside
+        self.zone_list = []  # Flat copy of zones for scalar reads
+        # Zone: prima le stanze, poi un corridoio per arco del grafo; l'ultimo posto resta silenzioso
+        self.levels = [0.0]
+        self.level_array = numpy.zeros(1)
+        self.touched = []  # Zones given a level by the last propagation
+        self.source = None  # (zone, noise level) of the last propagation
+
+        # Statistiche
+        self.propagations = 0
+        self.skipped = 0
+
+    def check_level(self):
+        """Relabel the zones when the level has been regenerated"""
+        environment = self.environment
+        if environment.room_graph is not self.graph or environment.tile_map.cells is not self.cells:
+            self.build()
+
+    def build(self):
+        """Label every cell with the room or corridor it belongs to"""
+        environment = self.environment
+        graph = environment.room_graph
+        tile_map = environment.tile_map
+        self.graph = graph
+        self.cells = tile_map.cells
+        self.num_rooms = graph.num_nodes
+        self.width = tile_map.width
+        self.height = tile_map.height
+        self.cell_size = tile_map.cell_size
+        self.offsets = graph.offsets.tolist()
+        self.neighbours = graph.neighbours.tolist()
+        self.neighbour_edges = graph.neighbour_edges.tolist()
+        self.edges = graph.edges.tolist()
+        self.lengths = (graph.lengths / self.cell_size).tolist()  # In tile
+
+        zones = numpy.full((self.height, self.width), -1, dtype=numpy.int32)
+        # I corridoi partono dai centri delle stanze: le stanze, etichettate dopo, li coprono
+        for edge, (start, end, width) in enumerate(environment.corridors[:graph.num_edges]):
+            tile_map.fill_line(zones, start, end, width, self.num_rooms + edge)
+        for edge, door in enumerate(graph.doors.tolist()):
+            tile_map.fill_rect(zones, pygame.Rect(door), self.num_rooms + edge)
+        for index, room in enumerate(environment.rooms[:self.num_rooms]):
+            tile_map.fill_rect(zones, room.rect, index)
+        self.zones = zones
+        self.zone_list = zones.ravel().tolist()
+
+        self.levels = [0.0] * (self.num_rooms + graph.num_edges + 1)
+        self.level_array = numpy.zeros(len(self.levels))
+        self.touched = []
+        self.source = None
+
+    def get_zone(self, pos):
+        """Get the zone containing a world position, -1 if outside every room and corridor"""
+        column = int(pos[0] // self.cell_size)
+        row = int(pos[1] // self.cell_size)
+        if 0 <= column < self.width and 0 <= row < self.height:
+            return self.zone_list[row * self.width + column]
+        return -1
+
+    def update(self, pos, noise_level):
+        """Spread the noise made at pos, only if the noise or its zone changed; returns True if it did"""
+        self.check_level()
+        zone = self.get_zone(pos)
+        if zone < 0 and self.source is not None:
+            # Sulla soglia di una porta o contro un muro vale l'ultima zona
+            zone = self.source[0]
+        if (zone, noise_level) == self.source:
+            self.skipped += 1
+            return False
+        self.source = (zone, noise_level)
+        self.propagate(zone, noise_level)
+        return True
+
+    def propagate(self, zone, noise_level):
+        """Recompute the levels from a noise made in zone, touching only the zones it reaches"""
+        self.propagations += 1
+        levels = self.levels
+        for touched in self.touched:
+            levels[touched] = 0.0
+        touched = self.touched = []
+
+        frontier = []
+        if zone >= self.num_rooms:
+            # Da un corridoio il rumore raggiunge le due stanze che collega
+            edge = zone - self.num_rooms
+            levels[zone] = float(noise_level)
+            touched.append(zone)
+            level = noise_level * NOISE_DOOR_FACTOR - self.lengths[edge] / 2 * NOISE_FALLOFF
+            if level >= NOISE_MIN_LEVEL:
+                for room in self.edges[edge]:
+                    levels[room] = level
+                    touched.append(room)
+                    frontier.append((-level, room))
+        elif zone >= 0 and noise_level >= NOISE_MIN_LEVEL:
+            levels[zone] = float(noise_level)
+            touched.append(zone)
+            frontier.append((-float(noise_level), zone))
+
+        # Dijkstra sul livello più alto: l'attenuazione è monotona, ogni stanza esce una volta sola
+        offsets = self.offsets
+        neighbours = self.neighbours
+        neighbour_edges = self.neighbour_edges
+        lengths = self.lengths
+        num_rooms = self.num_rooms
+        while frontier:
+            level, node = heapq.heappop(frontier)
+            level = -level
+            if level < levels[node]:
+                continue
+            through = level * NOISE_DOOR_FACTOR
+            for i in range(offsets[node], offsets[node + 1]):
+                edge = neighbour_edges[i]
+                corridor = num_rooms + edge
+                corridor_level = through - lengths[edge] / 2 * NOISE_FALLOFF
+                if corridor_level >= NOISE_MIN_LEVEL and corridor_level > levels[corridor]:
+                    if not levels[corridor]:
+                        touched.append(corridor)
+                    levels[corridor] = corridor_level
+                neighbour = neighbours[i]
+                neighbour_level = through - lengths[edge] * NOISE_FALLOFF
+                if neighbour_level >= NOISE_MIN_LEVEL and neighbour_level > levels[neighbour]:
+                    if not levels[neighbour]:
+                        touched.append(neighbour)
+                    levels[neighbour] = neighbour_level
+                    heapq.heappush(frontier, (-neighbour_level, neighbour))
+
+        self.level_array = numpy.array(levels)
+
+    def get_level(self, pos):
+        """Get the noise heard at a world position"""
+        return self.levels[self.get_zone(pos)]
+
+    def get_levels(self, positions):
+        """Get the noise heard at many world positions, as an array"""
+        points = numpy.asarray(positions, dtype=numpy.float64).reshape(-1, 2)
+        cells = (points // self.cell_size).astype(numpy.int64)
+        inside = ((cells[:, 0] >= 0) & (cells[:, 0] < self.width) &
+                  (cells[:, 1] >= 0) & (cells[:, 1] < self.height))
+        zones = numpy.full(len(cells), -1, dtype=numpy.int64)
+        zones[inside] = self.zones[cells[inside, 1], cells[inside, 0]]
+        return self.level_array[zones]
+
+    def get_stats(self):
+        """Get propagation counters"""
+        return {
+            'propagations': self.propagations,
+            'skipped': self.skipped,
+            'audible_zones': len(self.touched),
+            'zones': len(self.levels) - 1,
+        }
@@ -0,0 +1,151 @@
+import logging
+
+import numpy
+import pygame
+from settings import *
+from render_targets import render_targets
+
+# Livelli di trasparenza pre-renderizzati nell'atlante
+PARTICLE_ALPHA_LEVELS = 16
+# Raggi disponibili, in pixel
+PARTICLE_SIZES = (1, 2, 3)
+
+# Polvere negli ambienti: particelle per cella della mappa, colore, raggi e velocità massima
+DUST_PER_TILE = 1.0
+DUST_COLOR = (220, 210, 160)
+DUST_SIZES = (1, 2)
+DUST_SPEED = 0.3
+# La polvere vive solo attorno alla telecamera: celle di margine oltre lo schermo
+DUST_MARGIN = 4
+# Tick massimi tra due controlli delle particelle uscite, se la telecamera non cambia cella
+DUST_RECYCLE_INTERVAL = FPS
+
+
+class ParticleSystem:
+    def __init__(self, bounds, color=WHITE, sizes=PARTICLE_SIZES, rng=None):
+        """Particles stored in NumPy arrays, wrapping around a bounds area"""
+        self.bounds = numpy.array(bounds, dtype=numpy.float32)
+        # Ultimo valore float32 sotto i bordi: mod e prodotti in float32 possono arrotondare fino al bordo
+        self.limits = numpy.nextafter(self.bounds, numpy.float32(0))
+        self.color = tuple(color[:3])
+        self.sizes = tuple(sizes)
+        self.rng = rng if rng is not None else numpy.random.default_rng()
+        self.cell = max(self.sizes) * 2 + 1  # Side of one atlas cell
+        self.positions = numpy.zeros((0, 2), dtype=numpy.float32)
+        self.velocities = numpy.zeros((0, 2), dtype=numpy.float32)
+        self.size_index = numpy.zeros(0, dtype=numpy.int64)
+        self.alpha_index = numpy.zeros(0, dtype=numpy.int64)
+        self.sprite_index = numpy.zeros(0, dtype=numpy.int64)  # Atlas cell of each particle
+        self.areas = [(level * self.cell, row * self.cell, self.cell, self.cell)
+                      for row in range(len(self.sizes)) for level in range(PARTICLE_ALPHA_LEVELS)]
+
+    @property
+    def count(self):
+        """Number of live particles"""
+        return len(self.positions)
+
+    def spawn(self, count, velocity_x=(0.0, 0.0), velocity_y=(0.0, 0.0), alpha=(50, 200), cells=None,
+              cell_size=1):
+        """Add count particles with random speed, size and alpha, anywhere or in random (column, row) cells"""
+        rng = self.rng
+        if cells is None:
+            positions = rng.random((count, 2), dtype=numpy.float32) * self.bounds
+            numpy.minimum(positions, self.limits, out=positions)
+        else:
+            positions = self.get_cell_positions(count, cells, cell_size)
+        velocities = numpy.stack([rng.uniform(*velocity_x, count),
+                                  rng.uniform(*velocity_y, count)], axis=1).astype(numpy.float32)
+        alphas = rng.integers(alpha[0], alpha[1] + 1, count)
+        self.positions = numpy.concatenate((self.positions, positions))
+        self.velocities = numpy.concatenate((self.velocities, velocities))
+        self.size_index = numpy.concatenate((self.size_index, rng.integers(0, len(self.sizes), count)))
+        self.alpha_index = numpy.concatenate(
+            (self.alpha_index, alphas * (PARTICLE_ALPHA_LEVELS - 1) // 255))
+        self.sprite_index = self.size_index * PARTICLE_ALPHA_LEVELS + self.alpha_index
+
+    def get_cell_positions(self, count, cells, cell_size):
+        """Get count random positions inside random (column, row) cells"""
+        chosen = numpy.asarray(cells)[self.rng.integers(0, len(cells), count)]
+        positions = ((chosen + self.rng.random((count, 2))) * cell_size).astype(numpy.float32)
+        return numpy.minimum(positions, self.limits, out=positions)
+
+    def get_outside(self, region):
+        """Get a mask of the particles outside a (x, y, width, height) region"""
+        x, y, width, height = region
+        positions = self.positions
+        return ((positions[:, 0] < x) | (positions[:, 0] >= x + width) |
+                (positions[:, 1] < y) | (positions[:, 1] >= y + height))
+
+    def place(self, mask, cells, cell_size):
+        """Move the selected particles to random (column, row) cells, keeping speed, size and alpha"""
+        self.positions[mask] = self.get_cell_positions(int(numpy.count_nonzero(mask)), cells, cell_size)
+
+    def clear(self):
+        """Remove every particle"""
+        self.positions = self.positions[:0]
+        self.velocities = self.velocities[:0]
+        self.size_index = self.size_index[:0]
+        self.alpha_index = self.alpha_index[:0]
+        self.sprite_index = self.sprite_index[:0]
+
+    def update(self):
+        """Move every particle one step, re-entering from the opposite side when leaving"""
+        if self.count == 0:
+            return
+        positions = self.positions
+        positions += self.velocities
+        outside = (positions < 0) | (positions >= self.bounds)
+        wrapped = outside.any(axis=1)
+        if wrapped.any():
+            numpy.mod(positions, self.bounds, out=positions)
+            # Chi esce da un lato rientra dall'altro in un punto a caso
+            for axis in (0, 1):
+                moved = outside[:, axis]
+                if moved.any():
+                    other = 1 - axis
+                    positions[moved, other] = self.rng.random(moved.sum()) * self.bounds[other]
+            numpy.minimum(positions, self.limits, out=positions)
+
+    def build_atlas(self):
+        """Draw every size and alpha level into one sprite sheet"""
+        cell = self.cell
+        atlas = pygame.Surface((cell * PARTICLE_ALPHA_LEVELS, cell * len(self.sizes)), pygame.SRCALPHA)
+        atlas.fill((0, 0, 0, 0))
+        for row, size in enumerate(self.sizes):
+            for level in range(PARTICLE_ALPHA_LEVELS):
+                alpha = 255 * level // (PARTICLE_ALPHA_LEVELS - 1)
+                center = (level * cell + cell // 2, row * cell + cell // 2)
+                pygame.draw.circle(atlas, (*self.color, alpha), center, size)
+        return atlas
+
+    def get_atlas(self):
+        """Get the shared sprite sheet for this colour and set of sizes"""
+        return render_targets.get_sprite(("particle_atlas", self.color, self.sizes), self.build_atlas)
+
+    def get_rects(self, offset=(0, 0)):
+        """Get the (n, 2) top-left corners of the particles on a surface"""
+        corners = self.positions - numpy.array(offset, dtype=numpy.float32)
+        return corners.astype(numpy.int64) - self.cell // 2
+
+    def draw(self, surface, offset=(0, 0), indices=None):
+        """Draw the particles (or only the given indices) with a single blits call"""
+        if self.count == 0:
+            return
+        try:
+            cell = self.cell
+            corners = self.get_rects(offset)
+            if indices is None:
+                # Solo le particelle visibili sulla superficie
+                width, height = surface.get_size()
+                visible = ((corners[:, 0] > -cell) & (corners[:, 0] < width) &
+                           (corners[:, 1] > -cell) & (corners[:, 1] < height))
+                indices = numpy.flatnonzero(visible)
+            if len(indices) == 0:
+                return
+
+            atlas = self.get_atlas()
+            areas = self.areas
+            surface.blits([(atlas, corner, areas[sprite]) for corner, sprite in
+                           zip(corners[indices].tolist(), self.sprite_index[indices].tolist())], False)
+        except Exception as e:
+            logging.error(f"Error drawing particles: {str(e)}")
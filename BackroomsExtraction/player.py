@@ -1,17 +1,24 @@
 import pygame
 import logging
 from settings import *
+from game_logging import log_event
+from timestep import lerp
 from survivor import SurvivorManager
 
 class Player:
-    def __init__(self, x, y, survivor_class=None, survivor_manager=None):
+    def __init__(self, x, y, survivor_class=None, survivor_manager=None, tile_map=None):
         """Initialize the player with class-specific stats"""
         self.x = x
         self.y = y
         self.width = PLAYER_SIZE
         self.height = PLAYER_SIZE
         self.rect = pygame.Rect(x, y, self.width, self.height)
+        self.prev_x = x  # Position at the previous tick, for interpolation
+        self.prev_y = y
         self.direction = pygame.math.Vector2()
+        self.survivor_class = survivor_class
+        self.survivor_manager = survivor_manager
+        self.tile_map = tile_map  # Walls to slide along; without it the player stays on screen
         
         # Base stats (modificati dalle statistiche della classe)
         self.base_speed = 5
@@ -117,8 +124,14 @@ class Player:
             self.noise_level = int(40 / self.stealth) if self.is_moving else 0
             
         # Update position
-        self.x += self.direction.x * current_speed
-        self.y += self.direction.y * current_speed
+        dx = self.direction.x * current_speed
+        dy = self.direction.y * current_speed
+        if self.tile_map is not None:
+            self.x, self.y = self.tile_map.move_and_slide(self.x, self.y, self.width, self.height, dx, dy)
+        else:
+            # Keep player in bounds
+            self.x = max(0, min(self.x + dx, SCREEN_WIDTH - self.width))
+            self.y = max(0, min(self.y + dy, SCREEN_HEIGHT - self.height))
         
         # Update rectangle position
         self.rect.x = self.x
@@ -129,21 +142,17 @@ class Player:
             self.stamina = min(self.max_stamina, 
                              self.stamina + self.stamina_recovery_rate)
 
-        # Keep player in bounds
-        self.x = max(0, min(self.x, SCREEN_WIDTH - self.width))
-        self.y = max(0, min(self.y, SCREEN_HEIGHT - self.height))
-
     def take_damage(self, amount):
         """Handle player taking damage"""
         actual_damage = int(amount / self.strength)  # Più forte = meno danno
         self.health = max(0, self.health - actual_damage)
-        logging.info(f"Player took {actual_damage} damage. Health: {self.health}")
+        log_event("player_damage", amount=actual_damage, health=self.health)
         return self.health <= 0
 
     def heal(self, amount):
         """Handle player healing"""
         self.health = min(self.max_health, self.health + amount)
-        logging.info(f"Player healed {amount}. Health: {self.health}")
+        log_event("player_heal", amount=amount, health=self.health)
 
     def add_to_inventory(self, item):
         """Add item to inventory if there's space"""
@@ -162,19 +171,20 @@ class Player:
             return True
         return False
 
-    def draw(self, screen):
-        """Draw the player"""
+    def draw(self, screen, alpha=1.0, camera_pos=(0, 0)):
+        """Draw the player between its last two ticks, relative to the camera"""
         try:
-            screen.blit(self.image, self.rect)
+            rect = self.get_render_rect(alpha, camera_pos)
+            screen.blit(self.image, rect)
             
             # Draw health bar
             health_bar_width = 50
             health_bar_height = 5
             health_ratio = self.health / self.max_health
-            pygame.draw.rect(screen, RED, (self.rect.x, self.rect.y - 10,
+            pygame.draw.rect(screen, RED, (rect.x, rect.y - 10,
                                          health_bar_width, health_bar_height))
             pygame.draw.rect(screen, (0, 255, 0),
-                           (self.rect.x, self.rect.y - 10,
+                           (rect.x, rect.y - 10,
                             health_bar_width * health_ratio, health_bar_height))
             
             # Draw stamina bar
@@ -182,15 +192,25 @@ class Player:
             stamina_bar_height = 5
             stamina_ratio = self.stamina / self.max_stamina
             pygame.draw.rect(screen, LIGHT_GRAY,
-                           (self.rect.x, self.rect.y - 20,
+                           (rect.x, rect.y - 20,
                             stamina_bar_width, stamina_bar_height))
             pygame.draw.rect(screen, (0, 0, 255),
-                           (self.rect.x, self.rect.y - 20,
+                           (rect.x, rect.y - 20,
                             stamina_bar_width * stamina_ratio, stamina_bar_height))
             
         except Exception as e:
             logging.error(f"Error drawing player: {str(e)}")
 
+    def save_previous(self):
+        """Remember the current position before a simulation tick"""
+        self.prev_x = self.x
+        self.prev_y = self.y
+
+    def get_render_rect(self, alpha=1.0, camera_pos=(0, 0)):
+        """Get the screen rectangle interpolated between the last two ticks"""
+        return pygame.Rect(int(lerp(self.prev_x, self.x, alpha) - camera_pos[0]),
+                           int(lerp(self.prev_y, self.y, alpha) - camera_pos[1]), self.width, self.height)
+
     def get_position(self):
         """Get current player position"""
         return (self.x, self.y)
@@ -206,4 +226,8 @@ class Player:
     def add_experience(self, amount):
         """Add experience points"""
         self.experience_gained += amount
-        logging.info(f"Gained {amount} experience points. Total: {self.experience_gained}")
+        log_event("experience", amount=amount, total=self.experience_gained)
+        # I progressi della classe vengono salvati in background dal SurvivorManager
+        manager = self.survivor_manager
+        if manager and manager.is_selected(self.survivor_class):
+            manager.add_experience(amount)
@@ -0,0 +1,168 @@
+import time
+import logging
+
+import numpy
+import pygame
+from settings import *
+from fonts import font_registry, text_cache
+from render_targets import render_targets
+
+# Frame conservati nel buffer circolare
+PROFILER_HISTORY = 300
+# Tasto che mostra/nasconde l'overlay
+PROFILER_TOGGLE_KEY = pygame.K_F3
+
+# Fasi di GameState.update e GameState.draw, nell'ordine in cui vengono misurate
+UPDATE_STAGES = ("input", "player", "enemies", "lighting", "camera", "checks", "collisions")
+DRAW_STAGES = ("environment_draw", "entity_draw", "hud")
+FRAME_STAGES = UPDATE_STAGES + DRAW_STAGES
+
+
+class FrameProfiler:
+    def __init__(self, stages=FRAME_STAGES, history=PROFILER_HISTORY):
+        """Per-stage frame timings kept in a fixed-size ring buffer, in milliseconds"""
+        self.enabled = False
+        self.show_overlay = False
+        self.stages = tuple(stages)
+        self.columns = {stage: i for i, stage in enumerate(self.stages)}
+        self.history = history
+        self.samples = numpy.zeros((history, len(self.stages)))
+        self.row = self.samples[0]
+        self.frames = 0  # Frames recorded since the last reset
+        self.last = 0.0
+        self.csv_file = None
+
+    def set_enabled(self, enabled):
+        """Turn timing on or off, clearing the history when it starts"""
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def toggle_overlay(self):
+        """Show or hide the live breakdown, timing only while something uses it"""
+        self.show_overlay = not self.show_overlay
+        self.set_enabled(self.show_overlay or self.csv_file is not None)
+
+    def reset(self):
+        """Forget every recorded frame"""
+        self.samples[:] = 0
+        self.frames = 0
+        self.row = self.samples[0]
+
+    def begin_frame(self):
+        """Start a new row of timings"""
+        if not self.enabled:
+            return
+        self.row = self.samples[self.frames % self.history]
+        self.row[:] = 0
+        self.frames += 1
+        self.last = time.perf_counter()
+
+    def resume(self):
+        """Restart the clock without opening a new row, so gaps between stages are not counted"""
+        if not self.enabled:
+            return
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        """Charge the time since the previous mark to stage"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.row[self.columns[stage]] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        """Close the current row, streaming it to CSV if requested"""
+        if not self.enabled or self.csv_file is None:
+            return
+        try:
+            self.csv_file.write(f"{self.frames}," + ",".join(f"{value:.4f}" for value in self.row) + "\n")
+        except Exception as e:
+            logging.error(f"Failed to write profiler CSV: {str(e)}")
+            self.close_csv()
+
+    def get_recent(self):
+        """Get the recorded rows, oldest first"""
+        count = min(self.frames, self.history)
+        if self.frames <= self.history:
+            return self.samples[:count]
+        start = self.frames % self.history
+        return numpy.concatenate((self.samples[start:], self.samples[:start]))
+
+    def get_breakdown(self):
+        """Get {stage: (mean ms, max ms)} over the recorded frames"""
+        recent = self.get_recent()
+        if len(recent) == 0:
+            return {stage: (0.0, 0.0) for stage in self.stages}
+        means = recent.mean(axis=0)
+        peaks = recent.max(axis=0)
+        return {stage: (float(means[i]), float(peaks[i])) for i, stage in enumerate(self.stages)}
+
+    def open_csv(self, path):
+        """Stream every following frame to a CSV file"""
+        self.close_csv()
+        try:
+            self.csv_file = open(path, 'w')
+            self.csv_file.write("frame," + ",".join(self.stages) + "\n")
+            self.set_enabled(True)
+        except Exception as e:
+            logging.error(f"Failed to open profiler CSV: {str(e)}")
+            self.csv_file = None
+
+    def close_csv(self):
+        """Stop streaming frames to CSV"""
+        if self.csv_file is not None:
+            try:
+                self.csv_file.close()
+            except Exception as e:
+                logging.error(f"Failed to close profiler CSV: {str(e)}")
+            self.csv_file = None
+        self.set_enabled(self.show_overlay)
+
+    def export_csv(self, path):
+        """Write the frames currently in the ring buffer to a CSV file"""
+        try:
+            recent = self.get_recent()
+            first = self.frames - len(recent) + 1
+            with open(path, 'w') as f:
+                f.write("frame," + ",".join(self.stages) + "\n")
+                for i, row in enumerate(recent):
+                    f.write(f"{first + i}," + ",".join(f"{value:.4f}" for value in row) + "\n")
+        except Exception as e:
+            logging.error(f"Failed to export profiler CSV: {str(e)}")
+
+    def draw(self, screen):
+        """Draw the live per-stage breakdown"""
+        if not self.show_overlay:
+            return
+        try:
+            font = font_registry.get(FONT_SIZE_SMALL)
+            breakdown = self.get_breakdown()
+            line_height = font.get_linesize()
+            width = 320
+            height = line_height * (len(self.stages) + 2) + 10
+            x = SCREEN_WIDTH - width - 10
+            y = 10
+
+            panel = render_targets.clear("profiler_panel", (width, height), (0, 0, 0, 180), pygame.SRCALPHA)
+            screen.blit(panel, (x, y))
+
+            total = sum(mean for mean, _ in breakdown.values())
+            budget = 1000 / FPS
+            header = font.render(f"Frame {total:.2f} ms / {budget:.1f} ms", True,
+                                 RED if total > budget else WHITE)
+            screen.blit(header, (x + 5, y + 5))
+
+            # Una barra per fase, in proporzione al budget del frame
+            for i, stage in enumerate(self.stages):
+                mean, peak = breakdown[stage]
+                row_y = y + 5 + line_height * (i + 1)
+                bar = int(min(1.0, mean / budget) * 100)
+                pygame.draw.rect(screen, BLOOD_RED, (x + 5, row_y + 2, bar, line_height - 4))
+                screen.blit(text_cache.render(font, stage, WHITE), (x + 110, row_y))
+                for column, value in ((x + 260, mean), (x + 310, peak)):
+                    text = font.render(f"{value:.2f}", True, WHITE)
+                    screen.blit(text, text.get_rect(topright=(column, row_y)))
+        except Exception as e:
+            logging.error(f"Error drawing profiler overlay: {str(e)}")
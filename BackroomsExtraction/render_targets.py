@@ -0,0 +1,60 @@
+import pygame
+
+
+class RenderTargets:
+    def __init__(self):
+        """Pool of persistent render targets and pre-baked sprites"""
+        self.surfaces = {}  # (name, size, flags) -> Surface
+        self.sprites = {}  # name -> Surface
+        self.display = None
+        self.allocations = 0
+
+    def check_display(self):
+        """Drop pooled surfaces if the display mode changed since they were made"""
+        display = pygame.display.get_surface()
+        if display is not self.display:
+            self.display = display
+            self.surfaces.clear()
+            self.sprites.clear()
+
+    def create_surface(self, size, flags=0):
+        """Create a surface in the display format when a display is available"""
+        surface = pygame.Surface(size, flags)
+        if self.display is not None:
+            if flags & pygame.SRCALPHA:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+        self.allocations += 1
+        return surface
+
+    def get(self, name, size, flags=0):
+        """Get the persistent surface for a name, size and flags"""
+        self.check_display()
+        key = (name, tuple(size), flags)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.create_surface(size, flags)
+            self.surfaces[key] = surface
+        return surface
+
+    def clear(self, name, size, color, flags=0):
+        """Get a persistent surface filled in place with a color"""
+        surface = self.get(name, size, flags)
+        surface.fill(color)
+        return surface
+
+    def get_sprite(self, name, builder):
+        """Get a constant sprite, building it once with builder()"""
+        self.check_display()
+        sprite = self.sprites.get(name)
+        if sprite is None:
+            sprite = builder()
+            if self.display is not None:
+                sprite = sprite.convert_alpha()
+            self.sprites[name] = sprite
+        return sprite
+
+
+# Pool condiviso da Environment, GameState e Menu
+render_targets = RenderTargets()
@@ -0,0 +1,274 @@
+import numpy
+
+
+def build_cell_index(centers):
+    """Sort the rooms into grid cells about as large as the average spacing between them"""
+    # Celle grandi quanto la distanza media tra le stanze: ~1 stanza per cella
+    low = centers.min(axis=0)
+    extent = numpy.maximum(centers.max(axis=0) - low, 1)
+    cell_size = max(1.0, float(numpy.sqrt(extent[0] * extent[1] / len(centers))))
+    cells = ((centers - low) // cell_size).astype(numpy.int64)
+    columns = int(cells[:, 0].max()) + 1
+    rows = int(cells[:, 1].max()) + 1
+    return restrict_cell_index((cells, columns, rows, None, None, cell_size), numpy.arange(len(centers)))
+
+
+def restrict_cell_index(index, nodes):
+    """Get an index on the same grid holding only the given rooms"""
+    cells, columns, rows, _, _, cell_size = index
+    cell_ids = cells[nodes, 0] * rows + cells[nodes, 1]
+    order = numpy.argsort(cell_ids, kind='stable')
+    return cells, columns, rows, nodes[order], cell_ids[order], cell_size
+
+
+def get_ring_offsets(inner, outer, half=False):
+    """Get the cell offsets whose Chebyshev distance is in (inner, outer], optionally one per opposite pair"""
+    offsets = []
+    for dx in range(-outer, outer + 1):
+        for dy in range(-outer, outer + 1):
+            if not inner < max(abs(dx), abs(dy)) <= outer:
+                continue
+            if half and (dx < 0 or (dx == 0 and dy < 0)):
+                continue
+            offsets.append((dx, dy))
+    return offsets
+
+
+def expand_runs(starts, counts):
+    """Get the indices of the runs [start, start + count) laid end to end"""
+    total = int(counts.sum())
+    run_starts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    return numpy.repeat(starts, counts) + numpy.arange(total) - run_starts
+
+
+def get_cell_labels(index, labels):
+    """Get the label shared by all the indexed rooms of each cell, -1 for empty or mixed cells"""
+    _, columns, rows, order, sorted_ids, _ = index
+    cell_labels = numpy.full(columns * rows, -1, dtype=numpy.int64)
+    starts = numpy.flatnonzero(numpy.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    sorted_labels = labels[order]
+    low = numpy.minimum.reduceat(sorted_labels, starts)
+    pure = low == numpy.maximum.reduceat(sorted_labels, starts)
+    cell_labels[sorted_ids[starts[pure]]] = low[pure]
+    return cell_labels
+
+
+def find_cell_neighbours(index, offsets, nodes, skip=None):
+    """Pair each of nodes with the indexed rooms in the cells at the given offsets, as (sources, targets)
+
+    skip is an optional (cell_labels, labels) pair: cells whose label is the node's own are left out.
+    """
+    cells, columns, rows, order, sorted_ids, _ = index
+    offsets = numpy.asarray(offsets, dtype=numpy.int64).reshape(-1, 2)
+    nx = (cells[nodes, 0] + offsets[:, 0, None]).ravel()
+    ny = (cells[nodes, 1] + offsets[:, 1, None]).ravel()
+    nodes = numpy.tile(nodes, len(offsets))
+    valid = (nx >= 0) & (nx < columns) & (ny >= 0) & (ny < rows)
+    neighbour_ids = numpy.where(valid, nx * rows + ny, -1)
+    start = numpy.searchsorted(sorted_ids, neighbour_ids, 'left')
+    end = numpy.searchsorted(sorted_ids, neighbour_ids, 'right')
+    counts = numpy.where(valid, end - start, 0)
+    if skip is not None:
+        cell_labels, labels = skip
+        counts[valid & (cell_labels[neighbour_ids] == labels[nodes])] = 0
+    return numpy.repeat(nodes, counts), order[expand_runs(start, counts)]
+
+
+def find_candidate_edges(centers):
+    """Pair every room with the rooms in its own and the 8 surrounding grid cells"""
+    count = len(centers)
+    if count < 2:
+        return numpy.zeros((0, 2), dtype=numpy.int64)
+    index = build_cell_index(centers)
+    nodes = numpy.arange(count)
+    # Nella stessa cella ogni coppia una volta, poi metà dell'intorno: ogni coppia di celle una sola volta
+    src, dst = find_cell_neighbours(index, [(0, 0)], nodes)
+    keep = src < dst
+    pairs = [numpy.stack([src[keep], dst[keep]], axis=1)]
+    src, dst = find_cell_neighbours(index, get_ring_offsets(0, 1, half=True), nodes)
+    pairs.append(numpy.stack([numpy.minimum(src, dst), numpy.maximum(src, dst)], axis=1))
+    return numpy.unique(numpy.concatenate(pairs), axis=0)
+
+
+def find_nearest_pairs(centers, index, labels, sources):
+    """Get, for every group with rooms in sources, its closest (a, b) pair with b in another group, searching rings of cells outward"""
+    cells, columns, rows, _, _, cell_size = index
+    count = len(centers)
+    # Le stanze dello stesso gruppo nella stessa cella vedono le stesse celle: si cerca una volta
+    # per cella e gruppo, e si espande alle singole stanze solo nelle celle non vuote
+    keys = (cells[sources, 0] * rows + cells[sources, 1]) * count + labels[sources]
+    order = numpy.argsort(keys, kind='stable')
+    sources, keys = sources[order], keys[order]
+    slots = numpy.zeros(count, dtype=numpy.int64)
+    best_distance = numpy.full(count, numpy.inf)  # Per gruppo, indicizzato dall'etichetta
+    best_a = numpy.zeros(count, dtype=numpy.int64)
+    best_b = numpy.zeros(count, dtype=numpy.int64)
+    # Le celle occupate solo dal gruppo di chi cerca non vanno nemmeno aperte
+    skip = (get_cell_labels(index, labels), labels)
+    for reach in range(max(columns, rows)):
+        starts = numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]])
+        sizes = numpy.diff(numpy.r_[starts, len(keys)])
+        slots[sources[starts]] = numpy.arange(len(starts))
+        reps, dst = find_cell_neighbours(index, get_ring_offsets(reach - 1, reach), sources[starts], skip)
+        counts = sizes[slots[reps]]
+        src = sources[expand_runs(starts[slots[reps]], counts)]
+        dst = numpy.repeat(dst, counts)
+        outside = labels[src] != labels[dst]
+        src, dst = src[outside], dst[outside]
+        if len(src):
+            distance = numpy.abs(centers[src] - centers[dst]).sum(axis=1)
+            # La coppia più corta di ogni gruppo in questo anello
+            groups = labels[src]
+            order = numpy.lexsort((distance, groups))
+            first = order[numpy.r_[True, groups[order][1:] != groups[order][:-1]]]
+            groups = groups[first]
+            closer = distance[first] < best_distance[groups]
+            groups, first = groups[closer], first[closer]
+            best_distance[groups] = distance[first]
+            best_a[groups] = src[first]
+            best_b[groups] = dst[first]
+        # Le celle dell'anello successivo distano almeno reach celle su un asse
+        searching = best_distance[labels[sources]] > reach * cell_size
+        sources, keys = sources[searching], keys[searching]
+        if not len(sources):
+            break
+    found = numpy.flatnonzero(best_distance < numpy.inf)
+    return best_a[found], best_b[found], best_distance[found]
+
+
+def sort_by_distance(centers, pairs):
+    """Sort room pairs by the Manhattan distance between their centers, as the original linking did"""
+    weights = numpy.abs(centers[pairs[:, 0]] - centers[pairs[:, 1]]).sum(axis=1)
+    return pairs[numpy.argsort(weights, kind='stable')]
+
+
+class DisjointSet:
+    def __init__(self, count):
+        """Union-find over count elements"""
+        self.parent = list(range(count))
+        self.components = count
+
+    def get_labels(self):
+        """Get the representative of every element as a NumPy array"""
+        parent = numpy.array(self.parent)
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                return parent
+            parent = grandparent
+
+    def find(self, item):
+        """Get the representative of an element"""
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        """Merge the sets of two elements, returns False if already merged"""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return False
+        self.parent[root_b] = root_a
+        self.components -= 1
+        return True
+
+
+def connect_rooms(centers, rng=None, loop_ratio=0.0):
+    """Get the (a, b) room pairs of a spanning tree, plus loop_ratio extra edges"""
+    centers = numpy.asarray(centers, dtype=numpy.float64).reshape(-1, 2)
+    count = len(centers)
+    candidates = sort_by_distance(centers, find_candidate_edges(centers))
+
+    sets = DisjointSet(count)
+    tree = []
+    spare = []
+    for a, b in candidates.tolist():
+        if sets.union(a, b):
+            tree.append((a, b))
+        else:
+            spare.append((a, b))
+
+    # Collega i gruppi rimasti isolati alla Borůvka: a ogni giro ogni gruppo tranne il più grande
+    # si unisce al gruppo più vicino, cercato sulla griglia per tutti i gruppi insieme
+    if sets.components > 1:
+        index = build_cell_index(centers)
+        labels = sets.get_labels()
+        remap = numpy.arange(count)
+    while sets.components > 1:
+        largest = numpy.argmax(numpy.bincount(labels, minlength=count))
+        sources = numpy.flatnonzero(labels != largest)
+        found_a, found_b, distance = find_nearest_pairs(centers, index, labels, sources)
+        for i in numpy.argsort(distance, kind='stable').tolist():
+            a, b = int(found_a[i]), int(found_b[i])
+            if sets.union(a, b):
+                tree.append((a, b))
+        # Rietichetta per gruppo, non per stanza
+        groups = numpy.unique(labels)
+        remap[groups] = [sets.find(group) for group in groups.tolist()]
+        labels = remap[labels]
+
+    edges = tree
+    if loop_ratio > 0 and spare and rng is not None:
+        extra = min(len(spare), int(round(loop_ratio * len(tree))))
+        edges = tree + rng.sample(spare, extra)
+    return edges
+
+
+class RoomGraph:
+    def __init__(self, centers=(), edges=(), doors=()):
+        """Compact adjacency graph of rooms (nodes) connected by doors (edges)"""
+        self.centers = numpy.asarray(centers, dtype=numpy.float32).reshape(-1, 2)  # node -> (x, y)
+        self.edges = numpy.asarray(edges, dtype=numpy.int32).reshape(-1, 2)  # edge -> (a, b)
+        self.doors = numpy.asarray([tuple(door) for door in doors],
+                                   dtype=numpy.int32).reshape(-1, 4)  # edge -> door rect
+        delta = self.centers[self.edges[:, 0]] - self.centers[self.edges[:, 1]]
+        self.lengths = numpy.sqrt((delta ** 2).sum(axis=1))  # edge -> center distance
+
+        # Adiacenza in formato CSR: i vicini del nodo n sono in offsets[n]:offsets[n + 1]
+        count = len(self.centers)
+        sources = numpy.concatenate([self.edges[:, 0], self.edges[:, 1]])
+        targets = numpy.concatenate([self.edges[:, 1], self.edges[:, 0]])
+        edge_ids = numpy.concatenate([numpy.arange(len(self.edges))] * 2).astype(numpy.int32)
+        order = numpy.argsort(sources, kind='stable')
+        self.neighbours = targets[order]
+        self.neighbour_edges = edge_ids[order]
+        self.offsets = numpy.zeros(count + 1, dtype=numpy.int32)
+        numpy.cumsum(numpy.bincount(sources, minlength=count), out=self.offsets[1:])
+
+        self.edge_lookup = {}
+        for edge, (a, b) in enumerate(self.edges.tolist()):
+            self.edge_lookup[(a, b)] = edge
+            self.edge_lookup[(b, a)] = edge
+
+    @property
+    def num_nodes(self):
+        """Number of rooms in the graph"""
+        return len(self.centers)
+
+    @property
+    def num_edges(self):
+        """Number of connections in the graph"""
+        return len(self.edges)
+
+    def get_neighbours(self, node):
+        """Get the nodes connected to a node"""
+        return self.neighbours[self.offsets[node]:self.offsets[node + 1]]
+
+    def get_edges(self, node):
+        """Get the edges leaving a node"""
+        return self.neighbour_edges[self.offsets[node]:self.offsets[node + 1]]
+
+    def get_edge(self, a, b):
+        """Get the edge between two nodes, or None"""
+        return self.edge_lookup.get((a, b))
+
+    def get_door(self, edge):
+        """Get the door rectangle of an edge as (x, y, width, height)"""
+        return tuple(self.doors[edge])
+
+    def get_door_center(self, edge):
+        """Get the center of the door of an edge"""
+        x, y, width, height = self.doors[edge]
+        return (int(x + width // 2), int(y + height // 2))
@@ -0,0 +1,278 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import sqlite3
+import logging
+import tempfile
+
+from save_writer import SaveWriter, get_save_writer, SAVE_CLOSE_TIMEOUT
+
+# Database dei profili e delle partite, e vecchio salvataggio JSON da importare una volta
+SAVE_DATABASE = 'survivor_progress.db'
+LEGACY_SAVE_FILE = 'survivor_progress.json'
+# Versione dello schema, salvata in PRAGMA user_version
+SCHEMA_VERSION = 1
+# Partite restituite da get_best_runs se non specificato
+BEST_RUNS_LIMIT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    class_name TEXT PRIMARY KEY,
+    level INTEGER NOT NULL,
+    experience INTEGER NOT NULL,
+    exp_to_next_level INTEGER NOT NULL,
+    base_stats TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiles_updated ON profiles (updated_at);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    class_name TEXT NOT NULL,
+    level_index INTEGER NOT NULL,
+    seed INTEGER,
+    extracted INTEGER NOT NULL,
+    time_survived REAL NOT NULL,
+    rooms_explored INTEGER NOT NULL,
+    enemies_avoided INTEGER NOT NULL,
+    experience INTEGER NOT NULL,
+    finished_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_best ON runs (level_index, extracted DESC, experience DESC);
+"""
+
+UPSERT_PROFILE = """
+INSERT INTO profiles (class_name, level, experience, exp_to_next_level, base_stats, updated_at)
+VALUES (:name, :level, :experience, :exp_to_next_level, :base_stats, :updated_at)
+ON CONFLICT (class_name) DO UPDATE SET
+    level = excluded.level,
+    experience = excluded.experience,
+    exp_to_next_level = excluded.exp_to_next_level,
+    base_stats = excluded.base_stats,
+    updated_at = excluded.updated_at
+"""
+
+INSERT_RUN = """
+INSERT INTO runs (class_name, level_index, seed, extracted, time_survived,
+                  rooms_explored, enemies_avoided, experience, finished_at)
+VALUES (:class_name, :level_index, :seed, :extracted, :time_survived,
+        :rooms_explored, :enemies_avoided, :experience, :finished_at)
+"""
+
+RUN_COLUMNS = ("class_name", "level_index", "seed", "extracted", "time_survived",
+               "rooms_explored", "enemies_avoided", "experience", "finished_at")
+
+
+def profile_row(data):
+    """Turn a SurvivorClass dict into the parameters of UPSERT_PROFILE"""
+    return dict(data, base_stats=json.dumps(data['base_stats']),
+                updated_at=data.get('updated_at', time.time()))
+
+
+def row_bytes(row):
+    """Approximate the bytes SQLite stores for the values of a row"""
+    return sum(len(value.encode()) if isinstance(value, str) else 0 if value is None else 8
+               for value in row.values())
+
+
+def profile_from_row(row):
+    """Turn a profiles row back into a SurvivorClass dict"""
+    name, level, experience, exp_to_next_level, base_stats, updated_at = row
+    return {
+        'name': name,
+        'base_stats': json.loads(base_stats),
+        'level': level,
+        'experience': experience,
+        'exp_to_next_level': exp_to_next_level,
+        'updated_at': updated_at,
+    }
+
+
+class SaveStore(SaveWriter):
+    def __init__(self, path=SAVE_DATABASE):
+        """SQLite store of one profile per class and every finished run, written in the background"""
+        super().__init__(path)
+        self.writer_connection = None  # Used only by the background thread
+        self.rows_written = 0
+        self.unwritten = {}  # Profiles queued or being written, by class
+        self.migrated = False
+        self.reader = self.connect()
+        self.reader.executescript(SCHEMA)
+
+    def connect(self):
+        """Open a connection in WAL mode, so reads never wait for the writer"""
+        connection = sqlite3.connect(self.path, timeout=SAVE_CLOSE_TIMEOUT, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    def migrate_json(self, json_path=LEGACY_SAVE_FILE):
+        """Import the old single-profile JSON save, only the first time the database is opened"""
+        if self.migrated:
+            return False
+        self.migrated = True
+        try:
+            version = self.reader.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return False
+            with self.reader:
+                if os.path.exists(json_path):
+                    with open(json_path, 'r') as f:
+                        data = json.load(f)
+                    self.reader.execute(UPSERT_PROFILE, profile_row(data))
+                    logging.info(f"Migrated {data['name']} from {json_path}")
+                self.reader.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to migrate {json_path}: {str(e)}")
+            return False
+
+    def merge(self, pending, data):
+        """Keep only the latest profile per class, but every run"""
+        if pending is None:
+            pending = {'profiles': {}, 'runs': []}
+        pending['profiles'].update(data.get('profiles', {}))
+        pending['runs'].extend(data.get('runs', []))
+        return pending
+
+    def save_profile(self, data):
+        """Queue a profile update, replacing any earlier one for the same class"""
+        profile = dict(data, updated_at=time.time())
+        with self.condition:
+            self.unwritten[data['name']] = profile
+            self.submit({'profiles': {data['name']: profile}})
+
+    def add_run(self, run):
+        """Queue a finished run to be appended to the history"""
+        self.submit({'runs': [dict(run, finished_at=time.time())]})
+
+    def write_data(self, data):
+        """Apply the queued changes in one transaction, returning the bytes of row values written"""
+        if self.writer_connection is None:
+            self.writer_connection = self.connect()
+        profiles = [profile_row(profile) for profile in data['profiles'].values()]
+        with self.writer_connection:
+            self.writer_connection.executemany(UPSERT_PROFILE, profiles)
+            self.writer_connection.executemany(INSERT_RUN, data['runs'])
+        with self.condition:
+            for name, profile in data['profiles'].items():
+                if self.unwritten.get(name) is profile:
+                    del self.unwritten[name]
+        rows = profiles + data['runs']
+        self.rows_written += len(rows)
+        return sum(row_bytes(row) for row in rows)
+
+    def get_pending_profiles(self):
+        """Get the profiles queued but not yet written"""
+        with self.condition:
+            return dict(self.unwritten)
+
+    def get_profile(self, class_name):
+        """Get the saved profile of a class, or None"""
+        pending = self.get_pending_profiles()
+        if class_name in pending:
+            return pending[class_name]
+        try:
+            row = self.reader.execute(
+                "SELECT class_name, level, experience, exp_to_next_level, base_stats, updated_at "
+                "FROM profiles WHERE class_name = ?", (class_name,)).fetchone()
+            return profile_from_row(row) if row else None
+        except Exception as e:
+            logging.error(f"Failed to load profile {class_name}: {str(e)}")
+            return None
+
+    def get_last_profile(self):
+        """Get the most recently saved profile, or None"""
+        try:
+            row = self.reader.execute(
+                "SELECT class_name, level, experience, exp_to_next_level, base_stats, updated_at "
+                "FROM profiles ORDER BY updated_at DESC LIMIT 1").fetchone()
+            candidates = list(self.get_pending_profiles().values())
+            if row:
+                candidates.append(profile_from_row(row))
+            return max(candidates, key=lambda profile: profile['updated_at'], default=None)
+        except Exception as e:
+            logging.error(f"Failed to load last profile: {str(e)}")
+            return None
+
+    def get_class_progress(self):
+        """Get {class name: (level, experience)} for every saved profile"""
+        try:
+            progress = {name: (level, experience) for name, level, experience in
+                        self.reader.execute("SELECT class_name, level, experience FROM profiles")}
+            for name, profile in self.get_pending_profiles().items():
+                progress[name] = (profile['level'], profile['experience'])
+            return progress
+        except Exception as e:
+            logging.error(f"Failed to load class progress: {str(e)}")
+            return {}
+
+    def get_best_runs(self, level_index, limit=BEST_RUNS_LIMIT):
+        """Get the best runs of a level: extractions first, then by experience"""
+        # Le partite in coda vanno scritte prima di interrogare lo storico (solo da menu)
+        self.checkpoint(wait=True, timeout=SAVE_CLOSE_TIMEOUT)
+        try:
+            rows = self.reader.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE level_index = ? "
+                "ORDER BY extracted DESC, experience DESC LIMIT ?", (level_index, limit)).fetchall()
+            return [dict(zip(RUN_COLUMNS, row)) for row in rows]
+        except Exception as e:
+            logging.error(f"Failed to load best runs: {str(e)}")
+            return []
+
+    def get_stats(self):
+        """Get write counters, including the rows written"""
+        stats = super().get_stats()
+        stats['rows'] = self.rows_written
+        return stats
+
+
+class TempSaveStore(SaveStore):
+    def __init__(self):
+        """Store in a throwaway folder, removed on close, so simulations never touch the real saves"""
+        self.folder = tempfile.mkdtemp(prefix='backrooms_save_')
+        super().__init__(os.path.join(self.folder, SAVE_DATABASE))
+        if not temp_stores:
+            atexit.register(close_temp_stores)
+        temp_stores.add(self)
+
+    def close(self, timeout=SAVE_CLOSE_TIMEOUT):
+        """Write what is pending, stop the writer and delete the folder"""
+        super().close(timeout)
+        # Se il writer è ancora vivo la cartella resta: il suo thread la sta usando
+        if self.folder is None or self.thread is not None:
+            return
+        self.reader.close()
+        if self.writer_connection is not None:
+            self.writer_connection.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+        self.folder = None
+        temp_stores.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Store temporanei ancora aperti, chiusi all'uscita se nessuno lo ha fatto
+temp_stores = set()
+
+
+def close_temp_stores():
+    """Close every temporary store still open, used at quit"""
+    for store in list(temp_stores):
+        store.close()
+
+
+def create_temp_store():
+    """Open a temporary store; close it, or use it in a with block, when done"""
+    return TempSaveStore()
+
+
+def get_save_store(path=SAVE_DATABASE, legacy_path=LEGACY_SAVE_FILE):
+    """Get the shared store for a database, importing the old JSON save on first use"""
+    store = get_save_writer(path, SaveStore)
+    store.migrate_json(legacy_path)
+    return store
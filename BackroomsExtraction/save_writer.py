@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+# Secondi massimi tra una modifica e la sua scrittura su disco
+SAVE_FLUSH_INTERVAL = 5.0
+# Attesa massima per il salvataggio finale all'uscita
+SAVE_CLOSE_TIMEOUT = 2.0
+# Tentativi falliti di fila, durante la chiusura, prima di rinunciare al salvataggio in coda
+SAVE_CLOSE_RETRIES = 3
+
+
+def fsync_directory(path):
+    """Flush a directory entry so a rename inside it survives a crash"""
+    if os.name != 'posix':
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomic(path, text):
+    """Write text to a temp file, fsync it and rename it over path"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    fsync_directory(path)
+
+
+class SaveWriter:
+    def __init__(self, path, interval=SAVE_FLUSH_INTERVAL):
+        """Write-behind JSON save: updates are kept in memory and written on a background thread"""
+        self.path = path
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.thread = None
+        self.pending = None  # Latest data not yet written
+        self.latest = None  # Latest data submitted, written or not
+        self.version = 0  # Bumped on every submit
+        self.flushed_version = 0  # Last version the thread has dealt with
+        self.taken_version = 0  # Last version taken out of pending for a write
+        self.retrying = False  # pending holds a batch whose write failed
+        self.failed_attempts = 0  # Consecutive failed writes
+        self.urgent = False
+        self.closing = False
+
+        # Contatori per monitorare la frequenza delle scritture
+        self.started = time.monotonic()
+        self.submits = 0
+        self.writes = 0
+        self.coalesced = 0  # Submits replaced by a newer one before being written
+        self.failures = 0
+        self.bytes_written = 0
+        self.write_time = 0.0  # Seconds spent writing, summed
+
+    def start(self):
+        """Start the background thread if it is not running"""
+        if self.thread is None or not self.thread.is_alive():
+            self.closing = False
+            self.thread = threading.Thread(target=self.run, name=f"SaveWriter({self.path})", daemon=True)
+            self.thread.start()
+
+    def submit(self, data):
+        """Replace the pending save with data, without touching the disk"""
+        with self.condition:
+            self.pending = self.merge(self.pending, data)
+            self.latest = data
+            self.version += 1
+            self.submits += 1
+            self.start()
+            self.condition.notify_all()
+
+    def merge(self, pending, data):
+        """Combine a new submit with the pending one: a JSON save simply replaces it"""
+        return data
+
+    def checkpoint(self, wait=False, timeout=None):
+        """Ask for the pending save to be written now, optionally waiting for it"""
+        with self.condition:
+            version = self.version
+            if self.flushed_version >= version:
+                return True
+            self.urgent = True
+            self.condition.notify_all()
+            if not wait:
+                return False
+            return self.condition.wait_for(lambda: self.flushed_version >= version, timeout)
+
+    def close(self, timeout=SAVE_CLOSE_TIMEOUT):
+        """Write whatever is pending and stop the background thread"""
+        with self.condition:
+            thread = self.thread
+            if thread is None:
+                return
+            self.closing = True
+            self.condition.notify_all()
+        thread.join(timeout)
+        if thread.is_alive():
+            logging.error(f"Save writer for {self.path} did not finish in time")
+        else:
+            self.thread = None
+
+    def run(self):
+        """Background loop: coalesce submits for up to interval seconds, then write the latest"""
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or self.closing)
+                # La finestra parte dalla prima modifica: quelle successive si sommano a questa
+                self.condition.wait_for(lambda: self.urgent or self.closing, self.interval)
+                data = self.pending
+                version = self.version
+                if data is not None:
+                    # Un lotto rimesso in coda dopo un errore era già stato contato
+                    self.coalesced += version - self.taken_version - (0 if self.retrying else 1)
+                    self.taken_version = version
+                self.pending = None
+                self.urgent = False
+                closing = self.closing
+
+            written = data is None or self.write(data)
+
+            with self.condition:
+                if written:
+                    self.flushed_version = version
+                    self.retrying = False
+                    self.failed_attempts = 0
+                else:
+                    self.failed_attempts += 1
+                    if closing and self.failed_attempts >= SAVE_CLOSE_RETRIES:
+                        logging.error(f"Giving up on {version - self.flushed_version} unsaved changes to {self.path}")
+                        self.flushed_version = version
+                        self.retrying = False
+                    else:
+                        # Il lotto fallito torna in coda, prima delle modifiche arrivate nel frattempo
+                        self.pending = data if self.pending is None else self.merge(data, self.pending)
+                        self.retrying = True
+                self.condition.notify_all()
+                if closing and self.pending is None:
+                    return
+
+    def write(self, data):
+        """Write data, counting the write or the failure; returns True if it was written"""
+        start = time.perf_counter()
+        try:
+            self.bytes_written += self.write_data(data)
+            self.writes += 1
+            return True
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Failed to write save {self.path}: {str(e)}")
+            return False
+        finally:
+            self.write_time += time.perf_counter() - start
+
+    def write_data(self, data):
+        """Serialize data and replace the save file atomically, returning the bytes written"""
+        text = json.dumps(data)
+        write_atomic(self.path, text)
+        return len(text)
+
+    def get_stats(self):
+        """Get write counters and the write rate per minute"""
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return {
+            'submits': self.submits,
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'failures': self.failures,
+            'bytes': self.bytes_written,
+            'writes_per_minute': self.writes * 60 / elapsed,
+            'write_ms': self.write_time * 1000,
+        }
+
+
+# Un writer per file, condiviso da tutti i SurvivorManager (menu e partita)
+save_writers = {}
+
+
+def close_save_writers():
+    """Flush and stop every writer, used at quit"""
+    for writer in list(save_writers.values()):
+        writer.close()
+
+
+def get_save_writer(path, writer_class=SaveWriter):
+    """Get the shared writer for a save file"""
+    key = os.path.abspath(path)
+    writer = save_writers.get(key)
+    if writer is None:
+        if not save_writers:
+            atexit.register(close_save_writers)
+        writer = save_writers[key] = writer_class(path)
+    return writer
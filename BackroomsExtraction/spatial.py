@@ -0,0 +1,57 @@
+import pygame
+
+# Lato (in pixel) delle celle della griglia spaziale
+SPATIAL_CELL_SIZE = 256
+
+
+class SpatialGrid:
+    def __init__(self, cell_size=SPATIAL_CELL_SIZE):
+        """Uniform grid of world rectangles for constant-time position queries"""
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> [(rect, item)]
+        self.count = 0
+
+    def clear(self):
+        """Remove every item from the grid"""
+        self.cells = {}
+        self.count = 0
+
+    def get_cell(self, pos):
+        """Get the cell containing a world position"""
+        return (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+
+    def get_cell_range(self, rect):
+        """Get the cells covered by a world rectangle"""
+        size = self.cell_size
+        return (range(rect.left // size, (rect.right - 1) // size + 1),
+                range(rect.top // size, (rect.bottom - 1) // size + 1))
+
+    def insert(self, rect, item):
+        """Add an item covering a world rectangle"""
+        rect = pygame.Rect(rect)
+        columns, rows = self.get_cell_range(rect)
+        for cx in columns:
+            for cy in rows:
+                self.cells.setdefault((cx, cy), []).append((rect, item))
+        self.count += 1
+
+    def query_point(self, pos):
+        """Get the items whose rectangle contains a world position"""
+        entries = self.cells.get(self.get_cell(pos))
+        if not entries:
+            return []
+        return [item for rect, item in entries if rect.collidepoint(pos)]
+
+    def query_rect(self, rect):
+        """Get the items whose rectangle overlaps a world rectangle"""
+        rect = pygame.Rect(rect)
+        found = []
+        seen = set()
+        columns, rows = self.get_cell_range(rect)
+        for cx in columns:
+            for cy in rows:
+                for other, item in self.cells.get((cx, cy), ()):
+                    if id(item) not in seen and other.colliderect(rect):
+                        seen.add(id(item))
+                        found.append(item)
+        return found
@@ -0,0 +1,127 @@
+import logging
+from collections import OrderedDict
+
+import pygame
+from settings import *
+
+# Lato (in pixel) di ogni chunk della geometria statica
+CHUNK_SIZE = 512
+# Oltre questo numero di chunk la geometria viene cotta su richiesta
+MAX_BAKED_CHUNKS = 64
+
+
+class StaticGeometryLayer:
+    def __init__(self, floor_texture, chunk_size=CHUNK_SIZE, max_chunks=MAX_BAKED_CHUNKS):
+        """Pre-rendered floors, walls, doors and corridors split in world chunks"""
+        self.floor_texture = floor_texture
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.rooms = {}  # (cx, cy) -> [Room] overlapping the chunk
+        self.corridors = {}  # (cx, cy) -> [(start_pos, end_pos, width)]
+        self.chunks = OrderedDict()  # (cx, cy) -> baked Surface
+        self.bakes = 0
+
+    def get_chunk_range(self, rect):
+        """Get the chunk coordinates covered by a world rectangle"""
+        size = self.chunk_size
+        return (range(rect.left // size, (rect.right - 1) // size + 1),
+                range(rect.top // size, (rect.bottom - 1) // size + 1))
+
+    def build(self, rooms, corridors):
+        """Assign the level geometry to chunks and bake them"""
+        self.rooms = {}
+        self.corridors = {}
+        self.chunks.clear()
+
+        for room in rooms:
+            bounds = room.rect.unionall([door for door in room.doors])
+            columns, rows = self.get_chunk_range(bounds)
+            for cx in columns:
+                for cy in rows:
+                    self.rooms.setdefault((cx, cy), []).append(room)
+
+        for corridor in corridors:
+            start, end, width = corridor
+            bounds = pygame.Rect(min(start[0], end[0]), min(start[1], end[1]),
+                                 abs(end[0] - start[0]) + 1, abs(end[1] - start[1]) + 1)
+            columns, rows = self.get_chunk_range(bounds.inflate(width, width))
+            for cx in columns:
+                for cy in rows:
+                    self.corridors.setdefault((cx, cy), []).append(corridor)
+
+        # I livelli piccoli vengono cotti subito, quelli grandi man mano che si vedono
+        keys = set(self.rooms) | set(self.corridors)
+        if len(keys) <= self.max_chunks:
+            for key in keys:
+                self.chunks[key] = self.bake_chunk(key)
+
+        logging.info(f"Static layer: {len(keys)} chunks, {len(self.chunks)} baked")
+
+    def bake_chunk(self, key):
+        """Render the geometry overlapping a chunk onto its own surface"""
+        self.bakes += 1
+        # Le linee spesse vengono tagliate sul loro asse, quindi si disegna con un margine
+        margin = TILE_SIZE
+        size = self.chunk_size + margin * 2
+        surface = pygame.Surface((size, size))
+        surface.fill(BLACK)
+        offset_x = key[0] * self.chunk_size - margin
+        offset_y = key[1] * self.chunk_size - margin
+
+        for room in self.rooms.get(key, []):
+            # Draw floor
+            for x in range(room.rect.left, room.rect.right, TILE_SIZE):
+                for y in range(room.rect.top, room.rect.bottom, TILE_SIZE):
+                    surface.blit(self.floor_texture, (x - offset_x, y - offset_y))
+
+            # Draw walls
+            wall_rect = room.rect.move(-offset_x, -offset_y)
+            pygame.draw.rect(surface, DARK_GRAY, wall_rect, 2)
+
+            # Draw doors with depth effect
+            for door in room.doors:
+                door_rect = door.move(-offset_x, -offset_y)
+                pygame.draw.rect(surface, (40, 40, 40), door_rect)
+                # Aggiunge ombra alla porta
+                pygame.draw.rect(surface, (20, 20, 20), door_rect, 2)
+
+        for start, end, width in self.corridors.get(key, []):
+            start_pos = (start[0] - offset_x, start[1] - offset_y)
+            end_pos = (end[0] - offset_x, end[1] - offset_y)
+            # Corridoio principale
+            pygame.draw.line(surface, (25, 25, 25), start_pos, end_pos, width)
+            # Bordi del corridoio per effetto profondità
+            pygame.draw.line(surface, (35, 35, 35), start_pos, end_pos, width - 2)
+
+        chunk = surface.subsurface((margin, margin, self.chunk_size, self.chunk_size))
+        if pygame.display.get_surface() is not None:
+            return chunk.convert()
+        return chunk.copy()
+
+    def get_chunk(self, key):
+        """Get a baked chunk, baking it on first use, or None if it is empty"""
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        if key not in self.rooms and key not in self.corridors:
+            return None
+
+        chunk = self.bake_chunk(key)
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def draw(self, surface, camera_pos=(0, 0)):
+        """Blit the chunks overlapping the camera viewport"""
+        camera_x = int(camera_pos[0])
+        camera_y = int(camera_pos[1])
+        view = pygame.Rect(camera_x, camera_y, *surface.get_size())
+        columns, rows = self.get_chunk_range(view)
+        for cx in columns:
+            for cy in rows:
+                chunk = self.get_chunk((cx, cy))
+                if chunk is not None:
+                    surface.blit(chunk, (cx * self.chunk_size - camera_x,
+                                         cy * self.chunk_size - camera_y))
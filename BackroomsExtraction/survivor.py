@@ -1,6 +1,5 @@
-import json
-import os
 from settings import *
+from save_store import get_save_store, SAVE_DATABASE, BEST_RUNS_LIMIT
 
 class SurvivorClass:
     def __init__(self, name, base_stats):
@@ -13,7 +12,7 @@ class SurvivorClass:
     def to_dict(self):
         return {
             'name': self.name,
-            'base_stats': self.base_stats,
+            'base_stats': dict(self.base_stats),
             'level': self.level,
             'experience': self.experience,
             'exp_to_next_level': self.exp_to_next_level
@@ -21,14 +20,14 @@ class SurvivorClass:
         
     @classmethod
     def from_dict(cls, data):
-        survivor = cls(data['name'], data['base_stats'])
+        survivor = cls(data['name'], dict(data['base_stats']))
         survivor.level = data['level']
         survivor.experience = data['experience']
         survivor.exp_to_next_level = data['exp_to_next_level']
         return survivor
 
 class SurvivorManager:
-    def __init__(self):
+    def __init__(self, store=None):
         self.classes = {
             'Scout': {
                 'health': 80,
@@ -73,7 +72,9 @@ class SurvivorManager:
         }
         
         self.selected_class = None
-        self.progress_file = 'survivor_progress.json'
+        self.progress_file = 'survivor_progress.json'  # Vecchio salvataggio, importato nel database
+        # Senza uno store esplicito si usa il database condiviso nella cartella corrente
+        self.store = store if store is not None else get_save_store(SAVE_DATABASE, self.progress_file)
         self.load_progress()
 
     def get_class_stats(self, class_name):
@@ -81,13 +82,21 @@ class SurvivorManager:
         return self.classes.get(class_name, None)
 
     def create_survivor(self, class_name):
-        """Crea un nuovo sopravvissuto della classe specificata"""
+        """Crea un nuovo sopravvissuto della classe specificata, o riprende il suo profilo salvato"""
         if class_name in self.classes:
-            self.selected_class = SurvivorClass(class_name, self.classes[class_name])
+            data = self.store.get_profile(class_name)
+            if data:
+                self.selected_class = SurvivorClass.from_dict(data)
+            else:
+                self.selected_class = SurvivorClass(class_name, dict(self.classes[class_name]))
             self.save_progress()
             return self.selected_class
         return None
 
+    def is_selected(self, class_name):
+        """Controlla se class_name è il profilo selezionato"""
+        return bool(class_name) and self.selected_class is not None and self.selected_class.name == class_name
+
     def add_experience(self, amount):
         """Aggiungi esperienza e gestisci il level up"""
         if self.selected_class:
@@ -117,22 +126,49 @@ class SurvivorManager:
         return current_stats
 
     def save_progress(self):
-        """Salva i progressi del sopravvissuto"""
+        """Salva i progressi del sopravvissuto (in memoria, scritti su disco in background)"""
         if self.selected_class:
-            data = self.selected_class.to_dict()
-            try:
-                with open(self.progress_file, 'w') as f:
-                    json.dump(data, f)
-            except Exception as e:
-                print(f"Errore nel salvataggio dei progressi: {e}")
+            self.store.save_profile(self.selected_class.to_dict())
+
+    def record_run(self, class_name, level_index, seed, extracted, time_survived,
+                   rooms_explored, enemies_avoided, experience):
+        """Aggiungi una partita finita allo storico del profilo selezionato"""
+        if not self.is_selected(class_name):
+            return
+        self.store.add_run({
+            'class_name': class_name,
+            'level_index': level_index,
+            'seed': seed,
+            'extracted': int(extracted),
+            'time_survived': time_survived,
+            'rooms_explored': rooms_explored,
+            'enemies_avoided': enemies_avoided,
+            'experience': experience,
+        })
+
+    def get_best_runs(self, level_index, limit=BEST_RUNS_LIMIT):
+        """Ottieni le partite migliori di un livello"""
+        return self.store.get_best_runs(level_index, limit)
+
+    def get_class_progress(self):
+        """Ottieni livello ed esperienza di ogni classe salvata"""
+        return self.store.get_class_progress()
+
+    def checkpoint(self, wait=False):
+        """Chiedi di scrivere subito i progressi, ad esempio a fine partita"""
+        return self.store.checkpoint(wait)
+
+    def close(self):
+        """Scrivi i progressi in sospeso e ferma il thread di salvataggio"""
+        self.store.close()
 
     def load_progress(self):
         """Carica i progressi salvati"""
         try:
-            if os.path.exists(self.progress_file):
-                with open(self.progress_file, 'r') as f:
-                    data = json.load(f)
-                    self.selected_class = SurvivorClass.from_dict(data)
+            # L'ultimo profilo usato, compresi quelli non ancora scritti da un altro manager
+            data = self.store.get_last_profile()
+            if data:
+                self.selected_class = SurvivorClass.from_dict(data)
         except Exception as e:
             print(f"Errore nel caricamento dei progressi: {e}")
 
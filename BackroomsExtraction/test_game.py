@@ -6,13 +6,13 @@ from game_state import GameState
 from player import Player
 from enemy import Enemy
 from environment import Environment
+from lighting import LightMaskCache
+from level_generator import GENERATOR_GRID
+from game_logging import setup_logging
+from save_store import create_temp_store
 
 # Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename='test_game.log'
-)
+setup_logging('test_game.log')
 
 def test_initialization():
     """Test basic initialization of game components"""
@@ -43,9 +43,10 @@ def test_initialization():
         
         # Test Game State
         logging.info("Testing game state...")
-        game_state = GameState()
-        assert not game_state.game_over, "Game should not be over at start"
-        assert not game_state.paused, "Game should not be paused at start"
+        with create_temp_store() as store:
+            game_state = GameState(store=store)
+            assert not game_state.game_over, "Game should not be over at start"
+            assert not game_state.paused, "Game should not be paused at start"
         logging.info("Game state test passed")
         
         # Visual Test
@@ -87,6 +88,897 @@ def test_initialization():
         pygame.quit()
         return False
 
+def test_light_masks():
+    """Test light mask quantization and LRU eviction"""
+    try:
+        logging.info("Testing light mask cache...")
+        cache = LightMaskCache(buckets=4, max_size=2)
+        mask = cache.get(50, 0.5)
+        assert mask.get_size() == (100, 100), "Light mask has wrong size"
+        assert cache.get(50, 0.52) is mask, "Close intensities should share a mask"
+        assert cache.get_stats()['hits'] == 1, "Cache hit not counted"
+        cache.get(50, 0.0)
+        cache.get(50, 1.0)
+        assert cache.get_stats()['size'] == 2, "Cache should be bounded"
+        assert mask.get_at((50, 50)).a > mask.get_at((10, 50)).a, "Light should fade from the center"
+        assert cache.get(50.3, 1.0) is cache.get(50, 1.0), "Radii should be rounded to whole pixels"
+        for radius in range(10, 30):
+            cache.get(radius, 0.5)
+        assert cache.get_stats()['falloffs'] <= 2, "Falloffs should be evicted with their masks"
+
+
+        # Solo le luci che arrivano sullo schermo vengono disegnate
+        env = Environment()
+        env.generate_level((150, 150), 40, 40, 2, 0.5, seed=1234, generator=GENERATOR_GRID)
+        screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        drawn = []
+        create_light_surface = env.create_light_surface
+        env.create_light_surface = lambda radius, intensity: drawn.append(radius) or create_light_surface(radius, intensity)
+        room = env.rooms[0].rect
+        camera = (room.centerx - SCREEN_WIDTH // 2, room.centery - SCREEN_HEIGHT // 2)
+        env.draw(screen, camera)
+        visible = [light for other in env.rooms for light in other.lights
+                   if -LIGHT_RADIUS < light[0] - camera[0] < SCREEN_WIDTH + LIGHT_RADIUS and
+                   -LIGHT_RADIUS < light[1] - camera[1] < SCREEN_HEIGHT + LIGHT_RADIUS]
+        assert 0 < len(drawn) == len(visible) < sum(len(other.lights) for other in env.rooms), \
+            "Only the lights reaching the screen should be drawn"
+        drawn.clear()
+        env.draw(screen, (-10 * SCREEN_WIDTH, -10 * SCREEN_HEIGHT))
+        assert not drawn, "No light should be drawn far from every room"
+        logging.info("Light mask test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Light mask test failed: {str(e)}")
+        return False
+
+def test_seeded_generation():
+    """Test that the grid generator is reproducible and meets the room count"""
+    try:
+        logging.info("Testing seeded level generation...")
+        env = Environment()
+        env.generate_level((150, 150), 40, 40, 2, 0.5, seed=1234, generator=GENERATOR_GRID)
+        layout = [room.rect for room in env.rooms]
+        assert len(layout) == 40, "Grid generator should place every requested room"
+        env.generate_level((150, 150), 40, 40, 2, 0.5, seed=1234, generator=GENERATOR_GRID)
+        assert layout == [room.rect for room in env.rooms], "Same seed should give the same layout"
+        for i, room in enumerate(env.rooms):
+            for other in env.rooms[i + 1:]:
+                assert not room.intersects(other), "Rooms should not overlap"
+        logging.info("Seeded generation test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Seeded generation test failed: {str(e)}")
+        return False
+
+def test_room_connections():
+    """Test that far apart clusters of rooms are joined through their closest pair"""
+    try:
+        logging.info("Testing room connections...")
+        import random
+        from room_graph import connect_rooms, DisjointSet
+        rng = random.Random(4)
+        clusters = [(0, 0), (40000, 5000), (8000, 60000)]
+        centers = [(x + rng.uniform(0, 1500), y + rng.uniform(0, 1500)) for x, y in clusters for _ in range(60)]
+        edges = connect_rooms(centers)
+        sets = DisjointSet(len(centers))
+        for a, b in edges:
+            sets.union(a, b)
+        assert len(edges) == len(centers) - 1 and sets.components == 1, "The rooms should form a spanning tree"
+
+        # Ogni ponte tra due gruppi deve essere la coppia più vicina tra quei gruppi
+        for a, b in edges:
+            group_a, group_b = a // 60, b // 60
+            if group_a == group_b:
+                continue
+            closest = min(abs(centers[i][0] - centers[j][0]) + abs(centers[i][1] - centers[j][1])
+                          for i in range(group_a * 60, group_a * 60 + 60)
+                          for j in range(group_b * 60, group_b * 60 + 60))
+            distance = abs(centers[a][0] - centers[b][0]) + abs(centers[a][1] - centers[b][1])
+            assert distance == closest, "Clusters should be bridged by their closest rooms"
+
+        # Tanti gruppi piccoli e sparsi: vengono uniti tutti insieme, qualche giro in tutto
+        centers = []
+        for _ in range(2000):
+            x, y = rng.uniform(0, 10 ** 6), rng.uniform(0, 10 ** 6)
+            centers += [(x, y), (x + rng.uniform(0, 30), y + rng.uniform(0, 30))]
+        edges = connect_rooms(centers)
+        sets = DisjointSet(len(centers))
+        for a, b in edges:
+            sets.union(a, b)
+        assert len(edges) == len(centers) - 1 and sets.components == 1, "Scattered groups should form a spanning tree"
+        assert sets.get_labels().tolist() == [sets.find(i) for i in range(len(centers))], \
+            "Labels should match the union-find roots"
+        logging.info("Room connections test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Room connections test failed: {str(e)}")
+        return False
+
+def test_headless_simulation():
+    """Test stepping the game without drawing and replaying recorded input"""
+    try:
+        logging.info("Testing headless simulation...")
+        # Importato qui: headless sceglie il driver dummy se nessuno è impostato
+        from headless import HeadlessSimulation, ScriptedInput, RecordedInput, InputRecorder
+        script = [(30, [pygame.K_d]), (30, [pygame.K_s, pygame.K_LSHIFT]), (10, [])]
+        recorder = InputRecorder(ScriptedInput(script))
+        simulation = HeadlessSimulation(recorder, seed=42)
+        report = simulation.run(300, stop_on_game_over=False)
+        assert report['steps'] == 300, "Every requested step should run"
+        assert report['ticks_per_second'] > 0, "Speed should be reported"
+        
+        replay = HeadlessSimulation(RecordedInput(recorder.frames), seed=42)
+        replay.run(300, stop_on_game_over=False)
+        assert (replay.game_state.player.get_position() ==
+                simulation.game_state.player.get_position()), "Replay should reproduce the run"
+        simulation.close()
+        replay.close()
+        logging.info(f"Headless simulation test passed ({report['ticks_per_second']:.0f} ticks/s)")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Headless simulation test failed: {str(e)}")
+        return False
+
+def test_camera_rendering():
+    """Test that entities are drawn relative to a camera clamped to the level"""
+    try:
+        logging.info("Testing camera rendering...")
+        store = create_temp_store()
+        game_state = GameState(selected_level=2, seed=3, store=store)
+        level_width = game_state.environment.tile_map.width * TILE_SIZE
+        assert level_width > SCREEN_WIDTH, "The level should be wider than the screen"
+        room = max(game_state.environment.rooms, key=lambda room: room.rect.centerx)
+        player = game_state.player
+        player.x, player.y = room.rect.centerx, room.rect.centery
+        player.save_previous()
+        for _ in range(FPS * 5):
+            game_state.update_camera()
+        assert game_state.camera_x <= level_width - SCREEN_WIDTH, "The camera should stay inside the level"
+        game_state.prev_camera_x, game_state.prev_camera_y = game_state.camera_x, game_state.camera_y
+        rect = player.get_render_rect(1.0, game_state.get_render_camera())
+        assert pygame.Rect(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT).contains(rect), "The player should be on screen"
+        store.close()
+        logging.info("Camera rendering test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Camera rendering test failed: {str(e)}")
+        return False
+
+def test_profiler():
+    """Test that the frame profiler records stages only while enabled"""
+    try:
+        logging.info("Testing frame profiler...")
+        from headless import HeadlessSimulation, KeyState
+        simulation = HeadlessSimulation(seed=7)
+        game_state = simulation.game_state
+        screen = pygame.display.get_surface()
+        
+        for _ in range(5):
+            game_state.update(KeyState())
+            game_state.draw(screen)
+        assert game_state.profiler.frames == 0, "Disabled profiler should record nothing"
+        
+        game_state.profiler.toggle_overlay()
+        for _ in range(5):
+            game_state.advance(1 / FPS, KeyState())
+            game_state.draw(screen)
+        breakdown = game_state.profiler.get_breakdown()
+        assert game_state.profiler.frames == 5, "Every frame should be recorded"
+        assert game_state.advance(3 / FPS, KeyState()) == 3, "A slow frame should run catch-up ticks"
+        assert game_state.profiler.frames == 6, "Catch-up ticks should share the frame's row"
+        assert breakdown["environment_draw"][0] > 0, "Drawing should be timed"
+        from render_targets import render_targets
+        allocations = render_targets.allocations
+        game_state.profiler.draw(screen)
+        assert render_targets.allocations == allocations, "The overlay panel should be reused every frame"
+        simulation.close()
+        logging.info(f"Profiler test passed: {breakdown}")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Profiler test failed: {str(e)}")
+        return False
+
+def test_fixed_timestep():
+    """Test that the simulation speed does not depend on the frame rate"""
+    try:
+        logging.info("Testing fixed timestep...")
+        from headless import HeadlessSimulation, KeyState
+        from timestep import FixedTimestep
+        timestep = FixedTimestep(tick_rate=60, max_ticks=5)
+        assert sum(timestep.advance(1 / 30) for _ in range(30)) == 60, "Slow frames should catch up"
+        assert sum(timestep.advance(1 / 240) for _ in range(240)) == 60, "Fast frames should wait"
+        assert timestep.advance(2.0) == 5, "Catching up should be capped"
+        assert timestep.dropped_time > 0, "Time beyond the cap should be dropped"
+        
+        slow_simulation = HeadlessSimulation(seed=3)
+        fast_simulation = HeadlessSimulation(seed=3)
+        slow = slow_simulation.game_state
+        fast = fast_simulation.game_state
+        keys = KeyState((pygame.K_d,))
+        for _ in range(20):
+            slow.advance(1 / 20, keys)
+        for _ in range(120):
+            fast.advance(1 / 120, keys)
+        assert abs(slow.time_survived - fast.time_survived) < 1e-6, "Game time should match"
+        assert slow.player.get_position() == fast.player.get_position(), "Movement should match"
+        slow_simulation.close()
+        fast_simulation.close()
+        logging.info("Fixed timestep test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Fixed timestep test failed: {str(e)}")
+        return False
+
+def test_text_cache():
+    """Test that repeated text is rendered once and HUD lines only on change"""
+    try:
+        logging.info("Testing text cache...")
+        from fonts import font_registry, text_cache, TextLine
+        font = font_registry.get(FONT_SIZE_MEDIUM)
+        assert font is font_registry.get(FONT_SIZE_MEDIUM), "Fonts should be shared"
+        first = text_cache.render(font, "Backrooms", WHITE)
+        assert text_cache.render(font, "Backrooms", WHITE) is first, "Same text should hit the cache"
+        assert text_cache.render(font, "Backrooms", RED) is not first, "Colour is part of the key"
+        
+        line = TextLine(font, WHITE)
+        for _ in range(10):
+            line.render("Time: 1s")
+        line.render("Time: 2s")
+        assert line.renders == 2, "HUD lines should re-render only when their value changes"
+        logging.info(f"Text cache test passed: {text_cache.get_stats()}")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Text cache test failed: {str(e)}")
+        return False
+
+def test_dirty_presentation():
+    """Test that idle screens redraw nothing and the menu only redraws particles"""
+    try:
+        logging.info("Testing dirty rectangle presentation...")
+        from headless import HeadlessSimulation
+        from menu import Menu
+        screen = pygame.display.get_surface()
+        from render_targets import render_targets
+        simulation = HeadlessSimulation(seed=11)
+        game_state = simulation.game_state
+        assert game_state.draw(screen) is None, "Gameplay frames redraw the whole screen"
+        last_frame = pygame.image.tostring(screen, 'RGB')
+        game_state.paused = True
+        game_state.draw_world = None  # Il frame congelato non deve ridisegnare il mondo
+        assert game_state.draw(screen) is None, "The pause screen is composited once"
+        snapshot = render_targets.get("frozen_frame", screen.get_size())
+        assert pygame.image.tostring(snapshot, 'RGB') == last_frame, "The frozen frame should be the last one shown"
+        assert game_state.draw(screen) == [], "An idle pause screen changes nothing"
+        game_state.paused = False
+        game_state.game_over = True
+        assert game_state.draw(screen) is None, "Game over is composited from the snapshot"
+        assert game_state.draw(screen) == [], "An idle game over screen changes nothing"
+        
+        simulation.close()
+        store = create_temp_store()
+        menu = Menu(store)
+        while menu.is_fading():
+            menu.update((0, 0))
+            assert menu.draw(screen) is None, "Fading menu frames redraw the whole screen"
+        menu.update((0, 0))
+        menu.draw(screen)
+        menu.update((0, 0))
+        rects = menu.draw(screen)
+        area = sum(rect.width * rect.height for rect in rects)
+        assert area < SCREEN_WIDTH * SCREEN_HEIGHT // 10, "Only the particles should be redrawn"
+        
+        # La pulsazione del bottone in hover ridisegna solo il bottone
+        button = menu.buttons[menu.state][0]
+        button.get_pulse = lambda: 0  # Ogni pulsazione sotto deve differire dall'ultima disegnata
+        while button.hover_effect < 1.0:
+            menu.update(button.rect.center)
+            menu.draw(screen)
+        for pulse in (3, -2, 4):
+            button.get_pulse = lambda pulse=pulse: pulse
+            menu.update(button.rect.center)
+            rects = menu.draw(screen)
+            assert rects is not None, "A pulsing button should not rebuild the contents layer"
+            assert button.get_overlay_rect() in rects, "The pulsing button should be a dirty rectangle"
+        store.close()
+        logging.info(f"Dirty rectangle test passed ({len(rects)} rects, {area} pixels)")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Dirty rectangle test failed: {str(e)}")
+        return False
+
+def test_button_sprites():
+    """Test that buttons reuse pre-rendered frames instead of rebuilding them"""
+    try:
+        logging.info("Testing button sprite cache...")
+        from menu import Button
+        from render_targets import render_targets
+        screen = pygame.display.get_surface()
+        first = Button(100, 100, 200, 50, "Back")
+        second = Button(100, 300, 200, 50, "Back")
+        for _ in range(40):
+            first.update((0, 0))
+            second.update((0, 0))
+            first.draw(screen)
+            second.draw(screen)
+        frames = len(render_targets.sprites)
+        for _ in range(40):
+            first.draw(screen)
+            second.draw(screen)
+        assert len(render_targets.sprites) == frames, "Idle buttons should not build new frames"
+        assert first.get_frame(10, 8) is second.get_frame(10, 8), "Same label should share frames"
+        logging.info(f"Button sprite test passed ({frames} cached sprites)")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Button sprite test failed: {str(e)}")
+        return False
+
+def test_particles():
+    """Test that particles stay inside their bounds and draw in one pass"""
+    try:
+        logging.info("Testing particle system...")
+        from particles import ParticleSystem, DUST_PER_TILE
+        screen = pygame.display.get_surface()
+        particles = ParticleSystem((SCREEN_WIDTH, SCREEN_HEIGHT))
+        particles.spawn(10000, velocity_x=(-3, 3), velocity_y=(0.5, 2.0))
+        for _ in range(100):
+            particles.update()
+        assert particles.count == 10000, "Particles should never be lost"
+        assert (particles.positions >= 0).all(), "Particles should wrap around"
+        assert (particles.positions < particles.bounds).all(), "Particles should wrap around"
+        # Un float32 appena sotto lo zero, dopo il mod, arrotonda esattamente al bordo
+        particles.positions[0] = (-1e-6, 10)
+        particles.velocities[0] = 0
+        particles.update()
+        assert (particles.positions[0] < particles.bounds).all(), "Wrapped particles should stay below the bounds"
+        particles.draw(screen)
+
+        # La polvere vive attorno alla telecamera, sulle celle percorribili, e la segue
+        env = Environment()
+        env.generate_level((150, 150), 40, 40, 2, 0.5, seed=1234, generator=GENERATOR_GRID)
+        dust = env.particles
+        first = min(env.rooms, key=lambda room: room.rect.centerx).rect
+        last = max(env.rooms, key=lambda room: room.rect.centerx).rect
+        for room in (first, last):
+            camera = (room.centerx - SCREEN_WIDTH // 2, room.centery - SCREEN_HEIGHT // 2)
+            env.update_particles(camera)  # Prima compare, poi viene riportata tutta sulla nuova regione
+            assert dust.count == env.dust_count, "The dust should keep a fixed number of particles"
+            assert not dust.get_outside(env.get_dust_region(camera)).any(), "Dust should stay around the camera"
+            cells = (dust.positions // TILE_SIZE).astype(int)
+            assert all(env.tile_map.is_walkable_cell(column, row) for column, row in cells), \
+                "Dust should only appear on walkable cells"
+        assert first.right < last.left - SCREEN_WIDTH, "The two cameras should not overlap"
+        region = env.get_dust_region((0, 0))
+        assert env.dust_count <= (region[2] // TILE_SIZE) * (region[3] // TILE_SIZE) * DUST_PER_TILE, \
+            "The dust should not grow with the map"
+        logging.info("Particle system test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Particle system test failed: {str(e)}")
+        return False
+
+def test_save_writer():
+    """Test that saves are coalesced in memory and replaced atomically"""
+    try:
+        logging.info("Testing save writer...")
+        import os
+        import json
+        import tempfile
+        from save_writer import SaveWriter
+        path = os.path.join(tempfile.mkdtemp(), 'progress.json')
+        writer = SaveWriter(path, interval=60)
+        for level in range(100):
+            writer.submit({'level': level})
+        assert not os.path.exists(path), "Submitting should not touch the disk"
+        assert writer.checkpoint(wait=True, timeout=5), "Checkpoint should flush the pending save"
+        with open(path) as f:
+            assert json.load(f) == {'level': 99}, "Only the latest save should be written"
+        assert writer.get_stats()['writes'] == 1, "Submits should be coalesced into one write"
+        writer.submit({'level': 100})
+        writer.close()
+        with open(path) as f:
+            assert json.load(f) == {'level': 100}, "Closing should write the pending save"
+        assert not os.path.exists(path + '.tmp'), "The temp file should be renamed over the save"
+        logging.info("Save writer test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Save writer test failed: {str(e)}")
+        return False
+
+def test_save_store():
+    """Test per-class profiles, run history and the JSON migration"""
+    try:
+        logging.info("Testing save store...")
+        import os
+        import json
+        import tempfile
+        from save_store import SaveStore
+        folder = tempfile.mkdtemp()
+        legacy = os.path.join(folder, 'progress.json')
+        with open(legacy, 'w') as f:
+            json.dump({'name': 'Scout', 'base_stats': {'speed': 1.2}, 'level': 3,
+                       'experience': 40, 'exp_to_next_level': 225}, f)
+        store = SaveStore(os.path.join(folder, 'progress.db'))
+        assert store.migrate_json(legacy), "The JSON save should be imported"
+        assert store.get_profile('Scout')['level'] == 3, "Migrated profile should keep its level"
+
+        store.save_profile({'name': 'Tank', 'base_stats': {'speed': 0.8}, 'level': 1,
+                            'experience': 10, 'exp_to_next_level': 100})
+        assert store.get_profile('Tank')['experience'] == 10, "Queued profiles should be readable"
+        for experience in (50, 300, 120):
+            store.add_run({'class_name': 'Tank', 'level_index': 0, 'seed': 1, 'extracted': 0,
+                           'time_survived': 30.0, 'rooms_explored': 4, 'enemies_avoided': 2,
+                           'experience': experience})
+        store.add_run({'class_name': 'Tank', 'level_index': 0, 'seed': 2, 'extracted': 1,
+                       'time_survived': 90.0, 'rooms_explored': 9, 'enemies_avoided': 5,
+                       'experience': 100})
+        best = store.get_best_runs(0, 3)
+        assert [run['experience'] for run in best] == [100, 300, 120], "Extractions should rank first"
+        assert store.get_class_progress() == {'Scout': (3, 40), 'Tank': (1, 10)}, "One profile per class"
+        assert store.get_stats()['bytes'] > 0, "Written rows should be counted in bytes"
+
+        # Una transazione fallita rimette le partite in coda e le riscrive al tentativo successivo
+        write_data = store.write_data
+        failures = []
+        def flaky_write(data):
+            if not failures:
+                failures.append(data)
+                raise OSError("disk full")
+            return write_data(data)
+        store.write_data = flaky_write
+        store.interval = 0.05
+        store.add_run({'class_name': 'Tank', 'level_index': 1, 'seed': 3, 'extracted': 1,
+                       'time_survived': 60.0, 'rooms_explored': 6, 'enemies_avoided': 1,
+                       'experience': 70})
+        assert store.checkpoint(wait=True, timeout=5), "A failed write should be retried"
+        assert failures and store.get_stats()['failures'] == 1, "The failed write should be counted"
+        assert [run['experience'] for run in store.get_best_runs(1)] == [70], "The failed run should not be lost"
+        store.close()
+
+        reopened = SaveStore(os.path.join(folder, 'progress.db'))
+        assert not reopened.migrate_json(legacy), "The migration should only run once"
+        assert reopened.get_profile('Tank')['level'] == 1, "Profiles should survive a restart"
+
+        # Un reset tiene lo store temporaneo, che chiuso sparisce dal disco
+        with create_temp_store() as temp:
+            game_state = GameState(selected_level=1, seed=4, store=temp)
+            game_state.reset()
+            assert game_state.survivor_manager.store is temp, "A reset should keep the injected store"
+            assert game_state.environment.seed == 4, "A reset should keep the level seed"
+        assert not os.path.exists(temp.path), "Closing a temporary store should delete it"
+        logging.info("Save store test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Save store test failed: {str(e)}")
+        return False
+
+def test_log_rate_limit():
+    """Test that repeated log records are rate-limited and counted"""
+    try:
+        logging.info("Testing log rate limit...")
+        from game_logging import RateLimitFilter, StructuredFormatter
+        rate_limit = RateLimitFilter(interval=1.0, burst=5)
+        formatter = StructuredFormatter('%(message)s')
+        passed = []
+        for i in range(100):
+            record = logging.makeLogRecord({'msg': 'player_damage', 'created': 10.0 + i * 0.001,
+                                            'event': 'player_damage', 'fields': {'amount': i}})
+            if rate_limit.filter(record):
+                passed.append(record)
+        assert len(passed) == 5, "Only the burst should pass within one interval"
+        assert rate_limit.suppressed == 95, "Suppressed records should be counted"
+        later = logging.makeLogRecord({'msg': 'player_damage', 'created': 11.5,
+                                       'event': 'player_damage', 'fields': {'amount': 1}})
+        assert rate_limit.filter(later), "A new interval should let records through again"
+        assert formatter.format(later) == "player_damage amount=1 (+95 suppressed)", \
+            "The next record should carry the suppressed count"
+        logging.info("Log rate limit test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Log rate limit test failed: {str(e)}")
+        return False
+
+def test_broadphase_contacts():
+    """Test incremental hashing and contact begin/end events"""
+    try:
+        logging.info("Testing broadphase contacts...")
+        from broadphase import DynamicSpatialHash, ContactTracker
+        spatial_hash = DynamicSpatialHash(cell_size=64)
+        rects = [pygame.Rect(i * 40, 0, 28, 28) for i in range(100)]
+        for i, rect in enumerate(rects):
+            spatial_hash.move(i, rect)
+        rebuckets = spatial_hash.rebuckets
+        rects[0].x += 1
+        spatial_hash.move(0, rects[0])
+        assert spatial_hash.rebuckets == rebuckets, "Moving inside a cell should not re-bucket"
+        rects[0].x = 400
+        spatial_hash.move(0, rects[0])
+        assert spatial_hash.query(pygame.Rect(395, 0, 10, 10)) == [0, 10], "Query should see moved entities"
+
+        contacts = ContactTracker()
+        assert contacts.update("player", [3], 1) == ([3], []), "A new contact should begin"
+        assert contacts.update("player", [3, 4], 2) == ([4], []), "An ongoing contact should not begin again"
+        assert contacts.get_due("player", 31, 30) == [3], "Damage should repeat at the contact interval"
+        assert contacts.update("player", [], 3) == ([], [3, 4]), "Contacts should end"
+
+        # Con il danno a intervalli un nemico fermo non uccide più il giocatore in pochi tick
+        store = create_temp_store()
+        game_state = GameState(seed=5, store=store)
+        enemy = game_state.enemies[0]
+        game_state.player.x, game_state.player.y = enemy.rect.topleft
+        game_state.player.rect.topleft = enemy.rect.topleft
+        health = game_state.player.health
+        game_state.handle_collisions()
+        assert game_state.player.health < health, "Damage should be dealt when contact begins"
+        damaged = game_state.player.health
+        game_state.tick += 1
+        game_state.handle_collisions()
+        assert game_state.player.health == damaged, "Damage should not repeat on the next tick"
+        store.close()
+        logging.info("Broadphase contacts test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Broadphase contacts test failed: {str(e)}")
+        return False
+
+def test_tile_collision():
+    """Test that boxes stop flush against walls and slide along them"""
+    try:
+        logging.info("Testing tile collision...")
+        import numpy
+        from tilemap import TileMap
+        tile_map = TileMap(10, 10, cell_size=32)
+        tile_map.grid[1:9, 1:9] = 1  # Una stanza 8x8 circondata da muri
+        x, y = tile_map.move_and_slide(40, 100, 24, 24, -20, 5)
+        assert (x, y) == (32, 105), "Moving into a wall should stop flush and keep sliding"
+        x, y = tile_map.move_and_slide(200, 100, 24, 24, 500, 0)
+        assert x == 9 * 32 - 24, "Fast moves should not tunnel through walls"
+        assert tile_map.collides(pygame.Rect(20, 100, 24, 24)), "Boxes over walls should collide"
+
+        positions = numpy.array([[40.0, 100.0], [100.0, 40.0]])
+        tile_map.move_and_slide_many(positions, numpy.array([[-20.0, 5.0], [3.0, -20.0]]), 24)
+        assert positions.tolist() == [[32.0, 105.0], [103.0, 32.0]], \
+            "The vectorized version should match move_and_slide"
+        assert tile_map.get_memory_usage() == 100, "The map should use one byte per cell"
+        logging.info("Tile collision test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Tile collision test failed: {str(e)}")
+        return False
+
+def test_navigation():
+    """Test A* room paths through doors, the path cache and the per-frame search budget"""
+    try:
+        logging.info("Testing navigation...")
+        from navigation import Navigator
+        env = Environment()
+        env.generate_level((100, 100), 20, 20, 1, 0.5, seed=5, generator=GENERATOR_GRID)
+        graph = env.room_graph
+        navigator = Navigator(env, max_requests=1)
+        navigator.check_graph()
+        goal_room = max(range(len(env.rooms)), key=lambda room: len(navigator.find_room_path(0, room)))
+        start = env.rooms[0].rect.center
+        goal = env.rooms[goal_room].rect.center
+        path = navigator.get_path(start, goal)
+        rooms = navigator.get_room_path(0, goal_room)
+        assert len(rooms) >= 3, "The path should cross several rooms"
+        for room, next_room in zip(rooms, rooms[1:]):
+            assert graph.get_edge(room, next_room) is not None, "Consecutive rooms should share a door"
+        cells = [env.tile_map.get_cell(point) for point in path[:-1]]
+        assert all(env.tile_map.is_walkable_cell(*cell) for cell in cells), "Waypoints should be walkable"
+        assert all(max(abs(a[0] - b[0]), abs(a[1] - b[1])) == 1 for a, b in zip(cells, cells[1:])), \
+            "Waypoints should follow the corridors cell by cell"
+        assert path[-1] == goal, "The path should end at the goal"
+
+        hits = navigator.get_stats()['hits']
+        assert navigator.get_path(start, goal) == path, "Cached paths should be reused"
+        assert navigator.get_stats()['hits'] > hits, "Reusing a path should count as a cache hit"
+        other = env.rooms[rooms[1]].rect.center
+        assert navigator.get_path(other, goal) is None, "A spent budget should defer new searches"
+        assert navigator.get_stats()['deferred'] == 1, "Deferred searches should be counted"
+        navigator.begin_frame()
+        assert navigator.get_path(other, goal) is not None, "The budget should refill every frame"
+
+        env.generate_level((100, 100), 20, 20, 1, 0.5, seed=6, generator=GENERATOR_GRID)
+        navigator.begin_frame()
+        navigator.get_path(env.rooms[0].rect.center, env.rooms[1].rect.center)
+        assert len(navigator.paths) == 1, "A new level should drop the cached paths"
+        logging.info("Navigation test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Navigation test failed: {str(e)}")
+        return False
+
+def test_enemy_navigation():
+    """Test that a chasing enemy follows the corridors to a room several doors away"""
+    try:
+        logging.info("Testing enemy navigation...")
+        from navigation import Navigator
+        env = Environment()
+        env.generate_level((100, 100), 20, 20, 1, 0.5, seed=7, generator=GENERATOR_GRID)
+        graph = env.room_graph
+        hops = {0: 0}
+        frontier = [0]
+        while frontier:
+            room = frontier.pop(0)
+            for neighbour in graph.get_neighbours(room).tolist():
+                if neighbour not in hops:
+                    hops[neighbour] = hops[room] + 1
+                    frontier.append(neighbour)
+        goal = max(hops, key=hops.get)
+        assert hops[goal] >= 3, "The goal room should be several corridors away"
+
+        navigator = Navigator(env)
+        start = env.rooms[0].rect.center
+        enemy = Enemy(start[0] - ENEMY_SIZE // 2, start[1] - ENEMY_SIZE // 2, [start],
+                      navigator, None, env.tile_map)
+        target = env.rooms[goal].rect.center
+        enemy.current_state = enemy.CHASE
+        enemy.last_known_player_pos = target
+        for _ in range(FPS * 120):
+            navigator.begin_frame()
+            enemy.update_chase(target)
+            assert not env.check_collision(enemy.rect), "The enemy should never overlap a wall"
+            if env.rooms[goal].rect.contains(enemy.rect):
+                break
+        assert env.rooms[goal].rect.contains(enemy.rect), "The enemy should reach the goal room"
+        logging.info("Enemy navigation test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Enemy navigation test failed: {str(e)}")
+        return False
+
+def test_flow_field():
+    """Test flow field steps around walls and repairs itself when the target moves"""
+    try:
+        logging.info("Testing flow field...")
+        import math
+        from tilemap import TileMap
+        from flow_field import FlowField
+        tile_map = TileMap(10, 10, cell_size=32)
+        tile_map.grid[1:9, 1:9] = 1
+        tile_map.grid[1:7, 5] = 0  # Un muro da aggirare passando in basso
+        center = tile_map.get_cell_center
+        field = FlowField(tile_map)
+        assert field.update(center((7, 2))), "A new target should compute the field"
+        assert not field.update(center((7, 2))), "The same target cell should keep the field"
+        assert field.get_direction(center((4, 2))) == (0, 1), "Cells behind the wall should head around it"
+        assert field.get_direction(center((4, 6))) == (0, 1), "Diagonals should not cut wall corners"
+        assert abs(field.get_distance(center((6, 3))) - math.sqrt(2)) < 1e-9, "Diagonal steps should cost sqrt(2)"
+        assert field.get_direction(center((7, 2))) is None, "The target cell has no direction"
+
+        assert field.update(center((7, 3))), "A target move should update the field"
+        assert field.repairs == 1, "A short move should repair the previous field"
+        fresh = FlowField(tile_map)
+        fresh.update(center((7, 3)))
+        for row in range(tile_map.height):
+            for column in range(tile_map.width):
+                pos = center((column, row))
+                expected = fresh.get_distance(pos)
+                distance = field.get_distance(pos)
+                assert (expected is None) == (distance is None), "The repaired field should reach the same cells"
+                if expected is not None:
+                    assert abs(expected - distance) < 1e-9, "Repaired distances should match a full computation"
+        assert field.get_direction(center((7, 2))) == (0, 1), "The old target should point to the new one"
+        logging.info("Flow field test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Flow field test failed: {str(e)}")
+        return False
+
+def test_ai_scheduler():
+    """Test that distant patrollers are updated less often but never starve"""
+    try:
+        logging.info("Testing AI scheduler...")
+        from ai_scheduler import AIScheduler, AI_FAR_INTERVAL
+        near = Enemy(100, 100, [(100, 100)])
+        far = Enemy(5000, 5000, [(9000, 5000)])
+        scheduler = AIScheduler(budget_ms=None)
+        updates = {0: 0, 1: 0}
+        sensed = 0
+        for _ in range(AI_FAR_INTERVAL * 10):
+            due = scheduler.get_due([near, far])
+            sensed += len(due)
+            for i in scheduler.update([near, far], (100, 100), due, [0] * len(due), [i == 0 for i in due]):
+                updates[i] += 1
+        assert updates[0] == AI_FAR_INTERVAL * 10, "Nearby enemies should update every tick"
+        assert sensed == updates[0] + updates[1], "Sight and noise should only be read for the due enemies"
+        assert updates[1] == 10, "Distant patrollers should update at their tier's rate"
+        assert scheduler.get_stats()['deferred'] == AI_FAR_INTERVAL * 10 - 10, "Skipped updates should be counted"
+        assert far.x > 5000 + ENEMY_SPEED * (AI_FAR_INTERVAL * 10 - AI_FAR_INTERVAL), \
+            "Catch-up updates should cover the skipped ticks"
+
+        # Con un budget esaurito i nemici lontani aspettano, ma non oltre max_stale
+        starved = AIScheduler(budget_ms=0.0, max_stale=20)
+        enemies = [Enemy(5000 + i * 40, 5000, [(9000, 5000)]) for i in range(5)]
+        updated = set()
+        for _ in range(40):
+            due = starved.get_due(enemies)
+            updated.update(starved.update(enemies, (0, 0), due, [0] * len(due), [False] * len(due)))
+        assert updated == set(range(5)), "Every enemy should eventually be updated"
+        assert starved.get_stats()['forced'] > 0, "Stale enemies should be forced through"
+
+        # Il disegno estrapolato si ferma contro i muri invece di attraversarli
+        from tilemap import TileMap
+        tile_map = TileMap(10, 10, cell_size=TILE_SIZE)
+        tile_map.grid[1:9, 1:9] = 1
+        walker = Enemy(7 * TILE_SIZE, 2 * TILE_SIZE, [(20 * TILE_SIZE, 2 * TILE_SIZE)], tile_map=tile_map)
+        walker.update((0, 0), 0, False)
+        for _ in range(AI_FAR_INTERVAL * 4):
+            walker.extrapolate()
+            x, y = walker.get_visual_position()
+            assert not tile_map.collides(pygame.Rect(int(x), int(y), walker.width, walker.height)), \
+                "Extrapolated enemies should not be drawn inside walls"
+        assert walker.get_visual_position()[0] > walker.x, "Extrapolation should still move towards the wall"
+        logging.info("AI scheduler test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"AI scheduler test failed: {str(e)}")
+        return False
+
+def test_noise_field():
+    """Test that noise spreads through doors with attenuation and is only recomputed on change"""
+    try:
+        logging.info("Testing noise field...")
+        from noise import NoiseField, NOISE_DOOR_FACTOR, NOISE_FALLOFF
+        env = Environment()
+        env.generate_level((150, 150), 40, 40, 2, 0.5, seed=1234, generator=GENERATOR_GRID)
+        graph = env.room_graph
+        field = NoiseField(env)
+        source = env.rooms[0].rect.center
+        assert field.update(source, 80), "New noise should be propagated"
+        assert not field.update(source, 80), "Unchanged noise should not be propagated again"
+        assert field.get_level(source) == 80, "The noisy room should hear the full level"
+
+        neighbour = int(graph.get_neighbours(0)[0])
+        edge = graph.get_edge(0, neighbour)
+        expected = 80 * NOISE_DOOR_FACTOR - graph.lengths[edge] / TILE_SIZE * NOISE_FALLOFF
+        heard = field.get_level(env.rooms[neighbour].rect.center)
+        assert 0 < heard <= expected + 1e-3, "Noise should lose strength through a door"
+        centers = [room.rect.center for room in env.rooms]
+        levels = field.get_levels(centers)
+        assert levels.tolist() == [field.get_level(center) for center in centers], \
+            "Batch reads should match single reads"
+        assert (levels == 0).any(), "Distant rooms should not hear anything"
+        assert field.get_level((-100, -100)) == 0, "Outside the map should be silent"
+
+        field.update(source, 0)
+        assert not field.get_levels(centers).any(), "Silence should clear the field"
+        enemy = Enemy(0, 0)
+        assert enemy.can_see_player(80, False), "A loud enough noise should be heard through walls"
+        assert not enemy.can_see_player(0, False), "Without sight or noise the player is undetected"
+        assert not enemy.can_see_player(0), "Sight should be off unless the caller checked it"
+        enemy.update((enemy.x + TILE_SIZE * 40, enemy.y), 0)
+        assert enemy.current_state == enemy.PATROL, "A silent player nobody can see should stay unnoticed"
+        logging.info("Noise field test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Noise field test failed: {str(e)}")
+        return False
+
+def test_enemy_swarm():
+    """Test that the swarm moves exactly like Enemy objects through patrol, chase and search"""
+    try:
+        logging.info("Testing enemy swarm...")
+        import numpy
+        from tilemap import TileMap
+        from flow_field import FlowField
+        from line_of_sight import LineOfSight
+        from enemy_swarm import EnemySwarm
+        tile_map = TileMap(40, 30, cell_size=TILE_SIZE)
+        tile_map.grid[1:29, 1:39] = 1
+        tile_map.grid[4:14, 12] = 0  # Un muro da aggirare
+        flow_field = FlowField(tile_map)
+        spawns = [(64 + i * 90, 80 + (i % 3) * 150, [(64 + i * 90, 80), (300, 400), (500, 120 + i * 40)])
+                  for i in range(8)]
+        swarm = EnemySwarm(flow_field, tile_map)
+        swarm.spawn(spawns)
+        enemies = [Enemy(x, y, list(points), None, flow_field, tile_map) for x, y, points in spawns]
+        sight = LineOfSight(tile_map)
+        hidden = tile_map.get_cell_center((37, 27))
+        transitions = []
+        for tick in range(2000):
+            # Silenzio, poi un rumore che tutti sentono, poi il giocatore sparisce in un angolo
+            if 200 <= tick < 450:
+                player, noise = (300.0 + tick % 50, 300.0), 80
+            else:
+                player, noise = hidden, 0
+            flow_field.update(player)
+            seen = sight.check(player, swarm.get_centers(), ENEMY_DETECTION_RANGE)
+            swarm.update(player, [noise] * swarm.count, seen)
+            seen = sight.check(player, [enemy.get_center() for enemy in enemies], ENEMY_DETECTION_RANGE)
+            for enemy, visible in zip(enemies, seen):
+                enemy.update(player, noise, visible)
+            positions = [enemy.get_position() for enemy in enemies]
+            assert numpy.array_equal(swarm.positions, positions), f"Positions should match at tick {tick}"
+            states = [enemy.current_state for enemy in enemies]
+            assert states == [view.current_state for view in swarm.views], f"States should match at tick {tick}"
+            if not transitions or transitions[-1] != states[0]:
+                transitions.append(states[0])
+        assert transitions == ["patrol", "chase", "search", "patrol"], \
+            "Enemies should patrol, chase the noise, search where it stopped, then patrol again"
+        logging.info("Enemy swarm test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Enemy swarm test failed: {str(e)}")
+        return False
+
+def test_line_of_sight():
+    """Test batched line of sight against walls, range and a scalar ray walk"""
+    try:
+        logging.info("Testing line of sight...")
+        import math
+        import random
+        from tilemap import TileMap
+        from line_of_sight import LineOfSight, SIGHT_SAMPLES_PER_CELL
+        tile_map = TileMap(12, 12, cell_size=32)
+        tile_map.grid[1:11, 1:11] = 1
+        tile_map.grid[3:9, 6] = 0  # Un muro in mezzo alla stanza
+        center = tile_map.get_cell_center
+        sight = LineOfSight(tile_map)
+        target = center((9, 5))
+        visible = sight.check(target, [center((2, 5)), center((8, 2)), center((9, 9))])
+        assert visible == [False, True, True], "Walls should block sight, open floor should not"
+        assert sight.check(target, [center((8, 2))], max_distance=TILE_SIZE) == [False], \
+            "Viewers beyond max_distance should not see the target"
+        hits = sight.cache_hits
+        assert sight.check(target, [center((2, 5)), center((9, 9))]) == [False, True], \
+            "Cached results should not change"
+        assert sight.cache_hits == hits + 2, "Repeated viewer cells should hit the cache"
+
+        def walk_ray(viewer, goal):
+            # Stesso campionamento di cast_rays, un punto alla volta
+            start_x, start_y = viewer[0] + 0.5, viewer[1] + 0.5
+            end_x, end_y = goal[0] + 0.5, goal[1] + 0.5
+            span = max(abs(viewer[0] - goal[0]), abs(viewer[1] - goal[1])) + 1
+            samples = span * SIGHT_SAMPLES_PER_CELL
+            for step in range(samples + 1):
+                t = step / samples
+                cell = (math.floor(start_x + (end_x - start_x) * t), math.floor(start_y + (end_y - start_y) * t))
+                if not tile_map.is_walkable_cell(*cell):
+                    return False
+            return True
+
+        env = Environment()
+        env.generate_level((60, 60), 20, 20, 1, 0.5, seed=9, generator=GENERATOR_GRID)
+        tile_map = env.tile_map
+        sight = LineOfSight(tile_map)
+        rng = random.Random(9)
+        target = env.rooms[0].rect.center
+        viewers = [(rng.uniform(0, tile_map.width * TILE_SIZE), rng.uniform(0, tile_map.height * TILE_SIZE))
+                   for _ in range(300)]
+        target_cell = tile_map.get_cell(target)
+        expected = [walk_ray(tile_map.get_cell(viewer), target_cell) for viewer in viewers]
+        assert sight.check(target, viewers) == expected, "Batched rays should match a scalar ray walk"
+        assert any(expected) and not all(expected), "The level should both hide and show the target"
+        logging.info("Line of sight test passed")
+        return True
+        
+    except Exception as e:
+        logging.error(f"Line of sight test failed: {str(e)}")
+        return False
+
 def run_all_tests():
     """Run all game tests"""
     try:
@@ -94,7 +986,25 @@ def run_all_tests():
         
         # Run initialization test
         init_result = test_initialization()
-        if init_result:
+        light_result = test_light_masks()
+        generation_result = test_seeded_generation() and test_room_connections()
+        headless_result = test_headless_simulation() and test_camera_rendering()
+        profiler_result = test_profiler()
+        timestep_result = test_fixed_timestep()
+        text_result = test_text_cache()
+        dirty_result = test_dirty_presentation()
+        button_result = test_button_sprites()
+        particle_result = test_particles()
+        save_result = test_save_writer() and test_save_store()
+        log_result = test_log_rate_limit()
+        contact_result = (test_broadphase_contacts() and test_tile_collision()
+                          and test_navigation() and test_enemy_navigation() and test_flow_field())
+        scheduler_result = (test_ai_scheduler() and test_noise_field() and test_line_of_sight()
+                            and test_enemy_swarm())
+        if (init_result and light_result and generation_result and headless_result
+                and profiler_result and timestep_result and text_result and dirty_result
+                and button_result and particle_result and save_result and log_result
+                and contact_result and scheduler_result):
             logging.info("All tests passed successfully!")
             print("✅ All tests passed! Check test_game.log for details.")
         else:
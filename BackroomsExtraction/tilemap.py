@@ -0,0 +1,192 @@
+import math
+
+import numpy
+from settings import *
+
+# Valori delle celle
+BLOCKED = 0
+WALKABLE = 1
+
+
+class TileMap:
+    def __init__(self, width=0, height=0, cell_size=TILE_SIZE):
+        """Walkability grid of the level, one byte per cell"""
+        # Un byte per cella: una mappa 150x150 occupa 22 KB. Una bitmap userebbe 1/8 della memoria,
+        # ma ogni lettura costerebbe uno shift e una maschera in Python e NumPy non potrebbe indicizzarla
+        self.width = width
+        self.height = height
+        self.cell_size = cell_size
+        self.cells = bytearray(width * height)
+
+    @property
+    def grid(self):
+        """Writable (height, width) NumPy view of the cells"""
+        return numpy.frombuffer(self.cells, dtype=numpy.uint8).reshape(self.height, self.width)
+
+    def build(self, map_size, rooms, corridors):
+        """Rasterize rooms, doors and corridors into the grid"""
+        self.width, self.height = map_size
+        self.cells = bytearray(self.width * self.height)
+        grid = self.grid
+
+        for room in rooms:
+            self.fill_rect(grid, room.rect)
+            for door in room.doors:
+                self.fill_rect(grid, door)
+
+        for start, end, width in corridors:
+            self.fill_line(grid, start, end, width)
+
+    def fill_rect(self, grid, rect, value=WALKABLE):
+        """Mark the cells covered by a world rectangle as walkable, or with another value"""
+        size = self.cell_size
+        left = max(0, rect.left // size)
+        top = max(0, rect.top // size)
+        right = min(self.width, (rect.right - 1) // size + 1)
+        bottom = min(self.height, (rect.bottom - 1) // size + 1)
+        grid[top:bottom, left:right] = value
+
+    def fill_line(self, grid, start, end, width, value=WALKABLE):
+        """Mark the cells covered by a thick line as walkable, or with another value"""
+        dx = end[0] - start[0]
+        dy = end[1] - start[1]
+        length = max(abs(dx), abs(dy), 1)
+        steps = numpy.linspace(0, 1, int(length * 4 // self.cell_size) + 2)
+        xs = start[0] + dx * steps
+        ys = start[1] + dy * steps
+
+        # pygame.draw.line allarga le linee in verticale o in orizzontale
+        half = width / 2 - 1
+        offsets = numpy.array([-half, 0, half])
+        if abs(dx) >= abs(dy):
+            xs = numpy.repeat(xs, 3)
+            ys = (ys[:, None] + offsets[None, :]).ravel()
+        else:
+            xs = (xs[:, None] + offsets[None, :]).ravel()
+            ys = numpy.repeat(ys, 3)
+
+        columns = numpy.clip((xs // self.cell_size).astype(numpy.int64), 0, self.width - 1)
+        rows = numpy.clip((ys // self.cell_size).astype(numpy.int64), 0, self.height - 1)
+        grid[rows, columns] = value
+
+    def get_cell(self, pos):
+        """Get the cell containing a world position"""
+        return (int(pos[0] // self.cell_size), int(pos[1] // self.cell_size))
+
+    def get_cell_center(self, cell):
+        """Get the world position of the center of a cell"""
+        half = self.cell_size / 2
+        return (cell[0] * self.cell_size + half, cell[1] * self.cell_size + half)
+
+    def is_walkable_cell(self, column, row):
+        """Check if a cell is inside the map and walkable"""
+        if 0 <= column < self.width and 0 <= row < self.height:
+            return self.cells[row * self.width + column] == WALKABLE
+        return False
+
+    def is_walkable(self, pos):
+        """Check if a world position is walkable"""
+        return self.is_walkable_cell(*self.get_cell(pos))
+
+    def get_memory_usage(self):
+        """Get the bytes used by the cells"""
+        return len(self.cells)
+
+    def collides(self, rect):
+        """Check if a world rectangle overlaps any blocked cell"""
+        size = self.cell_size
+        left, right = rect.left // size, (rect.right - 1) // size
+        return any(self.is_row_blocked(row, left, right)
+                   for row in range(rect.top // size, (rect.bottom - 1) // size + 1))
+
+    def is_column_blocked(self, column, top, bottom):
+        """Check if any cell of a column between two rows (inclusive) is blocked"""
+        for row in range(top, bottom + 1):
+            if not self.is_walkable_cell(column, row):
+                return True
+        return False
+
+    def is_row_blocked(self, row, left, right):
+        """Check if any cell of a row between two columns (inclusive) is blocked"""
+        for column in range(left, right + 1):
+            if not self.is_walkable_cell(column, row):
+                return True
+        return False
+
+    def sweep_x(self, x, y, width, height, dx):
+        """Move a box horizontally by dx, stopping against the first blocked column"""
+        size = self.cell_size
+        top = math.floor(y / size)
+        bottom = math.ceil((y + height) / size) - 1
+        if dx > 0:
+            # Colonne attraversate dal bordo destro, nell'ordine in cui le incontra
+            first = math.ceil((x + width) / size)
+            last = math.ceil((x + width + dx) / size) - 1
+            for column in range(first, last + 1):
+                if self.is_column_blocked(column, top, bottom):
+                    return column * size - width
+        elif dx < 0:
+            first = math.floor(x / size) - 1
+            last = math.floor((x + dx) / size)
+            for column in range(first, last - 1, -1):
+                if self.is_column_blocked(column, top, bottom):
+                    return (column + 1) * size
+        return x + dx
+
+    def sweep_y(self, x, y, width, height, dy):
+        """Move a box vertically by dy, stopping against the first blocked row"""
+        size = self.cell_size
+        left = math.floor(x / size)
+        right = math.ceil((x + width) / size) - 1
+        if dy > 0:
+            first = math.ceil((y + height) / size)
+            last = math.ceil((y + height + dy) / size) - 1
+            for row in range(first, last + 1):
+                if self.is_row_blocked(row, left, right):
+                    return row * size - height
+        elif dy < 0:
+            first = math.floor(y / size) - 1
+            last = math.floor((y + dy) / size)
+            for row in range(first, last - 1, -1):
+                if self.is_row_blocked(row, left, right):
+                    return (row + 1) * size
+        return y + dy
+
+    def move_and_slide(self, x, y, width, height, dx, dy):
+        """Move a box by (dx, dy) one axis at a time, sliding along the walls it hits"""
+        # Il costo dipende solo da velocità e dimensioni del box, non dalla grandezza della mappa
+        x = self.sweep_x(x, y, width, height, dx)
+        y = self.sweep_y(x, y, width, height, dy)
+        return x, y
+
+    def move_and_slide_many(self, positions, deltas, size):
+        """Vectorized move_and_slide for (n, 2) positions of square boxes, in place"""
+        # Valido se i box e i passi non superano una cella: basta controllare la colonna
+        # (o riga) d'arrivo del bordo che avanza, e solo alle sue due estremità
+        cell = self.cell_size
+        grid = self.grid
+        for axis in (0, 1):
+            other = 1 - axis
+            delta = deltas[:, axis]
+            moved = positions[:, axis] + delta
+            forward = delta > 0
+            edge = numpy.where(forward, numpy.ceil((moved + size) / cell) - 1, numpy.floor(moved / cell))
+            edge = edge.astype(numpy.int64)
+            low = numpy.floor(positions[:, other] / cell).astype(numpy.int64)
+            high = (numpy.ceil((positions[:, other] + size) / cell) - 1).astype(numpy.int64)
+            blocked = ~(self.lookup(grid, edge, low, axis) & self.lookup(grid, edge, high, axis))
+
+            # Solo i box il cui bordo entra davvero in una nuova cella vengono fermati
+            start = numpy.where(forward, numpy.ceil((positions[:, axis] + size) / cell) - 1,
+                                numpy.floor(positions[:, axis] / cell))
+            blocked &= (edge != start) & (delta != 0)
+            positions[:, axis] = numpy.where(
+                blocked, numpy.where(forward, edge * cell - size, (edge + 1) * cell), moved)
+
+    def lookup(self, grid, along, across, axis):
+        """Get the walkability of cells given as (along axis, across axis) index arrays"""
+        columns, rows = (along, across) if axis == 0 else (across, along)
+        inside = (columns >= 0) & (columns < self.width) & (rows >= 0) & (rows < self.height)
+        walkable = numpy.zeros(len(along), dtype=bool)
+        walkable[inside] = grid[rows[inside], columns[inside]] == WALKABLE
+        return walkable
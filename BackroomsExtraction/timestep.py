@@ -0,0 +1,44 @@
+from settings import *
+
+# La simulazione avanza sempre a questa frequenza, qualunque sia il frame rate
+TICK_RATE = FPS
+# Tick massimi per frame: oltre, il tempo arretrato viene scartato (spiral of death)
+MAX_TICKS_PER_FRAME = 5
+
+
+def lerp(previous, current, alpha):
+    """Interpolate between the previous and current value of a tick"""
+    return previous + (current - previous) * alpha
+
+
+class FixedTimestep:
+    def __init__(self, tick_rate=TICK_RATE, max_ticks=MAX_TICKS_PER_FRAME):
+        """Accumulator turning variable frame times into a whole number of fixed ticks"""
+        self.tick_rate = tick_rate
+        self.tick_time = 1.0 / tick_rate
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+        self.alpha = 1.0  # Fraction of the next tick already elapsed, used to interpolate
+        self.ticks = 0
+        self.dropped_time = 0.0
+
+    def advance(self, dt):
+        """Add dt seconds of real time, returns how many ticks to simulate now"""
+        self.accumulator += max(0.0, dt)
+        ticks = min(int(self.accumulator / self.tick_time), self.max_ticks)
+        self.accumulator -= ticks * self.tick_time
+
+        # Se non riusciamo a stare al passo, rinunciamo al ritardo invece di accumularlo
+        if self.accumulator >= self.tick_time:
+            remainder = self.accumulator % self.tick_time
+            self.dropped_time += self.accumulator - remainder
+            self.accumulator = remainder
+
+        self.alpha = self.accumulator / self.tick_time
+        self.ticks += ticks
+        return ticks
+
+    def reset(self):
+        """Forget any pending time"""
+        self.accumulator = 0.0
+        self.alpha = 1.0